@@ -0,0 +1,63 @@
+"""
+Benchmarks the construction of the adjency matrices of a trace response variable.
+Compares building them trace by trace with the reference gen_adf against the vectorized RWDGController.gen_adf_tensors.
+The row-wise path is quadratic in the spans of a trace, so it only runs on the first --reference-traces traces and its time is extrapolated.
+
+Run from the repository root with:
+    python -m analysis.benchmarks.adjacency --traces 1000 10000 100000
+"""
+import argparse
+import time
+import numpy as np
+import analysis.internal.constants as constants
+from analysis.internal.RWDGController import RWDGController
+from analysis.internal.TraceResponseVariable import TraceResponseVariable
+from analysis.benchmarks.spans import span_table
+from analysis.benchmarks.reference import gen_adf, weight_adjency_matrix
+
+
+def adjency_row_wise(data) -> np.ndarray:
+     matrices = []
+     for _, single_trace_data in data.groupby(constants.TRACE_ID_COLUMN):
+          matrices.append(weight_adjency_matrix(gen_adf(single_trace_df=single_trace_data)))
+     return np.array(matrices, dtype=float)
+
+
+def adjency_vectorized(controller : RWDGController, data) -> np.ndarray:
+     _, counts, durations = controller.gen_adf_tensors(data)
+     return controller._weight_adjency_tensors(counts, durations)
+
+
+def main():
+     parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+     parser.add_argument("--traces", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+     parser.add_argument("--spans-per-trace", type=int, default=10)
+     parser.add_argument("--reference-traces", type=int, default=1_000)
+     args = parser.parse_args()
+
+     print(f"{'traces':>8} {'spans':>10} {'row-wise [s]':>14} {'vectorized [s]':>15} {'speedup':>8}")
+     for trace_count in args.traces:
+          data = span_table(trace_count, spans_per_trace=args.spans_per_trace)
+          controller = RWDGController([TraceResponseVariable(data, "benchmark", "frontend")], "benchmark", "recommendationservice")
+
+          started = time.perf_counter()
+          vectorized = adjency_vectorized(controller, data)
+          vectorized_time = time.perf_counter() - started
+
+          reference_count = min(trace_count, args.reference_traces)
+          reference_ids = np.sort(data[constants.TRACE_ID_COLUMN].unique())[:reference_count]
+          reference_data = data[data[constants.TRACE_ID_COLUMN].isin(reference_ids)]
+          started = time.perf_counter()
+          reference = adjency_row_wise(reference_data)
+          reference_time = (time.perf_counter() - started) * trace_count / reference_count
+          assert np.allclose(reference, vectorized[:reference_count])
+
+          estimate = "~" if reference_count < trace_count else " "
+          print(
+               f"{trace_count:>8} {len(data):>10} {estimate}{reference_time:>13.2f} {vectorized_time:>15.3f} "
+               f"{reference_time / vectorized_time:>7.0f}x"
+          )
+
+
+if __name__ == "__main__":
+     main()
@@ -0,0 +1,66 @@
+"""
+Benchmarks the startup and the inference latency of the analysis model for every ModelLoader backend.
+Startup is the time from creating the loader until the model answered its first batch, once with an empty cache (cold)
+and once with the artifacts of the first start (warm). Latency is the median time to predict one batch.
+
+Run from the analysis directory with:
+    PYTHONPATH=.. python -m analysis.benchmarks.model --backends eager torchscript compile
+"""
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+import torch
+import analysis.internal.constants as constants
+from analysis.internal.ModelLoader import ModelLoader
+
+
+def startup_time(model_path : Path, backend : str, cache_path : Path) -> float:
+     started = time.perf_counter()
+     ModelLoader(model_path, backend=backend, cache_path=cache_path).get()
+     return time.perf_counter() - started
+
+
+def latency(model_path : Path, backend : str, cache_path : Path, batch_size : int, repeats : int) -> float:
+     model = ModelLoader(model_path, backend=backend, cache_path=cache_path).get()
+     inputs = torch.rand(batch_size, constants.SMALL_MODEL_DIMENSIONS[0])
+     model.predict(inputs, batch_size=batch_size)
+     times = []
+     for _ in range(repeats):
+          started = time.perf_counter()
+          model.predict(inputs, batch_size=batch_size)
+          times.append(time.perf_counter() - started)
+     return statistics.median(times)
+
+
+def benchmark_backend(model_path : Path, backend : str, batch_sizes : list[int], repeats : int = 10) -> dict[str, float]:
+     with tempfile.TemporaryDirectory() as cache:
+          results = {
+               "cold_start": startup_time(model_path, backend, Path(cache)),
+               "warm_start": startup_time(model_path, backend, Path(cache)),
+          }
+          for batch_size in batch_sizes:
+               results[f"latency_{batch_size}"] = latency(model_path, backend, Path(cache), batch_size, repeats)
+     return results
+
+
+def main():
+     parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+     parser.add_argument("--model", type=Path, default=constants.MODEL_PATH)
+     parser.add_argument("--backends", nargs="+", default=[constants.MODEL_BACKEND_EAGER, constants.MODEL_BACKEND_TORCHSCRIPT])
+     parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 256, constants.INFERENCE_BATCH_SIZE])
+     parser.add_argument("--repeats", type=int, default=20)
+     args = parser.parse_args()
+
+     print(f"{'backend':>12} {'cold start [s]':>15} {'warm start [s]':>15} " + " ".join(f"{f'batch {size} [ms]':>16}" for size in args.batch_sizes))
+     for backend in args.backends:
+          results = benchmark_backend(args.model, backend, args.batch_sizes, args.repeats)
+          print(
+               f"{backend:>12} {results['cold_start']:>15.3f} {results['warm_start']:>15.3f} "
+               + " ".join(f"{results[f'latency_{size}'] * 1000:>16.2f}" for size in args.batch_sizes)
+          )
+
+
+if __name__ == "__main__":
+     main()
@@ -0,0 +1,109 @@
+"""
+Row-wise reference implementation of the trace transformation of the RWDGController, as it was before it was vectorized.
+It builds the adjency matrix of one trace at a time and classifies and normalizes values one by one. The tests compare the
+vectorized RWDGController against it and the adjacency benchmark measures it as the baseline.
+"""
+import logging
+import pandas as pd
+import analysis.internal.constants as constants
+
+logger = logging.getLogger(__name__)
+
+
+def mean_normalization( val : float, mean: float, min: float , max : float) -> float:
+     if val == 0.0:
+          return val
+
+     if mean == 0.0 or max == 0.0:
+          return 0.0
+
+     nominator = val - mean
+     denominator = max - min
+     if denominator > 0:
+          return nominator / denominator
+     else:
+          return 0.0
+
+
+def is_http_error(http_status_code : str) -> bool:
+     return (http_status_code[0] == "4" or http_status_code[0] == "5")
+
+
+def is_grpc_error(grpc_status_code : str) -> bool:
+     return not grpc_status_code == "0"
+
+
+'''
+To add internal spans to the next network span, we are going to use a stack of network requests that hold the index tuple for the matrix
+and will add the span onto the sum. The counter of that index tuple is NOT incremented and the element is only peeked, given the possibility
+that two internal spans happen after each other. The spans of the trace are sorted by their start time, so eventually every internal span
+finds a network parent, because frontend proxy will be invoked first.
+'''
+def gen_adf(single_trace_df : pd.DataFrame) -> list[list[tuple[int, float]]]:
+
+     adjency_matrix = [[(0, 0.0) for _ in range(len(constants.SERVICES))] for _ in range(len(constants.SERVICES))]
+     stack = []
+     sorted = single_trace_df.sort_values(by=constants.START_TIME, ascending=True)
+
+     for _ , row in sorted.iterrows():
+
+          if row[constants.SPAN_KIND] == constants.INTERNAL_TYPE:
+               span_duration = row[constants.DURATION_COLUMN]
+               # peek the stack
+               if len(stack) > 0:
+                    handle_internal_span(stack[-1], adjency_matrix, span_duration)
+               continue
+
+          ref_span_id = row[constants.REF_TYPE_SPAN_ID]
+
+          if ref_span_id == constants.NOT_AVAILABLE:
+               #we have found the FE proxy invocation
+               continue
+          ref_service_name = _find_service_name_for_spanID(ref_span_id=ref_span_id, single_trace_df=single_trace_df)
+          if ref_service_name == "":
+               continue
+          service_name = row[constants.SERVICE_NAME_COLUMN]
+          duration = row[constants.DURATION_COLUMN]
+          """row_ind is the client span , col_ind the server span --> [client , server] for the index tuple in the matric insertion"""
+          try:
+               row_ind = constants.SERVICES[service_name]
+               col_ind = constants.SERVICES[ref_service_name]
+          except Exception as e:
+               logger.info(f"ref_service_name or service_name : {ref_service_name}, {service_name} not found")
+               continue
+          if adjency_matrix[row_ind][col_ind][0] == -1:
+               adjency_matrix[row_ind][col_ind] = (1 , duration)
+          else:
+               tuple_val = adjency_matrix[row_ind][col_ind]
+               adjency_matrix[row_ind][col_ind] = (tuple_val[0] +1, tuple_val[1] + duration)
+          stack.append([row_ind, col_ind])
+
+     return adjency_matrix
+
+
+def handle_internal_span(indices : list[int], adjency_matrix : list[list[float]], span_duration : int):
+     tuple_before = adjency_matrix[indices[0]][indices[1]]
+     adjency_matrix[indices[0]][indices[1]] = (tuple_before[0], tuple_before[1] + span_duration)
+
+
+"""find corresponding name for the parent span to generate index tuple"""
+def _find_service_name_for_spanID(ref_span_id : str, single_trace_df : pd.DataFrame) -> str:
+     for _, row in single_trace_df.iterrows():
+          if row[constants.SPAN_ID_COLUMN] == ref_span_id:
+              return row[constants.SERVICE_NAME_COLUMN]
+
+     return ""
+
+
+'''Average request time of every index tuple, 0.0 where no request was counted'''
+def weight_adjency_matrix(tuple_adj_matrix : list[list[tuple[int, float]]]) -> list[list[float]]:
+
+     result = [[0.0 for _ in range(len(constants.SERVICES))] for _ in range(len(constants.SERVICES))]
+     for row_index, row  in enumerate(tuple_adj_matrix):
+          for col_index , col in enumerate(row):
+               sum_req_times = tuple_adj_matrix[row_index][col_index][1]
+               number_reqs = tuple_adj_matrix[row_index][col_index][0]
+               if number_reqs > 0:
+                    result[row_index][col_index] = sum_req_times / number_reqs
+
+     return result
@@ -0,0 +1,44 @@
+"""
+Synthetic span tables in the format the backend stores trace response variables in.
+Used by the benchmarks in this directory and the tests of the analysis package.
+"""
+import numpy as np
+import pandas as pd
+import analysis.internal.constants as constants
+
+# services that are not part of the adjency matrix are mixed in to exercise the lookups that skip them
+SERVICE_NAMES = [*constants.SERVICES, "kafka", "ffpostgres"]
+SPAN_KINDS = ["server", "client", "internal", "producer", "consumer"]
+STATUS_CODES = np.array([np.nan, 0, 0, 2, 200, 200, 308, 404, 503], dtype=object)
+
+
+def span_table(trace_count : int, spans_per_trace : int = 10, seed : int = 0, treatment_column : str = "loss_treatment") -> pd.DataFrame:
+     rng = np.random.default_rng(seed)
+     span_count = trace_count * spans_per_trace
+     trace_index = np.repeat(np.arange(trace_count), spans_per_trace)
+     span_index = np.tile(np.arange(spans_per_trace), trace_count)
+     # every span references a random earlier span of its trace, the first span of a trace is the root
+     parent_index = (rng.random(span_count) * np.maximum(span_index, 1)).astype(np.int64)
+     references = np.char.add(np.char.add(np.char.mod("%08x", trace_index), "-"), np.char.mod("%04x", parent_index)).astype(object)
+     references[span_index == 0] = constants.NOT_AVAILABLE
+     references[rng.random(span_count) < 0.02] = "missing"
+     # start times are unique within a trace, spans are shuffled so that their order has to be restored
+     start_times = 1_737_208_103_000_000 + trace_index * 10_000_000 + span_index * 1_000 + rng.integers(0, 999, span_count)
+     duration = rng.integers(100, 500_000, span_count)
+     treated = rng.random(trace_count) < 0.5
+     table = pd.DataFrame({
+          "index": np.arange(span_count),
+          constants.TRACE_ID_COLUMN: np.char.mod("%032x", trace_index).astype(object),
+          constants.SPAN_ID_COLUMN: np.char.add(np.char.add(np.char.mod("%08x", trace_index), "-"), np.char.mod("%04x", span_index)).astype(object),
+          "operation": "GET /api/data",
+          constants.START_TIME: start_times,
+          "end_time": start_times + duration,
+          constants.DURATION_COLUMN: duration,
+          constants.SERVICE_NAME_COLUMN: np.array(SERVICE_NAMES, dtype=object)[rng.integers(0, len(SERVICE_NAMES), span_count)],
+          constants.SPAN_KIND: np.array(SPAN_KINDS, dtype=object)[rng.integers(0, len(SPAN_KINDS), span_count)],
+          constants.REQ_STATUS_CODE: STATUS_CODES[rng.integers(0, len(STATUS_CODES), span_count)],
+          "ref_type": "CHILD_OF",
+          constants.REF_TYPE_SPAN_ID: references,
+          treatment_column: np.where(treated[trace_index], "loss", constants.NO_TREATMENT).astype(object),
+     })
+     return table.iloc[rng.permutation(span_count)].reset_index(drop=True)
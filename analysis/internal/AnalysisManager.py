@@ -9,6 +9,12 @@ from analysis.internal.StorageClient import LocalStorageHandler
 from analysis.internal.TraceModel import TraceModel
 from analysis.internal.exceptions import OXNFileNotFound, NoDataForExperiment, ConfigFileNotFound, LabelNotPresent, BatchExperimentsNotSupported
 from analysis.internal.ModelController import ModelController
+from analysis.internal.RWDGController import transform_variable
+from analysis.internal.FeatureStore import FeatureStore
+import analysis.internal.constants as constants
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+import threading
 import logging
 import time
 
@@ -27,15 +33,37 @@ def batch_predicate(file_name : str) -> bool:
      return "batch" in file_name
 
 
+_transform_pool : ProcessPoolExecutor | None = None
+_transform_pool_lock = threading.Lock()
+
+"""
+The worker processes are started once and shared by all analyses of the service. They are spawned rather than forked,
+as forking a process that already runs the threads of torch can deadlock. The model stays in the analysis process,
+so its weights are loaded once and never copied into the workers.
+"""
+def get_transform_pool(workers : int) -> ProcessPoolExecutor:
+     global _transform_pool
+     with _transform_pool_lock:
+          if _transform_pool is None:
+               _transform_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+          return _transform_pool
+
+
 class AnalysisManager:
 
-     def __init__(self, experiment_id : str, local_storage_handler : LocalStorageHandler , trace_model : TraceModel) -> None:
+     def __init__(self, experiment_id : str, local_storage_handler : LocalStorageHandler , trace_model : TraceModel, workers : int = constants.ANALYSIS_WORKERS, feature_store : FeatureStore | None = None) -> None:
           self.storage_handler : LocalStorageHandler = local_storage_handler
           self.experiment_id : str = experiment_id
+          self.feature_store : FeatureStore | None = feature_store
           self.failed_files : list[str] = []
           self.time_to_result : float = -1.0
-          self.response_variables : list[TraceResponseVariable] = self._get_data_for_variables()
+          self.workers : int = workers
+          # seconds spent in each stage, transform and inference overlap when the variables are transformed in worker processes
+          self.stage_times : dict[str, float] = {}
           self.experiment_label : str = self._get_label_for_experiment()
+          start_time = time.perf_counter()
+          self.response_variables : list[TraceResponseVariable] = self._get_data_for_variables()
+          self.stage_times["load"] = time.perf_counter() - start_time
           self.rwdg_controller = RWDGController(self.response_variables, self.experiment_id, self.experiment_label)
           self.model_controller = ModelController(self.response_variables, self.experiment_id, model=trace_model, experiment_label=self.experiment_label, local_storage_handler=local_storage_handler)
 
@@ -60,12 +88,18 @@ class AnalysisManager:
                if "trace" not in file:
                     logging.debug(f"file with name: {file} not a trace variable")
                     continue
+               cached = self._get_cached_variable(file)
+               if cached is not None:
+                    response_variables.append(cached)
+                    continue
                tup = self.storage_handler.get_file_from_dir(file)
                if tup is None:
                     logger.info(f"Could not retrieve data for file: {file}")
                     self.failed_files.append(file)
                     continue
-               response_variables.append(TraceResponseVariable(tup[0],self.experiment_id, tup[1] ))
+               variable = TraceResponseVariable(tup[0],self.experiment_id, tup[1], file_name=file)
+               variable.log_memory_usage()
+               response_variables.append(variable)
           
           if len(response_variables) == 0:
                logger.error(f"Could not retrieve any Data for experiment with ID: {self.experiment_id}")
@@ -74,6 +108,24 @@ class AnalysisManager:
           logger.info(f"instantiated {len(response_variables)} Trace ResponseVarables.")
           return response_variables
      
+     """
+     Returns the variable of a response file as it was transformed by an earlier analysis, without reading the raw traces
+     """
+     def _get_cached_variable(self, file : str) -> TraceResponseVariable | None:
+          if self.feature_store is None:
+               return None
+          cached = self.feature_store.load(self.experiment_id, self.storage_handler.experiment_path / file, self.experiment_label)
+          if cached is None:
+               return None
+          logger.info(f"using cached features of {file}")
+          variable = TraceResponseVariable(None, self.experiment_id, self.storage_handler._retrieve_service_name(file), file_name=file)
+          variable.adf_matrices, variable.error_ratio = cached
+          return variable
+
+     def _cache_variable(self, var : TraceResponseVariable) -> None:
+          if self.feature_store is not None and var.file_name is not None:
+               self.feature_store.save(self.experiment_id, self.storage_handler.experiment_path / var.file_name, self.experiment_label, var.adf_matrices, var.error_ratio)
+
      def _get_label_for_experiment(self) -> str:
           return "recommendationservice"
           #return self.storage_handler.get_experiment_label(self.experiment_id)
@@ -87,25 +139,84 @@ class AnalysisManager:
           }
 
           tup = None
+          error = None
           try:
                start_time = time.time()
-               self.rwdg_controller.iterate_over_varibales()
-               tup = self.model_controller.evaluate_variables()
+               self._transform_and_evaluate_variables()
+               tup = self.model_controller.results()
                end_time = time.time()
                self.time_to_result = end_time - start_time
           except Exception as e:
                logger.error(f"and exception occured during analyzing the result : {str(e)}")
-               
+               error = e
+
           result_dict["metrics"] = tup[0] if  tup is not None else []
           result_dict["probability"] = tup[1] if tup is not None else []
           result_dict["aggregation"] = tup[2] if tup is not None else {}
           result_dict["failedVariables"] = str(self.failed_files)
           result_dict["timeToResult"] = self.time_to_result
+          result_dict["timeToResultBreakdown"] = {
+               **self.stage_times,
+               "inference" : self.model_controller.inference_time,
+               "evaluation" : self.model_controller.evaluation_time,
+          }
+          result_dict["inferenceThroughput"] = self.model_controller.inference_throughput()
+          result_dict["error"] = str(error) if error is not None else None
 
           #logger.info(result_dict)
 
           self.storage_handler.write_json_to_directory(f"{self.experiment_id}_analysis_results", result_dict)
+          # the partial results are written first, the job queue then records the analysis as failed
+          if error is not None:
+               raise error
+
+     """
+     Transforms the variables and puts each one through the model as soon as it is transformed. Variables that were loaded
+     from the feature store are put through the model right away, the others are cached once they are transformed.
+     With more than one worker the variables are transformed in parallel by the worker processes, while the
+     analysis process infers the variables that are already done.
+     """
+     def _transform_and_evaluate_variables(self) -> None:
+          logger.info("starting to transform, infer and evaluate variables")
+          start_time = time.perf_counter()
+          cached = [var for var in self.response_variables if var.data is None]
+          to_transform = [var for var in self.response_variables if var.data is not None]
+          for var in cached:
+               self.model_controller.evaluate_variable(var)
+          if self.workers <= 1 or len(to_transform) <= 1:
+               transform_time = 0.0
+               for var in to_transform:
+                    transform_start = time.perf_counter()
+                    self.rwdg_controller.transform_variable(var)
+                    transform_time += time.perf_counter() - transform_start
+                    self._transformed_variable(var)
+               self.stage_times["transform"] = transform_time
+               return
+
+          pool = get_transform_pool(self.workers)
+          futures = {
+               pool.submit(transform_variable, var.data, self.experiment_id, var.service_name, self.experiment_label) : var
+               for var in to_transform
+          }
+          try:
+               for future in as_completed(futures):
+                    var = futures[future]
+                    var.take_traces(future.result())
+                    self.stage_times["transform"] = time.perf_counter() - start_time
+                    self._transformed_variable(var)
+          finally:
+               for future in futures:
+                    future.cancel()
      
+     """
+     The spans of a transformed variable are not needed anymore, only its traces are kept for the evaluation
+     """
+     def _transformed_variable(self, var : TraceResponseVariable) -> None:
+          var.data = None
+          var.log_memory_usage()
+          self._cache_variable(var)
+          self.model_controller.evaluate_variable(var)
+
      """
      def _construct_message(self, e: Exception | None) -> str:
           if e is None:
@@ -2,13 +2,16 @@
 
 from analysis.internal.StorageClient import LocalStorageHandler
 from analysis.internal.RWDGController import RWDGController
+from analysis.internal.FeatureStore import FeatureStore
 from analysis.internal.TraceResponseVariable import TraceResponseVariable
 from analysis.internal.TraceModel import TraceModel, visualize_training_precision, plot_average_precisions
 import analysis.internal.constants as constants
-from analysis.internal.TraceVariableDatasetInference import TraceVariableDatasetInference
+from analysis.internal.TrainingShards import TrainingShardDataset, shards_exist, write_training_shards
 from analysis.internal.utils import gen_one_hot_encoding_col_names, build_colum_names_for_adf_mat_df
-from torch.utils.data import DataLoader, random_split
+import hashlib
 import os
+from pathlib import Path
+from typing import Iterator
 import torch.nn as nn
 import logging
 import pandas as pd
@@ -55,8 +58,9 @@ def plot_column_averages_pandas(input, services_reverse, filename, title):
 """
 class DataTransformerAndAnalyzer():
 
-     def __init__(self, storage_handler : LocalStorageHandler):
+     def __init__(self, storage_handler : LocalStorageHandler, feature_store : FeatureStore | None = None):
           self.storage_handler = storage_handler
+          self.feature_store = feature_store if feature_store is not None else FeatureStore(constants.TRAINING_FEATURE_STORE_PATH)
           self.trace_model = TraceModel(nn.CrossEntropyLoss(), constants.SMALL_MODEL_DIMENSIONS
                                         ,  nn.ReLU())
      
@@ -68,17 +72,24 @@ class DataTransformerAndAnalyzer():
 
           for file_name in file_list:
                try:
-                    tup = self.storage_handler.get_file_from_dir(file_name=file_name)
-                    if tup is None:
-                         logger.error(f" For experiment with ID : {experiment_id}, could not retrive data for for file : {file_name}")
-                         continue
-
-                    varibales_list : list[TraceResponseVariable] = [TraceResponseVariable(tup[0] , experiment_id , tup[1])]
-                    con = RWDGController(variables=varibales_list, experiment_id=experiment_id, injected_service=experiment_label)
-
-                    con.iterate_over_varibales()
-
-                    con.variables[0].adf_matrices.to_csv(f"./internal/oxn/transformed2/{file_name[:-5]}.csv", index=False)
+                    source = self.storage_handler.experiment_path / file_name
+                    cached = self.feature_store.load(experiment_id, source, experiment_label)
+                    if cached is not None:
+                         adf_matrices = cached[0]
+                    else:
+                         tup = self.storage_handler.get_file_from_dir(file_name=file_name)
+                         if tup is None:
+                              logger.error(f" For experiment with ID : {experiment_id}, could not retrive data for for file : {file_name}")
+                              continue
+
+                         varibales_list : list[TraceResponseVariable] = [TraceResponseVariable(tup[0] , experiment_id , tup[1])]
+                         con = RWDGController(variables=varibales_list, experiment_id=experiment_id, injected_service=experiment_label)
+
+                         con.iterate_over_varibales()
+                         adf_matrices = con.variables[0].adf_matrices
+                         self.feature_store.save(experiment_id, source, experiment_label, adf_matrices, con.variables[0].error_ratio)
+
+                    adf_matrices.to_csv(f"./internal/oxn/transformed2/{Path(file_name).stem}.csv", index=False)
                     logger.info(f"for exp: {experiment_id} and file : {file_name} data got successfully transformed and written")
                
                except Exception as e:
@@ -266,13 +277,22 @@ class DataTransformerAndAnalyzer():
 
 
 
-     def train_model_big(self):
-          train_path = "./internal/oxn/transformed2"
-          files_list = os.listdir(train_path)
-
-          trace_response_variables : list[pd.DataFrame] = []
-
-          for file in files_list:
+     """
+     The transformed variables to train on: everything transform_data stored in the feature store with the current transform version,
+     or the CSV files of train_path if the feature store is empty. The variables are read one at a time.
+     """
+     def _training_frames(self, train_path : str) -> Iterator[pd.DataFrame]:
+          if self.feature_store.count() > 0:
+               logger.info(f"training on {self.feature_store.count()} variables from the feature store")
+               yield from self.feature_store.iter_frames()
+               return
+
+          for file in self._training_files(train_path):
+               yield pd.read_csv(f"{train_path}/{file}")
+
+     def _training_files(self, train_path : str) -> list[str]:
+          files = []
+          for file in sorted(os.listdir(train_path)):
                if "config" in file:
                     continue
                if "entire" in file: 
@@ -280,8 +300,38 @@ class DataTransformerAndAnalyzer():
                if "ratios" in file:
                     continue
 
-               trace_response_variables.append(pd.read_csv(f"{train_path}/{file}"))
-          
+               files.append(file)
+          return files
+
+     """
+     Identifies the training variables, changes whenever transform_data adds or replaces a variable in the feature store
+     or a CSV file of train_path changes, by the same size and modification times the feature store invalidates its entries with
+     """
+     def _training_source(self, train_path : str) -> str:
+          if self.feature_store.count() > 0:
+               return self.feature_store.fingerprint()
+          digest = hashlib.sha256()
+          for file in self._training_files(train_path):
+               stat = os.stat(f"{train_path}/{file}")
+               digest.update(f"{file}\0{stat.st_size}\0{stat.st_mtime_ns}\0".encode())
+          return digest.hexdigest()
+
+     """
+     Writes the training variables to memory mapped shards with a fixed train/test split and returns their directory.
+     The shards are written again once the training variables changed since they were written.
+     """
+     def _training_shards(self, train_path : str) -> Path:
+          name = f"features-v{constants.TRANSFORM_VERSION}" if self.feature_store.count() > 0 else Path(train_path).name
+          path = constants.TRAINING_SHARDS_PATH / name
+          source = self._training_source(train_path)
+          if not shards_exist(path, source):
+               input_names = build_colum_names_for_adf_mat_df()
+               input_names.append("has_error_in_trace")
+               write_training_shards(self._training_frames(train_path), path, input_names, gen_one_hot_encoding_col_names(), source=source)
+          return path
+
+     def train_model_big(self):
+          shards = self._training_shards("./internal/oxn/transformed2")
 
           services_reverse = {
                0: "frontendproxy",
@@ -303,17 +353,8 @@ class DataTransformerAndAnalyzer():
                16 : "No Fault"
           }
 
-          dataset = pd.concat(trace_response_variables, ignore_index=True)
-          one_hot_encoding_col_names = gen_one_hot_encoding_col_names()
-          col_names_for_input_data = build_colum_names_for_adf_mat_df()
-          col_names_for_input_data.append("has_error_in_trace")
-          torch_dataset = TraceVariableDatasetInference(dataframe=dataset, labels=one_hot_encoding_col_names, input_names=col_names_for_input_data)
-          train_size = int(0.8 * len(torch_dataset)) 
-          test_size = len(torch_dataset) - train_size
-          training_data, test_data = random_split(torch_dataset, [train_size, test_size])
-
-          train_dataloader = DataLoader(training_data, batch_size=100, shuffle=True)
-          test_dataloader = DataLoader(test_data, batch_size=250, shuffle=True)
+          train_dataloader = TrainingShardDataset(shards, "train", batch_size=100).loader(shuffle=True)
+          test_dataloader = TrainingShardDataset(shards, "test", batch_size=250).loader(shuffle=True)
           logger.info("starting to train the model")
           acc_all_classes_train, precision_all_classes_train  = self.trace_model.train_trace_model_big(train_loader=train_dataloader, num_epochs=1)
           self.trace_model.save_model_dict(constants.MODEL_PATH)
@@ -327,32 +368,9 @@ class DataTransformerAndAnalyzer():
 
 
      def train_model(self):
-          train_path = "./internal/oxn/transformed"
-          files_list = os.listdir(train_path)
-
-          trace_response_variables : list[pd.DataFrame] = []
-
-          for file in files_list:
-               if "config" in file:
-                    continue
-               if "entire" in file: 
-                    continue
-               if "ratios" in file:
-                    continue
-
-               trace_response_variables.append(pd.read_csv(f"{train_path}/{file}"))
-          
-          dataset = pd.concat(trace_response_variables, ignore_index=True)
-          one_hot_encoding_col_names = gen_one_hot_encoding_col_names()
-          col_names_for_input_data = build_colum_names_for_adf_mat_df()
-          col_names_for_input_data.append("has_error_in_trace")
-          torch_dataset = TraceVariableDatasetInference(dataframe=dataset, labels=one_hot_encoding_col_names, input_names=col_names_for_input_data)
-          train_size = int(0.8 * len(torch_dataset)) 
-          test_size = len(torch_dataset) - train_size
-          training_data, test_data = random_split(torch_dataset, [train_size, test_size])
-
-          train_dataloader = DataLoader(training_data, batch_size=100, shuffle=True)
-          test_dataloader = DataLoader(test_data, batch_size=100, shuffle=True)
+          shards = self._training_shards("./internal/oxn/transformed")
+          train_dataloader = TrainingShardDataset(shards, "train", batch_size=100).loader(shuffle=True)
+          test_dataloader = TrainingShardDataset(shards, "test", batch_size=100).loader(shuffle=True)
 
           precision_per_batch_recom, precision_per_batch_no_fault, other_class_ratios_training  = self.trace_model.train_trace_model(train_loader=train_dataloader, num_epochs=3)
           self.trace_model.save_model_dict(constants.MODEL_PATH)
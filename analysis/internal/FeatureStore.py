@@ -0,0 +1,127 @@
+"""
+Columnar store of the transformed response variables.
+The adjency matrices and error ratios of a trace response variable are written to parquet after the RWDG transform,
+so analysing an experiment again, e.g. with a newer model, or training on it does not read and transform the raw traces again.
+Entries are keyed by experiment id, response file and transform version and are only used while the response file on the
+OXN volume keeps its size and modification time.
+"""
+from __future__ import annotations
+import hashlib
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Iterator
+import pandas as pd
+import analysis.internal.constants as constants
+
+try:
+     import pyarrow
+except ImportError:
+     pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+
+class FeatureStore:
+
+     def __init__(self, path : str | Path, version : int = constants.TRANSFORM_VERSION):
+          self.path = Path(path)
+          self.version = version
+          self.enabled = pyarrow is not None
+          if not self.enabled:
+               logger.warning("pyarrow is not installed, transformed response variables are not cached")
+
+     def _entry(self, experiment_id : str, file_name : str) -> tuple[Path, Path]:
+          stem = f"{Path(file_name).stem}.v{self.version}"
+          directory = self.path / experiment_id
+          return directory / f"{stem}.parquet", directory / f"{stem}.json"
+
+     def _source_key(self, source : Path) -> dict[str, int]:
+          stat = source.stat()
+          return {"size" : stat.st_size, "mtime_ns" : stat.st_mtime_ns}
+
+     '''
+     Returns the cached adjency matrices and error ratios of a response file, None if they were never stored, were stored
+     by another transform version or for another injected service, or if the response file changed since
+     '''
+     def load(self, experiment_id : str, source : str | Path, label : str) -> tuple[pd.DataFrame, dict[str, float]] | None:
+          if not self.enabled:
+               return None
+          source = Path(source)
+          features_file, meta_file = self._entry(experiment_id, source.name)
+          try:
+               meta = json.loads(meta_file.read_text())
+               if meta["label"] != label or meta["source"] != self._source_key(source):
+                    logger.info(f"cached features of {source.name} are outdated")
+                    return None
+               return pd.read_parquet(features_file), meta["error_ratio"]
+          except FileNotFoundError:
+               return None
+          except Exception as e:
+               logger.error(f"could not read cached features of {source.name}: {str(e)}")
+               return None
+
+     '''
+     Stores the adjency matrices and error ratios of a response file. The parquet file is written before its metadata,
+     so an entry is never used before it is complete.
+     '''
+     def save(self, experiment_id : str, source : str | Path, label : str, adf_matrices : pd.DataFrame, error_ratio : dict[str, float]) -> None:
+          if not self.enabled or adf_matrices is None:
+               return
+          source = Path(source)
+          features_file, meta_file = self._entry(experiment_id, source.name)
+          temporary_suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+          temporary_features = features_file.with_name(features_file.name + temporary_suffix)
+          temporary_meta = meta_file.with_name(meta_file.name + temporary_suffix)
+          try:
+               meta = {
+                    "experiment_id" : experiment_id,
+                    "response" : source.name,
+                    "version" : self.version,
+                    "label" : label,
+                    "source" : self._source_key(source),
+                    "error_ratio" : error_ratio,
+               }
+               features_file.parent.mkdir(parents=True, exist_ok=True)
+               meta_file.unlink(missing_ok=True)
+               adf_matrices.to_parquet(temporary_features, index=False, compression="zstd")
+               os.replace(temporary_features, features_file)
+               temporary_meta.write_text(json.dumps(meta))
+               os.replace(temporary_meta, meta_file)
+          except Exception as e:
+               logger.error(f"could not cache features of {source.name}: {str(e)}")
+
+     '''
+     Returns the adjency matrices of all entries of the current transform version, e.g. to train the model on them
+     '''
+     def frames(self, experiment_ids : list[str] | None = None) -> list[pd.DataFrame]:
+          return [pd.read_parquet(meta_file.with_suffix(".parquet")) for meta_file in self._meta_files(experiment_ids)]
+
+     '''
+     Reads the adjency matrices one entry at a time, so that they never have to be in memory at the same time
+     '''
+     def iter_frames(self, experiment_ids : list[str] | None = None) -> Iterator[pd.DataFrame]:
+          for meta_file in self._meta_files(experiment_ids):
+               yield pd.read_parquet(meta_file.with_suffix(".parquet"))
+
+     def _meta_files(self, experiment_ids : list[str] | None = None) -> list[Path]:
+          if not self.enabled or not self.path.is_dir():
+               return []
+          directories = [self.path / experiment_id for experiment_id in experiment_ids] if experiment_ids is not None else sorted(self.path.iterdir())
+          return [meta_file for directory in directories for meta_file in sorted(directory.glob(f"*.v{self.version}.json"))]
+
+     def count(self) -> int:
+          return len(self._meta_files())
+
+     '''
+     Identifies the entries of the current transform version by the size and modification time of their metadata, which is
+     rewritten with every save, so the fingerprint changes whenever an entry is added, replaced or removed
+     '''
+     def fingerprint(self, experiment_ids : list[str] | None = None) -> str:
+          digest = hashlib.sha256()
+          for meta_file in self._meta_files(experiment_ids):
+               stat = meta_file.stat()
+               digest.update(f"{meta_file.relative_to(self.path)}\0{stat.st_size}\0{stat.st_mtime_ns}\0".encode())
+          return digest.hexdigest()
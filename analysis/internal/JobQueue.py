@@ -0,0 +1,147 @@
+"""
+Queue of the analyses requested from the analysis service.
+Experiments are analyzed by a fixed number of worker threads, so a batch experiment that requests dozens of analyses
+at once does not run them all in the same process. The state of every job is written to disk and survives restarts.
+"""
+from __future__ import annotations
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+import analysis.internal.constants as constants
+from analysis.internal.exceptions import JobQueueFull
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATES = (constants.JOB_QUEUED, constants.JOB_RUNNING)
+
+
+class AnalysisJobQueue:
+
+     def __init__(self, analyze : Callable[[str], None], state_path : str | Path, workers : int = constants.ANALYSIS_JOB_WORKERS, max_queued : int = constants.ANALYSIS_JOB_QUEUE_SIZE):
+          self.analyze = analyze
+          self.state_path = Path(state_path)
+          self.max_queued = max_queued
+          self.jobs : dict[str, dict] = {}
+          self._queue : queue.Queue[str] = queue.Queue()
+          self._lock = threading.Lock()
+          self._load_jobs()
+          self._workers = [threading.Thread(target=self._work, name=f"analysis-job-worker-{idx}", daemon=True) for idx in range(workers)]
+          for worker in self._workers:
+               worker.start()
+
+     '''
+     Queues the analysis of an experiment. An experiment that is already queued or running is not queued a second time,
+     its current job is returned instead. Raises JobQueueFull if max_queued jobs are already waiting for a worker.
+     '''
+     def submit(self, experiment_id : str) -> tuple[dict, bool]:
+          with self._lock:
+               job = self.jobs.get(experiment_id)
+               if job is not None and job["status"] in ACTIVE_STATES:
+                    return dict(job), False
+               if self._queued_count() >= self.max_queued:
+                    raise JobQueueFull(f"{self.max_queued} analyses are already queued")
+               job = {
+                    "experiment_id" : experiment_id,
+                    "status" : constants.JOB_QUEUED,
+                    "queued_at" : time.time(),
+                    "started_at" : None,
+                    "finished_at" : None,
+                    "error" : None,
+               }
+               self._set(job)
+          self._queue.put(experiment_id)
+          logger.info(f"queued analysis of experiment {experiment_id}")
+          return dict(job), True
+
+     '''
+     Returns the state of the latest job of an experiment with its waiting and running time in seconds, None if it was never queued
+     '''
+     def get(self, experiment_id : str) -> dict | None:
+          with self._lock:
+               job = self.jobs.get(experiment_id)
+               if job is None:
+                    return None
+               job = dict(job)
+               if job["status"] == constants.JOB_QUEUED:
+                    job["queue_position"] = self._queue_position(experiment_id)
+          now = time.time()
+          job["wait_seconds"] = (job["started_at"] or now) - job["queued_at"]
+          if job["started_at"] is not None:
+               job["run_seconds"] = (job["finished_at"] or now) - job["started_at"]
+          return job
+
+     def stats(self) -> dict[str, int]:
+          with self._lock:
+               counts = {state : 0 for state in [constants.JOB_QUEUED, constants.JOB_RUNNING, constants.JOB_DONE, constants.JOB_FAILED]}
+               for job in self.jobs.values():
+                    counts[job["status"]] += 1
+          return {**counts, "max_queued" : self.max_queued, "workers" : len(self._workers)}
+
+     def _work(self) -> None:
+          while True:
+               experiment_id = self._queue.get()
+               with self._lock:
+                    job = dict(self.jobs[experiment_id], status=constants.JOB_RUNNING, started_at=time.time())
+                    self._set(job)
+               logger.info(f"starting analysis of experiment {experiment_id}")
+               try:
+                    self.analyze(experiment_id)
+                    job = dict(job, status=constants.JOB_DONE)
+               except Exception as e:
+                    logger.error(f"analysis of experiment {experiment_id} failed: {str(e)}")
+                    job = dict(job, status=constants.JOB_FAILED, error=str(e))
+               with self._lock:
+                    self._set(dict(job, finished_at=time.time()))
+               self._queue.task_done()
+
+     def _queued_count(self) -> int:
+          return sum(1 for job in self.jobs.values() if job["status"] == constants.JOB_QUEUED)
+
+     def _queue_position(self, experiment_id : str) -> int:
+          queued = sorted((job["queued_at"], job["experiment_id"]) for job in self.jobs.values() if job["status"] == constants.JOB_QUEUED)
+          return [queued_id for _, queued_id in queued].index(experiment_id)
+
+     def _job_file(self, experiment_id : str) -> Path:
+          return self.state_path / f"{experiment_id}.json"
+
+     '''
+     Updates a job in memory and on disk, the file is replaced at once so that a crash never leaves a partial state behind
+     '''
+     def _set(self, job : dict) -> None:
+          self.jobs[job["experiment_id"]] = job
+          try:
+               self.state_path.mkdir(parents=True, exist_ok=True)
+               job_file = self._job_file(job["experiment_id"])
+               temporary = job_file.with_suffix(".tmp")
+               temporary.write_text(json.dumps(job))
+               os.replace(temporary, job_file)
+          except OSError as e:
+               logger.error(f"could not persist the state of the analysis job for {job['experiment_id']}: {str(e)}")
+
+     '''
+     Reads the jobs of earlier runs of the service. Jobs that were queued or running when the service stopped are queued again.
+     '''
+     def _load_jobs(self) -> None:
+          if not self.state_path.is_dir():
+               return
+          interrupted = []
+          for job_file in self.state_path.glob("*.json"):
+               try:
+                    job = json.loads(job_file.read_text())
+               except (OSError, ValueError) as e:
+                    logger.error(f"could not read analysis job {job_file}: {str(e)}")
+                    continue
+               if job["status"] in ACTIVE_STATES:
+                    job = dict(job, status=constants.JOB_QUEUED, started_at=None)
+                    interrupted.append(job)
+               self.jobs[job["experiment_id"]] = job
+          for job in sorted(interrupted, key=lambda job : job["queued_at"]):
+               self._set(job)
+               self._queue.put(job["experiment_id"])
+          if len(interrupted) > 0:
+               logger.info(f"queued {len(interrupted)} analyses again that were interrupted by a restart")
@@ -4,10 +4,10 @@ import analysis.internal.constants as constants
 from analysis.internal.utils import gen_one_hot_encoding_col_names, build_colum_names_for_adf_mat_df , get_index_for_service_label
 import torch
 from analysis.internal.TraceModel import TraceModel
-from analysis.internal.TraceVariableDatasetInference import TraceVariableDatasetInference
 from torcheval.metrics import MulticlassPrecision , MulticlassF1Score , MulticlassRecall
 from analysis.internal.StorageClient import LocalStorageHandler
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -20,45 +20,65 @@ class ModelController:
           # goody trace is a class itself
           self.num_classes = len(constants.SERVICES) + 1
           self.one_hot_labels = gen_one_hot_encoding_col_names()
-          self.input_labels = build_colum_names_for_adf_mat_df()
+          # the model is trained on the adjency matrix and the error flag of a trace, see DataTransformer
+          self.input_labels = [*build_colum_names_for_adf_mat_df(), constants.ERROR_IN_TRACE_COLUMN]
           self.index_of_actual_label : int  = get_index_for_service_label(experiment_label)
           self.storage_handler : LocalStorageHandler = local_storage_handler
+          self.batch_size : int = constants.INFERENCE_BATCH_SIZE
+          self.inferred_traces : int = 0
+          self.inference_time : float = 0.0
+          self.evaluation_time : float = 0.0
 
 
      '''
      This function actually puts the transformed data through the model: It does the inference part.
+     All traces of the variable are converted to one tensor and put through the model in batches.
      '''
      def _infer_variable(self, variable : TraceResponseVariable) -> None:
-          if variable.adf_matrices is not None:
-               variable_dataset = TraceVariableDatasetInference(variable.adf_matrices,  self.one_hot_labels, self.input_labels)
-               predicted_labels = []
-               #actual_lables = [self.index_of_actual_label] * len(variable.adf_matrices)
-               for x in range(len(variable.adf_matrices)):
-                    input , _ = variable_dataset[x]
-                    output = self.model.infer(input)
-                    max_index = torch.argmax(output)
-                    predicted_labels.append(max_index)
-
-               variable.predictions = torch.tensor(predicted_labels)
+          if variable.features is not None:
+               inputs = torch.from_numpy(variable.model_inputs())
+               start_time = time.perf_counter()
+               variable.predictions = self.model.predict(inputs, batch_size=self.batch_size)
+               self.inference_time += time.perf_counter() - start_time
+               self.inferred_traces += len(inputs)
+
+     '''
+     Number of traces put through the model per second over all variables of the experiment
+     '''
+     def inference_throughput(self) -> float:
+          if self.inference_time <= 0.0:
+               return -1.0
+          return self.inferred_traces / self.inference_time
      
 
      def evaluate_variables(self) -> tuple[dict[str, list[dict[str, float]]], dict[str, list[dict[str, float]]], dict[str, float]]:
                logger.info("starting to infer and evaluate variables")
  
                for var in self.variables:
-                    try:
-                         logger.info(f"evaluating for {var.service_name}")
-                         self._infer_variable(variable=var)
-                         self._f1_for_variable(var)
-                         self._recall_for_variable(var)
-                         self._precision_for_variable(var)
-                    except Exception as e:
-                         logger.error(f"Error in evaluation the variable: {var.service_name} : {str(e)}")
+                    self.evaluate_variable(var)
                
-               aggregation = self.aggregate_over_the_experiment()
-               metrics = self._get_metrics()
-               probs = self._get_probs()
-               return metrics , probs, aggregation
+               return self.results()
+
+     '''
+     Infers and evaluates a single variable as soon as its data is transformed
+     '''
+     def evaluate_variable(self, var : TraceResponseVariable) -> None:
+          try:
+               logger.info(f"evaluating for {var.service_name}")
+               self._infer_variable(variable=var)
+               start_time = time.perf_counter()
+               self._f1_for_variable(var)
+               self._recall_for_variable(var)
+               self._precision_for_variable(var)
+               self.evaluation_time += time.perf_counter() - start_time
+          except Exception as e:
+               logger.error(f"Error in evaluation the variable: {var.service_name} : {str(e)}")
+
+     def results(self) -> tuple[dict[str, list[dict[str, float]]], dict[str, list[dict[str, float]]], dict[str, float]]:
+          aggregation = self.aggregate_over_the_experiment()
+          metrics = self._get_metrics()
+          probs = self._get_probs()
+          return metrics , probs, aggregation
     
      
      def _get_metrics(self) -> dict[str, list[dict[str, float]]]:
@@ -91,23 +111,23 @@ class ModelController:
      For the next three function I will take the micro average between the classes or evaluation
      '''
      def _precision_for_variable(self, variable :TraceResponseVariable) -> None:
-          if variable.adf_matrices is not None:
-               actual_lables = torch.Tensor([self.index_of_actual_label] * len(variable.adf_matrices))
+          if variable.features is not None:
+               actual_lables = torch.Tensor([self.index_of_actual_label] * variable.trace_count())
                metric = MulticlassPrecision(average="micro", num_classes=self.num_classes)
                metric.update(variable.predictions, actual_lables)
                variable.micro_precision = metric.compute().item()
 
 
      def _recall_for_variable(self, variable : TraceResponseVariable) -> None:
-          if variable.adf_matrices is not None:
-               actual_lables = torch.Tensor([self.index_of_actual_label] * len(variable.adf_matrices))
+          if variable.features is not None:
+               actual_lables = torch.Tensor([self.index_of_actual_label] * variable.trace_count())
                metric = MulticlassRecall(average="micro", num_classes=self.num_classes)
                metric.update(variable.predictions, actual_lables)
                variable.micro_recall = metric.compute().item()
 
      def _f1_for_variable(self, variable: TraceResponseVariable) -> None:
-          if variable.adf_matrices is not None: 
-               actual_lables = torch.Tensor([self.index_of_actual_label] * len(variable.adf_matrices))
+          if variable.features is not None: 
+               actual_lables = torch.Tensor([self.index_of_actual_label] * variable.trace_count())
                metric = MulticlassF1Score(average="micro", num_classes=self.num_classes)
                metric.update(variable.predictions, actual_lables)
                variable.micro_f1_score = metric.compute().item()
@@ -150,7 +170,7 @@ class ModelController:
           lenghts = {}
           sum = 0
           for var in self.variables:
-               var_length = len(var.adf_matrices)
+               var_length = var.trace_count()
                lenghts[var.service_name] = var_length
                sum += var_length
 
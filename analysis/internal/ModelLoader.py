@@ -0,0 +1,110 @@
+"""
+Loads the TraceModel of the analysis service on first use instead of at import time.
+The weights can be loaded in the background while the service starts, and the model can optionally be put through
+TorchScript or torch.compile. The TorchScript module is cached next to the compiled kernels of torch.compile, keyed by
+the weights it was built from, so it is only traced once per model file.
+"""
+from __future__ import annotations
+import hashlib
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+import torch
+import torch.nn as nn
+import analysis.internal.constants as constants
+from analysis.internal.TraceModel import TraceModel
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = (constants.MODEL_BACKEND_EAGER, constants.MODEL_BACKEND_TORCHSCRIPT, constants.MODEL_BACKEND_COMPILE)
+
+
+'''
+Builds the TraceModel and loads its weights, raises if the weights cannot be read
+'''
+def read_model(model_path : str | Path = constants.MODEL_PATH, dimensions : list[int] = constants.SMALL_MODEL_DIMENSIONS) -> TraceModel:
+     model = TraceModel(nn.CrossEntropyLoss(), dimensions, nn.ReLU())
+     state_dict = torch.load(model_path, weights_only=True)
+     model.load_state_dict(state_dict)
+     # set the model to Evaluation mode to infer on unseen data
+     model.eval()
+     return model
+
+
+class ModelLoader:
+
+     def __init__(self, model_path : str | Path = constants.MODEL_PATH, backend : str = constants.MODEL_BACKEND, cache_path : str | Path = constants.MODEL_CACHE_PATH, dimensions : list[int] = constants.SMALL_MODEL_DIMENSIONS):
+          self.model_path = Path(model_path)
+          self.backend = backend if backend in BACKENDS else constants.MODEL_BACKEND_EAGER
+          if backend != self.backend:
+               logger.warning(f"unknown model backend {backend}, using {self.backend}")
+          self.cache_path = Path(cache_path)
+          self.dimensions = dimensions
+          self.load_time : float | None = None
+          self._model : TraceModel | None = None
+          self._lock = threading.Lock()
+
+     @property
+     def loaded(self) -> bool:
+          return self._model is not None
+
+     '''
+     Returns the model, loading it on the first call. Concurrent callers wait for the same load.
+     '''
+     def get(self) -> TraceModel:
+          if self._model is not None:
+               return self._model
+          with self._lock:
+               if self._model is None:
+                    start_time = time.perf_counter()
+                    model = read_model(self.model_path, self.dimensions)
+                    self._compile(model)
+                    # the first batch allocates the buffers of the model and runs torch.compile, not the first analysis
+                    model.predict(torch.zeros(1, self.dimensions[0]))
+                    self.load_time = time.perf_counter() - start_time
+                    logger.info(f"loaded the {self.backend} model from {self.model_path} in {self.load_time:.2f}s")
+                    self._model = model
+          return self._model
+
+     '''
+     Loads the model in a background thread, so that it is ready when the first analysis is requested
+     '''
+     def warm_start(self) -> threading.Thread:
+          def load():
+               try:
+                    self.get()
+               except Exception as e:
+                    logger.error(f"could not load the model from {self.model_path} : {str(e)}")
+          thread = threading.Thread(target=load, name="model-warm-start", daemon=True)
+          thread.start()
+          return thread
+
+     def _compile(self, model : TraceModel) -> None:
+          try:
+               if self.backend == constants.MODEL_BACKEND_TORCHSCRIPT:
+                    model.compiled_forward = self._torchscript_module(model).forward
+               elif self.backend == constants.MODEL_BACKEND_COMPILE:
+                    os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", str(self.cache_path / "inductor"))
+                    model.compiled_forward = torch.compile(model.forward, dynamic=True)
+          except Exception as e:
+               logger.warning(f"could not build the {self.backend} model, inferring in eager mode : {str(e)}")
+               model.compiled_forward = None
+
+     '''
+     The traced module for the weights in model_path, traced and written to the cache if it was not traced before
+     '''
+     def _torchscript_module(self, model : TraceModel) -> torch.jit.ScriptModule:
+          digest = hashlib.sha256(self.model_path.read_bytes()).hexdigest()[:16]
+          artifact = self.cache_path / f"{self.model_path.stem}.{digest}.torchscript.pt"
+          if artifact.is_file():
+               return torch.jit.load(str(artifact))
+          with torch.no_grad():
+               module = torch.jit.freeze(torch.jit.trace(model, torch.zeros(2, self.dimensions[0])).eval())
+          self.cache_path.mkdir(parents=True, exist_ok=True)
+          temporary = artifact.with_name(f"{artifact.name}.{os.getpid()}.tmp")
+          torch.jit.save(module, str(temporary))
+          os.replace(temporary, artifact)
+          logger.info(f"cached the torchscript model in {artifact}")
+          return module
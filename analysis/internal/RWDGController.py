@@ -18,21 +18,6 @@ It is part of the RWDG Trace model and therefore part for the data wranglin for
 
 logger = logging.getLogger(__name__)
 
-def mean_normalization( val : float, mean: float, min: float , max : float) -> float:
-     #logger.info(f"val : {val} , mean : {mean} , min : {min}, max : {max}")
-     if val == 0.0:
-          return val
-
-     if mean == 0.0 or max == 0.0:
-          return 0.0
-
-     nominator = val - mean
-     denominator = max - min
-     if denominator > 0:
-          return nominator / denominator
-     else:
-          return 0.0
-
 class RWDGController:
 
      def __init__(self, variables : list[TraceResponseVariable], experiment_id,  injected_service: str):
@@ -47,7 +32,8 @@ class RWDGController:
           if len(self.one_hot_encoding_for_exp) == 0:
                raise ColumnsNotPresent("Not all needed columns in the Dataframe are present")
           self.one_hot_encoding_column_names = gen_one_hot_encoding_col_names()
-          self.supervised_column = get_treatment_column(list(self.variables[0].data.columns))
+          # variables loaded from the feature store only have their adjency matrices, which keep the treatment column as well
+          self.supervised_column = self.variables[0].treatment_column
 
      '''Normalizes the calculated weight matrices after the mean normalization
           This has the affect that each value is in range [0, 1] '''
@@ -56,31 +42,27 @@ class RWDGController:
      # if cell in column is null it should NOT be included ==> might require implementation yourself
 
      def normalizes_response_variables(self):
+          for var in self.variables:
+               self._normalize_variable(var)
+
+     def _normalize_variable(self, var : TraceResponseVariable) -> None:
 
           # we do not want to do it with error_code columns, just the request time columns
           numerical_column_names = self.column_names[:len(self.column_names) -1]
 
-          for var in self.variables:
-               if var.adf_matrices	is not None:
-                    avg_values = []
-                    max_values = []
-                    min_values = []
-                    for col in numerical_column_names:
-                         non_zero_values = var.adf_matrices[col][var.adf_matrices[col] != 0.0]
-                         non_zero_values = non_zero_values.astype(float)
-                         if len(non_zero_values) > 0:
-                              avg = float(non_zero_values.mean())
-                         else:
-                              avg = 0.0
-                         avg_values.append(avg)
-                         max_values.append(float(var.adf_matrices[col].max()))
-                         min_values.append(float(var.adf_matrices[col].min()))
-
-                    #logger.info(f"these are the mean values: {avg_values}")
-                    #logger.info(f"these are the min values: {min_values}")
-                    #logger.info(f"these are the max values: {max_values}")
-                    for x in range(len(numerical_column_names)):
-                         var.adf_matrices[numerical_column_names[x]] = var.adf_matrices[numerical_column_names[x]].apply(lambda val : mean_normalization(val, avg_values[x], min_values[x], max_values[x]))
+          if var.features is not None and len(var.features) > 0:
+               values = var.features[:, :len(numerical_column_names)].astype(np.float64)
+               # the mean only includes the requests that were made, max and min include the zeros
+               non_zero = (values != 0.0) & ~np.isnan(values)
+               non_zero_count = non_zero.sum(axis=0)
+               avg_values = np.divide(np.where(non_zero, values, 0.0).sum(axis=0), non_zero_count, out=np.zeros(values.shape[1]), where=non_zero_count > 0)
+               max_values = np.nanmax(values, axis=0)
+               min_values = np.nanmin(values, axis=0)
+               denominator = max_values - min_values
+               normalizable = (avg_values != 0.0) & (max_values != 0.0) & (denominator > 0)
+               with np.errstate(invalid="ignore"):
+                    normalized = np.divide(values - avg_values, denominator, out=np.zeros(values.shape), where=normalizable)
+               var.features[:, :len(numerical_column_names)] = np.where(values == 0.0, values, normalized)
           
 
      '''
@@ -89,149 +71,108 @@ class RWDGController:
      0 : if there is no error
      '''
      def trace_has_error(self, trace_data : pd.DataFrame) -> int:
-          has_error = 0
-          for _ , val in trace_data[constants.REQ_STATUS_CODE].items():
-               if pd.isna(val):
-                    continue
-               val = str(int(val))
-               if len(val) == 3:
-                    # http status code
-                    if self.is_http_error(val):
-                         has_error = 1
-                         return has_error
-               
-               elif len(val) <= 2:
-                    # gRPC status code
-                    if self.is_grpc_error(val):
-                         has_error = 1
-                         return has_error
-          
-          return has_error
-     
-     def is_http_error(self, http_status_code : str) -> bool:
-          return (http_status_code[0] == "4" or http_status_code[0] == "5")
+          return int(self.spans_with_error(trace_data[constants.REQ_STATUS_CODE]).any())
 
-     def is_grpc_error(self, grpc_status_code : str) -> bool:
-          return not grpc_status_code == "0"
-
-                    
+     '''
+     Flags every span whose status code is an error. Codes with three digits are http status codes and errors if they start with 4 or 5,
+     codes with up to two digits are gRPC status codes and errors unless they are 0. Spans without a numeric code have no error.
+     '''
+     def spans_with_error(self, status_codes : pd.Series) -> np.ndarray:
+          codes = np.trunc(pd.to_numeric(status_codes, errors="coerce").to_numpy(dtype=float))
+          is_http_error = (codes >= 400) & (codes < 600)
+          is_grpc_error = (codes >= -9) & (codes <= 99) & (codes != 0)
+          return is_http_error | is_grpc_error
+     
      '''
      This functions iterates over all the trace responsevariables and does the data transformation and the
      KPI calculation for each variable
      '''
      def iterate_over_varibales(self)-> None:
           for var in self.variables:
-               self._adj_mat_for_var(var)
-               self._calc_error_ratio_for_var(var)
-          
-          self.normalizes_response_variables()
-     
-     def _adj_mat_for_var(self , response_variable : TraceResponseVariable)-> None:
-          dataframe_rows = []
-          group_df = response_variable.data.groupby(constants.TRACE_ID_COLUMN)
-          for _, single_trace_data in group_df:
-               new_row = []
-               raw_adj = self.gen_adf(single_trace_df=single_trace_data)
-               weighted = self._weight_adjency_matrix(raw_adj)
-               new_row.append(single_trace_data[constants.TRACE_ID_COLUMN].iloc[0])
-               new_row.extend(np.array(weighted).flatten())
-               new_row.append(self.trace_has_error(single_trace_data))
-               new_row.append(response_variable.service_name)
-               if single_trace_data[self.supervised_column].iloc[0] == constants.NO_TREATMENT:
-                    new_row.extend(self.gen_one_hot_encpding_for_no_fault())
-               else:
-                    new_row.extend(self.gen_one_hot_encoding_for_exp())
-               new_row.append(single_trace_data[self.supervised_column].iloc[0])
-               dataframe_rows.append(new_row)
-          
-          # unpack the colum names
-          '''Microservice name is here important. Later on we are going to merge the dataframes for each response variable and we still wan to have a direct mapping towards a service '''
-          '''[trace_id, flattened_out weighted adj matrix, microservice_name, one hot encoding for treatment]'''
-          #print(dataframe_rows[0])
-         # print("_________________")
-          #print([constants.TRACE_ID_COLUMN, *self.column_names, "microservice_name", constants.ERROR_IN_TRACE_COLUMN, *self.one_hot_encoding_column_names, self.supervised_column])
-         # exit(1)
-          response_variable.adf_matrices = pd.DataFrame(dataframe_rows , columns=[constants.TRACE_ID_COLUMN, *self.column_names, constants.ERROR_IN_TRACE_COLUMN, "microservice_name",  *self.one_hot_encoding_column_names, self.supervised_column])
-         
+               self.transform_variable(var)
+
      '''
-     To add internal spans to the next network span, we are going to use a stack of networl request that hold the index tuple for the matrix
-     and will add the span onto the sum. Important to note that we will NOT increment the counter for that index tuple. Also we will not pop the element as normal rather peek. Given the
-     possibility that two internal spans happen after each other. For this to work, we will also sort the spans of the trace after the starttime of the trace so eventaully every internal span will find
-     a network parent, because frontend proxy will be invoked first.
+     Does the data transformation and the KPI calculation for a single variable, the variables do not depend on each other
      '''
-     def gen_adf(self, single_trace_df : pd.DataFrame) -> list[list[tuple[int, float]]]:
-
-          adjency_matrix = [[(0, 0.0) for _ in range(len(constants.SERVICES))] for _ in range(len(constants.SERVICES))]
-          stack = []
-          sorted = single_trace_df.sort_values(by=constants.START_TIME, ascending=True)
-
-          for _ , row in sorted.iterrows():
-
-               if row[constants.SPAN_KIND] == constants.INTERNAL_TYPE:
-                    span_duration = row[constants.DURATION_COLUMN]
-                    # peek the stack
-                    if len(stack) > 0:
-                         indices = stack[-1]
-                         self.handle_internal_span(indices, adjency_matrix, span_duration)
-                         continue
-                    else:
-                         continue
-
-               ref_span_id = row[constants.REF_TYPE_SPAN_ID]
-
-               if ref_span_id == constants.NOT_AVAILABLE:
-                    #we have found the FE proxy invocation
-                    continue
-               ref_service_name = self._find_service_name_for_spanID(ref_span_id=ref_span_id, single_trace_df=single_trace_df)
-               if ref_service_name == "":
-                    # I am not sure when this happens, but it can happen
-                    continue
-               service_name = row[constants.SERVICE_NAME_COLUMN]
-               duration = row[constants.DURATION_COLUMN]
-               """row_ind is the client span , col_ind the server span --> [client , server] for the index tuple in the matric insertion"""
-               try:
-                    row_ind = constants.SERVICES[service_name]
-                    col_ind = constants.SERVICES[ref_service_name]
-               except Exception as e:
-                    #print(f"ref_service_name or service_name : {ref_service_name}, {service_name} not found")
-                    logger.info(f"ref_service_name or service_name : {ref_service_name}, {service_name} not found")
-                    continue
-               if adjency_matrix[row_ind][col_ind][0] == -1:
-                    adjency_matrix[row_ind][col_ind] = (1 , duration)
-               else:
-                    tuple_val = adjency_matrix[row_ind][col_ind]
-                    adjency_matrix[row_ind][col_ind] = (tuple_val[0] +1, tuple_val[1] + duration)
-               stack.append([row_ind, col_ind])
-               
-          return adjency_matrix
+     def transform_variable(self, var : TraceResponseVariable) -> None:
+          self._adj_mat_for_var(var)
+          self._calc_error_ratio_for_var(var)
+          self._normalize_variable(var)
      
+     def _adj_mat_for_var(self , response_variable : TraceResponseVariable)-> None:
+          data = response_variable.data
+          trace_codes, counts, durations = self.gen_adf_tensors(data)
+          weighted = self._weight_adjency_tensors(counts, durations)
+          n_traces = len(counts)
+          # the attributes of a trace are taken from its first span, traces are ordered by their id like groupby does
+          _, first_spans = np.unique(trace_codes[trace_codes >= 0], return_index=True)
+          first_spans = np.flatnonzero(trace_codes >= 0)[first_spans]
+          treatments = data[self.supervised_column].to_numpy()[first_spans]
+          in_trace = trace_codes >= 0
+          has_error = np.bincount(trace_codes[in_trace], weights=self.spans_with_error(data[constants.REQ_STATUS_CODE])[in_trace], minlength=n_traces) > 0
+          # the class of a trace is the index of the 1 in its one hot encoding
+          classes = np.where(treatments == constants.NO_TREATMENT, np.argmax(self.gen_one_hot_encpding_for_no_fault()), np.argmax(self.gen_one_hot_encoding_for_exp()))
+
+          '''The traces are kept as arrays, TraceResponseVariable.adf_matrices builds
+          [trace_id, flattened_out weighted adj matrix, has_error_in_trace, microservice_name, one hot encoding for treatment, treatment] from them'''
+          response_variable.trace_ids = data[constants.TRACE_ID_COLUMN].to_numpy()[first_spans]
+          response_variable.features = weighted.reshape(n_traces, -1).astype(np.float32)
+          response_variable.has_error = has_error.astype(np.int8)
+          response_variable.classes = classes.astype(np.int8)
+          response_variable.treatments = pd.Categorical(treatments)
 
-     def handle_internal_span(self, indices : list[int], adjency_matrix : list[list[float]], span_duration : int):
-          tuple_before = adjency_matrix[indices[0]][indices[1]]
-          adjency_matrix[indices[0]][indices[1]] = (tuple_before[0], tuple_before[1] + span_duration)
-
-
-     """find corresponding name for the parent span to generate index tuple"""
-     def _find_service_name_for_spanID(self, ref_span_id : str, single_trace_df : pd.DataFrame) -> str:
-          # sometimes spans reference other trace ids in the  --> this slows down speed tremendiously!!! (maybe just leave it out and save time)
-          for _, row in single_trace_df.iterrows():
-               if row[constants.SPAN_ID_COLUMN] == ref_span_id:
-                   return row[constants.SERVICE_NAME_COLUMN]
-          
-          return ""
-
-     '''This function just weights the '''
-     def _weight_adjency_matrix(self, tuple_adj_matrix : list[list[tuple[int, float]]]) -> list[list[float]]:
-
-          result = [[0.0 for _ in range(len(self.service_name_mapping))] for _ in range(len(self.service_name_mapping))]
-          for row_index, row  in enumerate(tuple_adj_matrix):
-               for col_index , col in enumerate(row):
-                    sum_req_times = tuple_adj_matrix[row_index][col_index][1]
-                    number_reqs = tuple_adj_matrix[row_index][col_index][0]
-                    if number_reqs > 0:
-                         result[row_index][col_index] = sum_req_times / number_reqs
-
-          return result
+     '''
+     Builds the adjency matrices of all traces of a variable at once. It returns the trace index of each span (-1 for spans without trace id),
+     and the request count and the summed request time of every [client, server] index tuple as (n_traces, 16, 16) tensors. Traces are indexed in the order
+     of their sorted trace ids.
+     The parent service of a span is looked up with one merge on (trace, span id) instead of a scan over the trace, and the network span an internal span
+     is added onto is the last counted network span before it after sorting all spans by trace and start time. Spans of a trace that start at the same time
+     keep their order in the data, the row-wise implementation this replaced (analysis/benchmarks/reference.py) left the order of such spans to an unstable sort.
+     '''
+     def gen_adf_tensors(self, data : pd.DataFrame) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+          n_services = len(constants.SERVICES)
+          trace_codes, trace_ids = pd.factorize(data[constants.TRACE_ID_COLUMN], sort=True)
+          n_traces = len(trace_ids)
+          service_names = sorted(constants.SERVICES, key=constants.SERVICES.get)
+          service_codes = pd.Categorical(data[constants.SERVICE_NAME_COLUMN], categories=service_names).codes.astype(np.int64)
+
+          # span id -> service of the span, the first span with an id wins
+          spans = pd.DataFrame({"trace": trace_codes, "span": data[constants.SPAN_ID_COLUMN].to_numpy(), "parent_service": service_codes})
+          spans = spans[(spans["trace"] >= 0) & spans["span"].notna() & (spans["span"] != constants.MISSING_ID)].drop_duplicates(["trace", "span"])
+          references = pd.DataFrame({"trace": trace_codes, "span": data[constants.REF_TYPE_SPAN_ID].to_numpy()})
+          parent_codes = references.merge(spans, on=["trace", "span"], how="left")["parent_service"].fillna(-1).to_numpy(dtype=np.int64)
+
+          is_internal = (data[constants.SPAN_KIND] == constants.INTERNAL_TYPE).to_numpy()
+          is_network = (
+               ~is_internal
+               & (data[constants.REF_TYPE_SPAN_ID] != constants.NOT_AVAILABLE).to_numpy()
+               & (trace_codes >= 0) & (service_codes >= 0) & (parent_codes >= 0)
+          )
+          cells = service_codes * n_services + parent_codes
+
+          # spans are visited in the order of their start time, the stack top is the last network span counted before a span
+          order = np.lexsort((data[constants.START_TIME].to_numpy(), trace_codes))
+          sorted_traces = trace_codes[order]
+          sorted_network = is_network[order]
+          last_network = np.maximum.accumulate(np.where(sorted_network, np.arange(len(order)), -1))
+          has_parent = last_network >= 0
+          has_parent[has_parent] &= sorted_traces[last_network[has_parent]] == sorted_traces[has_parent]
+          sorted_internal = is_internal[order] & has_parent & (sorted_traces >= 0)
+
+          durations = data[constants.DURATION_COLUMN].to_numpy(dtype=np.float64)[order]
+          sorted_cells = cells[order]
+          sorted_cells[sorted_internal] = sorted_cells[last_network[sorted_internal]]
+          counted = sorted_network | sorted_internal
+          flat = sorted_traces[counted] * n_services * n_services + sorted_cells[counted]
+          size = n_traces * n_services * n_services
+          count_tensor = np.bincount(flat, weights=sorted_network[counted], minlength=size).astype(np.int64)
+          duration_tensor = np.bincount(flat, weights=durations[counted], minlength=size)
+          shape = (n_traces, n_services, n_services)
+          return trace_codes, count_tensor.reshape(shape), duration_tensor.reshape(shape)
+
+     '''Average request time of every index tuple of the (n_traces, 16, 16) tensors, 0.0 where no request was counted'''
+     def _weight_adjency_tensors(self, counts : np.ndarray, durations : np.ndarray) -> np.ndarray:
+          return np.divide(durations, counts, out=np.zeros(durations.shape), where=counts > 0)
 
      """
           One hot encoding in the case that there was a fault injected in the service.
@@ -264,26 +205,26 @@ class RWDGController:
           P(trace has no error code | goody Trace)
      '''
      def _calc_error_ratio_for_var(self, var : TraceResponseVariable) -> None:
-          if var.adf_matrices is not None:
-               faulty_traces_with_error = 0
-               faulty_traces_no_error = 0
-               good_traces_with_error = 0
-               good_traces_no_error = 0
+          if var.features is not None:
+               faulty = np.asarray(var.treatments != constants.NO_TREATMENT)
+               has_error = var.has_error
                # number of traces within the varibale
-               len_goody_traces = len(var.adf_matrices[var.adf_matrices[self.supervised_column] == constants.NO_TREATMENT])
-               len_faulty_traces = len(var.adf_matrices[var.adf_matrices[self.supervised_column] != constants.NO_TREATMENT])
-               for _,row  in var.adf_matrices.iterrows():
-                    if row[constants.ERROR_IN_TRACE_COLUMN] == 0 and row[self.supervised_column] == constants.NO_TREATMENT:
-                         good_traces_no_error +=1
-                    elif row[constants.ERROR_IN_TRACE_COLUMN] == 1 and row[self.supervised_column] == constants.NO_TREATMENT:
-                         good_traces_with_error += 1 
-                    elif row[constants.ERROR_IN_TRACE_COLUMN] == 0 and row[self.supervised_column] != constants.NO_TREATMENT:
-                         faulty_traces_no_error += 1
-                    elif row[constants.ERROR_IN_TRACE_COLUMN] == 1 and row[self.supervised_column] != constants.NO_TREATMENT:
-                         faulty_traces_with_error +=1
+               len_goody_traces = int((~faulty).sum())
+               len_faulty_traces = int(faulty.sum())
                if len_faulty_traces > 0:
-                    var.error_ratio[constants.FAULTY_ERROR] = faulty_traces_with_error / len_faulty_traces
-                    var.error_ratio[constants.FAULTY_NO_ERROR] = faulty_traces_no_error / len_faulty_traces
+                    var.error_ratio[constants.FAULTY_ERROR] = int((faulty & (has_error == 1)).sum()) / len_faulty_traces
+                    var.error_ratio[constants.FAULTY_NO_ERROR] = int((faulty & (has_error == 0)).sum()) / len_faulty_traces
                if len_goody_traces > 0:
-                    var.error_ratio[constants.GOOD_ERROR] = good_traces_with_error / len_goody_traces
-                    var.error_ratio[constants.GOOD_NO_ERROR] = good_traces_no_error / len_goody_traces
+                    var.error_ratio[constants.GOOD_ERROR] = int((~faulty & (has_error == 1)).sum()) / len_goody_traces
+                    var.error_ratio[constants.GOOD_NO_ERROR] = int((~faulty & (has_error == 0)).sum()) / len_goody_traces
+
+
+'''
+Transforms the data of a single response variable in a worker process of the analysis. Only the data of the variable is sent to the worker
+and only its transformed traces and error ratios are sent back.
+'''
+def transform_variable(data : pd.DataFrame, experiment_id : str, service_name : str, injected_service : str) -> TraceResponseVariable:
+     variable = TraceResponseVariable(data, experiment_id, service_name)
+     RWDGController([variable], experiment_id, injected_service).transform_variable(variable)
+     variable.data = None
+     return variable
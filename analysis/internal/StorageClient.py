@@ -19,6 +19,17 @@ def config_predicate(name:str) -> bool:
      return "config" in name
 
 
+COLUMNAR_SUFFIXES = (".parquet", ".feather")
+
+def prefer_columnar(file_names : list[str]) -> list[str]:
+     """
+     Drops JSON response files that were also written in a columnar format by the backend,
+     so every response variable is read once and from the file that is fastest to load
+     """
+     columnar_stems = {Path(name).stem for name in file_names if Path(name).suffix in COLUMNAR_SUFFIXES}
+     return [name for name in file_names if not (Path(name).suffix == ".json" and Path(name).stem in columnar_stems)]
+
+
 # TODO add "health check" up on creating the pod to check if the client can access the PV mounts
 
 class LocalStorageHandler():
@@ -67,7 +78,7 @@ class LocalStorageHandler():
      def list_files_in_dir(self, experiment_id :str) -> list[str]:
           try:
                files = os.listdir(self.experiment_path)
-               file_names =  list(filter(lambda x : experiment_id in x , files))
+               file_names =  prefer_columnar(list(filter(lambda x : experiment_id in x , files)))
                logger.debug(f"found files for id : {experiment_id} : {str(file_names)}")
                return file_names
           except FileNotFoundError:
@@ -89,9 +100,16 @@ class LocalStorageHandler():
      def get_file_from_dir(self, file_name:str) -> tuple[pd.DataFrame, str] | None:
           try:
                file_path = Path(self.experiment_path) / file_name
-               with open(file_path, 'r' ) as file:
-                    data = json.load(file)
-               df =  pd.DataFrame(data)
+               if file_path.suffix == ".parquet":
+                    df = pd.read_parquet(file_path)
+               elif file_path.suffix == ".feather":
+                    df = pd.read_feather(file_path)
+               else:
+                    with open(file_path, 'r' ) as file:
+                         data = json.load(file)
+                    df =  pd.DataFrame(data)
+               # categorical columns of the columnar formats are handled like the plain strings read from JSON
+               df = df.astype({column : object for column in df.select_dtypes("category").columns})
                df.replace(['N/A', 'null', ''], np.nan, inplace=True)
 
                if not self._check_columns_exist(df, constants.REQUIRED_COLUMNS) :
@@ -116,7 +134,7 @@ class LocalStorageHandler():
           return len(missing_columns) == 0 and treatment != ""
 
      def _retrieve_service_name(self, file_name : str) -> str:
-          pattern = r'_(.*?)_traces\.json'
+          pattern = r'_(.*?)_traces\.(?:json|parquet|feather)'
           match = re.search(pattern, file_name)
           if match:
                return match.group(1)
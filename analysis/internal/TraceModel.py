@@ -16,6 +16,11 @@ import analysis.internal.constants as constants
 
 logger = logging.getLogger(__name__)
 
+def class_targets(labels : torch.Tensor) -> torch.Tensor:
+     '''Class indices of a batch, the labels are either class indices or one hot encoded'''
+     return labels if labels.dim() == 1 else torch.argmax(labels, dim=1)
+
+
 class TraceModel(nn.Module):
 
      def __init__(self, loss_function : Callable,   dimensions : list[int], activation : Callable):
@@ -24,6 +29,8 @@ class TraceModel(nn.Module):
           self.activation = activation
           self.layers : nn.ModuleList = self.init_model_layers(dimensions=dimensions)
           self.soft_max : nn.Module = nn.Softmax(dim=0)
+          # forward of the TorchScript or torch.compile version of the model, set by the ModelLoader and used by predict
+          self.compiled_forward : Callable | None = None
           
           
      def init_model_layers(self, dimensions : list[int])-> nn.ModuleList:
@@ -155,7 +162,7 @@ class TraceModel(nn.Module):
                     for batch, labels in train_loader:
                          optimizer.zero_grad()
                          out =  self.forward(batch)
-                         targets = torch.argmax(labels, dim=1)
+                         targets = class_targets(labels)
                          loss = self.loss_function(out, targets)
                          acc, precision = self.calc_acc_for_class_index(out, targets)
                          multi_class_predictions_accuracies.append(acc)
@@ -175,7 +182,7 @@ class TraceModel(nn.Module):
                for batch , labels in test_loader:
                     #labels = labels.long()
                     out = self.forward(batch)
-                    targets = torch.argmax(labels, dim=1)
+                    targets = class_targets(labels)
                     acc , precison = self.calc_acc_for_class_index(out, targets)
                     multi_class_predictions_accuracies.append(acc)
                     multi_class_predictions_precisons.append(precison)
@@ -196,7 +203,7 @@ class TraceModel(nn.Module):
                     for batch, labels in train_loader:
                          optimizer.zero_grad()
                          out =  self.forward(batch)
-                         targets = torch.argmax(labels, dim=1)
+                         targets = class_targets(labels)
                          loss = self.loss_function(out, targets)
                          # just for vizualizing during training
                          recom_precision, no_fault_precision, other_class_pred_ratio = self.calculate_per_class_precision(out, targets)
@@ -215,6 +222,20 @@ class TraceModel(nn.Module):
           input = self.forward(input)
           input = self.soft_max(input)
           return input
+
+     '''
+     Predicts the class index for every row of a (n_traces, n_features) input in batches of batch_size.
+     The softmax does not change which class has the highest output, so the argmax is taken over the raw outputs.
+     '''
+     def predict(self, inputs : torch.Tensor, batch_size : int = constants.INFERENCE_BATCH_SIZE) -> torch.Tensor:
+          forward = self.compiled_forward if self.compiled_forward is not None else self.forward
+          predictions = []
+          with torch.inference_mode():
+               for batch in torch.split(inputs, batch_size):
+                    predictions.append(torch.argmax(forward(batch), dim=1))
+          if len(predictions) == 0:
+               return torch.empty(0, dtype=torch.int64)
+          return torch.cat(predictions)
  
      
      def test_trace_model(self, test_loader : DataLoader) ->  list[float]:
@@ -227,7 +248,7 @@ class TraceModel(nn.Module):
                for batch , labels in test_loader:
                     #labels = labels.long()
                     out = self.forward(batch)
-                    targets = torch.argmax(labels, dim=1)
+                    targets = class_targets(labels)
                     precision_recom , precison_no_fault, other_class_ratios = self.calculate_per_class_precision(out, targets)
                     precison_recom_list.append(precision_recom)
                     precison_no_fault_list.append(precison_no_fault)
@@ -257,7 +278,7 @@ class TraceModel(nn.Module):
           with torch.no_grad():
                for batch, labels in test_loader:
                     out = self.forward(batch)
-                    targets = torch.argmax(labels, dim=1)
+                    targets = class_targets(labels)
                     preds = torch.argmax(out, dim=1)  # Get predicted class indices
 
                     # Compute per-class precision
@@ -1,21 +1,137 @@
 
+import logging
+import numpy as np
 import pandas as pd
 import torch
 from typing import Optional
+import analysis.internal.constants as constants
+from analysis.internal.utils import gen_one_hot_encoding_col_names, build_colum_names_for_adf_mat_df, get_treatment_column
 
+logger = logging.getLogger(__name__)
+
+'''
+Packs string ids into 64 bit integers by hashing them. A collision needs two of the ids of a variable to share a 64 bit hash, which
+is negligible for the number of spans of an experiment. Missing ids become constants.MISSING_ID.
+'''
+def pack_ids(ids : pd.Series) -> np.ndarray:
+     if pd.api.types.is_integer_dtype(ids.dtype):
+          return ids.to_numpy(dtype=np.int64)
+     values = ids.to_numpy(dtype=object)
+     missing = pd.isna(values) | (values == constants.NOT_AVAILABLE)
+     values = np.where(missing, "", values)
+     try:
+          # every span has its own span id, trace ids repeat and are only hashed once per trace
+          packed = pd.util.hash_array(values, categorize=ids.name in (constants.TRACE_ID_COLUMN, constants.REF_TYPE_TRACE_ID)).view(np.int64)
+     except TypeError:
+          packed = pd.util.hash_array(values.astype(str)).view(np.int64)
+     packed[missing] = constants.MISSING_ID
+     return packed
+
+'''
+Compact copy of the spans of a response variable: ids are packed into int64, status codes are numeric and all other text columns are categorical.
+'''
+def compact_spans(data : pd.DataFrame) -> pd.DataFrame:
+     columns = {}
+     for column in data.columns:
+          values = data[column]
+          if column in constants.ID_COLUMNS:
+               columns[column] = pack_ids(values)
+          elif column == constants.REQ_STATUS_CODE:
+               # codes that are not numeric are never errors, see RWDGController.spans_with_error
+               columns[column] = pd.to_numeric(values, errors="coerce").astype(np.float32)
+          elif values.dtype == object:
+               columns[column] = values.astype("category")
+          else:
+               columns[column] = values
+     return pd.DataFrame(columns, index=data.index)
+
+
+'''
+The spans of a response variable and its transformed traces. The traces are kept as arrays, the wide dataframe the model was trained on
+is only built when adf_matrices is read.
+'''
 class TraceResponseVariable:
+     __slots__ = (
+          "data", "experiment_id", "service_name", "file_name", "treatment_column",
+          "trace_ids", "features", "has_error", "classes", "treatments",
+          "error_ratio", "predictions", "micro_precision", "micro_recall", "micro_f1_score",
+     )
 
-     def __init__(self, data : pd.DataFrame, experiment_id : str, service_name):
-          self.data = data
+     def __init__(self, data : Optional[pd.DataFrame], experiment_id : str, service_name, file_name : Optional[str] = None):
+          # None if the variable was transformed before and its adjency matrices were loaded from the feature store
+          self.data : Optional[pd.DataFrame] = compact_spans(data) if data is not None else None
           self.experiment_id = experiment_id
           self.service_name = service_name
-          self.adf_matrices : Optional[pd.DataFrame] = None
+          self.file_name = file_name
+          self.treatment_column : str = get_treatment_column(list(data.columns)) if data is not None else ""
+          # one entry or row per trace, set by the RWDGController
+          self.trace_ids : Optional[np.ndarray] = None
+          # (n_traces, 256) float32 flattened adjency matrices
+          self.features : Optional[np.ndarray] = None
+          self.has_error : Optional[np.ndarray] = None
+          # index of the one hot encoded class of every trace
+          self.classes : Optional[np.ndarray] = None
+          self.treatments : Optional[pd.Categorical] = None
           self.error_ratio : dict[str, float] = {}
           self.predictions : Optional[torch.Tensor] = None
           self.micro_precision = None
           self.micro_recall = None
           self.micro_f1_score = None
 
-     
-     
+     '''Takes over the transformed traces and error ratios of a copy of the variable that was transformed in another process'''
+     def take_traces(self, transformed : "TraceResponseVariable") -> None:
+          self.treatment_column = transformed.treatment_column
+          self.trace_ids = transformed.trace_ids
+          self.features = transformed.features
+          self.has_error = transformed.has_error
+          self.classes = transformed.classes
+          self.treatments = transformed.treatments
+          self.error_ratio = transformed.error_ratio
+
+     def trace_count(self) -> int:
+          return 0 if self.features is None else len(self.features)
+
+     '''The inputs of the TraceModel: the adjency matrices and the error flag of every trace'''
+     def model_inputs(self) -> np.ndarray:
+          return np.hstack([self.features, self.has_error[:, None].astype(np.float32)])
+
+     '''[trace_id, flattened out weighted adj matrix, has_error_in_trace, microservice_name, one hot encoding for treatment, treatment]'''
+     @property
+     def adf_matrices(self) -> Optional[pd.DataFrame]:
+          if self.features is None:
+               return None
+          n_traces = len(self.features)
+          return pd.concat([
+               pd.DataFrame({constants.TRACE_ID_COLUMN: self.trace_ids}),
+               pd.DataFrame(self.features, columns=build_colum_names_for_adf_mat_df()),
+               pd.DataFrame({
+                    constants.ERROR_IN_TRACE_COLUMN: self.has_error.astype(np.int64),
+                    "microservice_name": pd.Categorical([self.service_name]).repeat(n_traces),
+               }),
+               pd.DataFrame(np.eye(len(constants.SERVICES) + 1, dtype=np.float32)[self.classes], columns=gen_one_hot_encoding_col_names()),
+               pd.DataFrame({self.treatment_column: self.treatments}),
+          ], axis=1)
+
+     @adf_matrices.setter
+     def adf_matrices(self, adf_matrices : Optional[pd.DataFrame]) -> None:
+          if adf_matrices is None:
+               self.trace_ids = self.features = self.has_error = self.classes = self.treatments = None
+               return
+          self.treatment_column = get_treatment_column(list(adf_matrices.columns))
+          self.trace_ids = pack_ids(adf_matrices[constants.TRACE_ID_COLUMN])
+          self.features = adf_matrices[build_colum_names_for_adf_mat_df()].to_numpy(dtype=np.float32)
+          self.has_error = adf_matrices[constants.ERROR_IN_TRACE_COLUMN].to_numpy(dtype=np.int8)
+          self.classes = np.argmax(adf_matrices[gen_one_hot_encoding_col_names()].to_numpy(), axis=1).astype(np.int8)
+          self.treatments = pd.Categorical(adf_matrices[self.treatment_column])
+
+     '''Bytes held by the spans and by the transformed traces of the variable'''
+     def memory_usage(self) -> dict[str, int]:
+          traces = [self.trace_ids, self.features, self.has_error, self.classes]
+          return {
+               "spans": int(self.data.memory_usage(deep=True).sum()) if self.data is not None else 0,
+               "traces": sum(array.nbytes for array in traces if array is not None) + (self.treatments.nbytes if self.treatments is not None else 0),
+          }
 
+     def log_memory_usage(self) -> None:
+          usage = self.memory_usage()
+          logger.info(f"{self.service_name}: {self.trace_count()} traces, spans {usage['spans'] / 2**20:.1f} MiB, traces {usage['traces'] / 2**20:.1f} MiB")
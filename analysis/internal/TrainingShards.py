@@ -0,0 +1,172 @@
+"""
+Out-of-core training data for the TraceModel.
+The transformed response variables are written once to memory mapped .npy shards of float32 inputs and int64 class labels,
+split into a train and a test set. TrainingShardDataset serves contiguous batches of a shard without copying them, so the
+training data no longer has to fit into memory.
+"""
+from __future__ import annotations
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Iterable
+import numpy as np
+import pandas as pd
+import torch
+from torch.utils.data import DataLoader, Dataset
+import analysis.internal.constants as constants
+
+logger = logging.getLogger(__name__)
+
+SPLITS = ("train", "test")
+META_FILE = "meta.json"
+SPLIT_FILE = "split.npz"
+
+
+def _shard_files(path : Path, split : str, shard : int) -> tuple[Path, Path]:
+     return path / f"{split}_{shard:06d}.features.npy", path / f"{split}_{shard:06d}.labels.npy"
+
+
+class TrainingShardWriter:
+     '''
+     Writes the rows of transformed variables into shards of at most rows_per_shard rows. Every row is assigned to the test set
+     with probability test_fraction, and the rows of a shard are shuffled before it is written. Both only depend on the seed and the
+     order of the rows, so writing the same data again gives the same shards and split. source identifies the data the shards are
+     written from, shards of an earlier source in the directory are replaced.
+     '''
+     def __init__(self, path : str | Path, input_names : list[str], label_names : list[str], rows_per_shard : int = constants.TRAINING_ROWS_PER_SHARD, test_fraction : float = 0.2, seed : int = 0, source : str | None = None):
+          self.path = Path(path)
+          self.source = source
+          self.input_names = input_names
+          self.label_names = label_names
+          self.rows_per_shard = rows_per_shard
+          self.test_fraction = test_fraction
+          self.seed = seed
+          self._rng = np.random.default_rng(seed)
+          self._rows = 0
+          self._buffers : dict[str, list[tuple[np.ndarray, np.ndarray, np.ndarray]]] = {split : [] for split in SPLITS}
+          self._buffered : dict[str, int] = {split : 0 for split in SPLITS}
+          self._shards : dict[str, list[int]] = {split : [] for split in SPLITS}
+          self._row_ids : dict[str, list[np.ndarray]] = {split : [] for split in SPLITS}
+          self.path.mkdir(parents=True, exist_ok=True)
+          # the shards of an earlier source are no longer complete once the first new shard is written
+          (self.path / META_FILE).unlink(missing_ok=True)
+          for stale in self.path.glob("*.npy"):
+               stale.unlink()
+
+     def add(self, frame : pd.DataFrame) -> None:
+          features = frame[self.input_names].to_numpy(dtype=np.float32)
+          labels = np.argmax(frame[self.label_names].to_numpy(dtype=np.float32), axis=1).astype(np.int64)
+          row_ids = np.arange(self._rows, self._rows + len(frame), dtype=np.int64)
+          self._rows += len(frame)
+          is_test = self._rng.random(len(frame)) < self.test_fraction
+          for split, mask in [("train", ~is_test), ("test", is_test)]:
+               if mask.any():
+                    self._buffers[split].append((features[mask], labels[mask], row_ids[mask]))
+                    self._buffered[split] += int(mask.sum())
+               while self._buffered[split] >= self.rows_per_shard:
+                    self._flush(split, self.rows_per_shard)
+
+     def _flush(self, split : str, rows : int) -> None:
+          features = np.concatenate([buffer[0] for buffer in self._buffers[split]])
+          labels = np.concatenate([buffer[1] for buffer in self._buffers[split]])
+          row_ids = np.concatenate([buffer[2] for buffer in self._buffers[split]])
+          order = self._rng.permutation(rows)
+          features_file, labels_file = _shard_files(self.path, split, len(self._shards[split]))
+          np.save(features_file, np.ascontiguousarray(features[:rows][order]))
+          np.save(labels_file, labels[:rows][order])
+          self._row_ids[split].append(row_ids[:rows][order])
+          self._shards[split].append(rows)
+          self._buffers[split] = [(features[rows:], labels[rows:], row_ids[rows:])] if len(features) > rows else []
+          self._buffered[split] = len(features) - rows
+
+     '''
+     Writes the remaining rows, the split index and the metadata. The metadata is written last and marks the shards as complete.
+     '''
+     def close(self) -> None:
+          for split in SPLITS:
+               if self._buffered[split] > 0:
+                    self._flush(split, self._buffered[split])
+          np.savez(self.path / SPLIT_FILE, **{
+               split : np.concatenate(self._row_ids[split]) if len(self._row_ids[split]) > 0 else np.empty(0, dtype=np.int64)
+               for split in SPLITS
+          })
+          meta = {
+               "rows" : self._rows,
+               "input_names" : self.input_names,
+               "label_names" : self.label_names,
+               "test_fraction" : self.test_fraction,
+               "seed" : self.seed,
+               "shards" : self._shards,
+               "source" : self.source,
+          }
+          temporary = self.path / f"{META_FILE}.tmp"
+          temporary.write_text(json.dumps(meta))
+          os.replace(temporary, self.path / META_FILE)
+          logger.info(f"wrote {self._rows} training rows to {self.path}")
+
+
+def write_training_shards(frames : Iterable[pd.DataFrame], path : str | Path, input_names : list[str], label_names : list[str], **kwargs) -> Path:
+     writer = TrainingShardWriter(path, input_names, label_names, **kwargs)
+     for frame in frames:
+          writer.add(frame)
+     writer.close()
+     return Path(path)
+
+
+'''
+Whether complete shards were written to path, and if source is given, whether they were written from that source
+'''
+def shards_exist(path : str | Path, source : str | None = None) -> bool:
+     try:
+          meta = json.loads((Path(path) / META_FILE).read_text())
+     except FileNotFoundError:
+          return False
+     return source is None or meta.get("source") == source
+
+
+class TrainingShardDataset(Dataset):
+     '''
+     Dataset whose items are whole batches: item i is a (batch_size, n_inputs) float32 tensor and the (batch_size,) int64 class labels
+     of rows that lie next to each other in one shard. The tensors are views of the memory mapped shards, nothing is copied until a batch
+     is used. Use it with DataLoader(batch_size=None), shuffle then shuffles the order of the batches and several workers can prefetch them.
+     '''
+     def __init__(self, path : str | Path, split : str = "train", batch_size : int = 100):
+          self.path = Path(path)
+          self.split = split
+          self.batch_size = batch_size
+          self.meta = json.loads((self.path / META_FILE).read_text())
+          self.batches : list[tuple[int, int, int]] = []
+          for shard, rows in enumerate(self.meta["shards"][split]):
+               for start in range(0, rows, batch_size):
+                    self.batches.append((shard, start, min(start + batch_size, rows)))
+          # opened lazily, so that the dataset can be sent to DataLoader workers that map the shards themselves
+          self._shards : dict[int, tuple[np.ndarray, np.ndarray]] = {}
+
+     def __len__(self) -> int:
+          return len(self.batches)
+
+     def __getstate__(self) -> dict:
+          return dict(self.__dict__, _shards={})
+
+     def _shard(self, shard : int) -> tuple[np.ndarray, np.ndarray]:
+          if shard not in self._shards:
+               features_file, labels_file = _shard_files(self.path, self.split, shard)
+               # copy on write maps are writable, torch would warn about sharing the memory of a read only array
+               self._shards[shard] = (np.load(features_file, mmap_mode="c"), np.load(labels_file, mmap_mode="c"))
+          return self._shards[shard]
+
+     def __getitem__(self, index : int) -> tuple[torch.Tensor, torch.Tensor]:
+          shard, start, stop = self.batches[index]
+          features, labels = self._shard(shard)
+          return torch.from_numpy(features[start:stop]), torch.from_numpy(labels[start:stop])
+
+     def row_ids(self) -> np.ndarray:
+          '''Position of every row of the split in the data the shards were written from, in the order of the shards'''
+          return np.load(self.path / SPLIT_FILE)[self.split]
+
+     def loader(self, shuffle : bool = True, num_workers : int = constants.TRAINING_LOADER_WORKERS, seed : int = 0) -> DataLoader:
+          generator = torch.Generator().manual_seed(seed)
+          if num_workers > 0:
+               return DataLoader(self, batch_size=None, shuffle=shuffle, num_workers=num_workers, prefetch_factor=4, persistent_workers=True, generator=generator)
+          return DataLoader(self, batch_size=None, shuffle=shuffle, generator=generator)
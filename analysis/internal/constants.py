@@ -3,6 +3,7 @@
 This file just contains conmstants I use throught the entire backend
 """
 
+import os
 from pathlib import Path
 
 SERVICE_NAME_COLUMN = "service_name"
@@ -13,6 +14,10 @@ TRACE_ID_COLUMN = "trace_id"
 START_TIME = 'start_time'
 SPAN_KIND = 'span_kind'
 NOT_AVAILABLE = "N/A"
+REF_TYPE_TRACE_ID = "ref_type_trace_ID"
+# id columns that are packed into 64 bit integers, missing ids are packed to MISSING_ID which is not a valid trace or span id
+ID_COLUMNS = [TRACE_ID_COLUMN, SPAN_ID_COLUMN, REF_TYPE_SPAN_ID, REF_TYPE_TRACE_ID]
+MISSING_ID = 0
 
 REQUIRED_COLUMNS = ["trace_id","span_id", "operation" , "start_time", "end_time", "duration", "service_name" ,"span_kind",
                      "req_status_code", "ref_type", "ref_type_span_ID", "ref_type_trace_ID", "add_security_context" ]
@@ -95,4 +100,40 @@ MODEL_PATH = Path("internal/model") / "real_tracemodel.pt"
 
 MODEL_PATH_BIG_MODEL = Path("internal/model") / "real_tracemodel_big.pt"
 
+# how the analysis service runs the model: eager, torchscript (traced once and cached) or compile (torch.compile, slow first batch)
+MODEL_BACKEND_EAGER = "eager"
+MODEL_BACKEND_TORCHSCRIPT = "torchscript"
+MODEL_BACKEND_COMPILE = "compile"
+MODEL_BACKEND = os.getenv("OXN_MODEL_BACKEND", MODEL_BACKEND_EAGER)
+# cached TorchScript modules and torch.compile kernels
+MODEL_CACHE_PATH = Path(os.getenv("OXN_MODEL_CACHE_PATH", str(Path("internal/model") / "cache")))
+# load the model in the background when the analysis service starts instead of on the first analysis
+MODEL_WARM_START = os.getenv("OXN_MODEL_WARM_START", "true").lower() == "true"
+
+# number of traces that are put through the model in one forward pass during the analysis
+INFERENCE_BATCH_SIZE = int(os.getenv("OXN_INFERENCE_BATCH_SIZE", "4096"))
+
+# number of processes that transform the response variables of an experiment in parallel, 1 transforms them in the analysis process itself
+ANALYSIS_WORKERS = int(os.getenv("OXN_ANALYSIS_WORKERS", str(os.cpu_count() or 1)))
+
+# version of the output of RWDGController, has to be increased whenever the transform changes so cached features are not used anymore
+TRANSFORM_VERSION = 2
+# feature store of the transformed training data
+TRAINING_FEATURE_STORE_PATH = Path("internal/oxn") / "features"
+# memory mapped training shards written from the transformed training data
+TRAINING_SHARDS_PATH = Path("internal/oxn") / "shards"
+TRAINING_ROWS_PER_SHARD = int(os.getenv("OXN_TRAINING_ROWS_PER_SHARD", "65536"))
+# number of DataLoader processes that prefetch training batches
+TRAINING_LOADER_WORKERS = int(os.getenv("OXN_TRAINING_LOADER_WORKERS", "2"))
+
+# job queue of the analysis service: number of experiments analyzed at the same time and number of experiments that may wait for a worker
+ANALYSIS_JOB_WORKERS = int(os.getenv("OXN_ANALYSIS_JOB_WORKERS", "1"))
+ANALYSIS_JOB_QUEUE_SIZE = int(os.getenv("OXN_ANALYSIS_JOB_QUEUE_SIZE", "32"))
+
+# job states
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
 
@@ -27,4 +27,8 @@ class NoDataForExperiment(Exception):
 
 class ConfigFileNotFound(Exception):
     def __init__(self, message):
-        super().__init__(message)
\ No newline at end of file
+        super().__init__(message)
+
+class JobQueueFull(Exception):
+    def __init__(self, message):
+        super().__init__(message)
@@ -3,6 +3,7 @@ Some utility functions I need in several classes
 """
 import analysis.internal.constants as constants
 from analysis.internal.TraceModel import TraceModel
+from analysis.internal.ModelLoader import read_model
 import torch.nn as nn
 import torch
 from analysis.internal.exceptions import ServiceUnknown
@@ -31,11 +32,7 @@ This function loads the Model
 """
 def load_model() -> TraceModel:
      try:
-          model = TraceModel(nn.CrossEntropyLoss(), constants.SMALL_MODEL_DIMENSIONS, nn.ReLU())
-          state_dict = torch.load(constants.MODEL_PATH, weights_only=True)
-          model.load_state_dict(state_dict)
-          # set the model to Evaluation mode to infer on unseen data
-          model.eval()
+          model = read_model(constants.MODEL_PATH)
           logging.info("successfully deserialized the model from disk")
           return model
      except Exception as e:
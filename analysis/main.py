@@ -1,10 +1,14 @@
-from fastapi import FastAPI, BackgroundTasks
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from analysis.internal.AnalysisManager import AnalysisManager
-from analysis.internal.utils import load_model
+from analysis.internal.JobQueue import AnalysisJobQueue
+from analysis.internal.FeatureStore import FeatureStore
+from analysis.internal.exceptions import JobQueueFull
+from analysis.internal.ModelLoader import ModelLoader
 from analysis.internal.StorageClient import LocalStorageHandler
 import logging
 import os
+import analysis.internal.constants as constants
 app = FastAPI(title="Analysis API", version="1.0.0")
 
 
@@ -29,27 +33,54 @@ logger = logging.getLogger(__name__)
 # mount paths to the K8s persistent volumes
 VOLUME_MOUNT = os.getenv("OXN_RESULTS_PATH", "/mnt/oxn-data")
 ANALYIS_MOUNT = os.getenv("OXN_ANALYSIS_PATH", "/mnt/analysis-datastore")
+# job states and cached features are kept in sub directories, the backend treats every json file in the analysis path that contains an experiment id as its result
+JOBS_PATH = os.getenv("OXN_ANALYSIS_JOBS_PATH", os.path.join(ANALYIS_MOUNT, "jobs"))
+FEATURES_PATH = os.getenv("OXN_FEATURE_STORE_PATH", os.path.join(ANALYIS_MOUNT, "features"))
+# seconds the backend is asked to wait before it submits an analysis again while the queue is full
+RETRY_AFTER_SECONDS = 30
 
 # "Singleton classes"
-trace_model = load_model()
+# the model is loaded on the first analysis, or in the background right away with warm start
+model_loader = ModelLoader()
+if constants.MODEL_WARM_START:
+    model_loader.warm_start()
 storage_handler = LocalStorageHandler(VOLUME_MOUNT, 'experiments' , ANALYIS_MOUNT)
+feature_store = FeatureStore(FEATURES_PATH)
 
 
-def analysis_background_task(experiment_id : str): 
-    try:
-        logger.info(f"starting experiment with id {experiment_id}")
-        analysis_manager = AnalysisManager(experiment_id=experiment_id, local_storage_handler=storage_handler, trace_model=trace_model)
-        analysis_manager.analyze_experiment()
-    except Exception as e:
-        logger.error(f"An error occured: {str(e)}")
-        
+def analysis_task(experiment_id : str):
+    logger.info(f"starting experiment with id {experiment_id}")
+    analysis_manager = AnalysisManager(experiment_id=experiment_id, local_storage_handler=storage_handler, trace_model=model_loader.get(), feature_store=feature_store)
+    analysis_manager.analyze_experiment()
+
+
+job_queue = AnalysisJobQueue(analysis_task, JOBS_PATH)
+
 
 @app.get("/analyze") # Called when an experiment has finished and saved the results to the storage
-def analyze_experiment(experiment_id : str, background_task : BackgroundTasks):
+def analyze_experiment(experiment_id : str):
+    try:
+        job, queued = job_queue.submit(experiment_id)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+    if queued:
+        return {"message" : f"processing analysis for experiment_id: {experiment_id}", "job" : job}
+    return {"message" : f"analysis for experiment_id: {experiment_id} is already {job['status']}", "job" : job}
+
+
+@app.get("/jobs/{experiment_id}")
+def get_job(experiment_id : str):
+    job = job_queue.get(experiment_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"no analysis job for experiment_id: {experiment_id}")
+    return job
+
+
+@app.get("/jobs")
+def get_job_stats():
+    return job_queue.stats()
+
 
-    background_task.add_task(analysis_background_task, experiment_id)
-    return {"message" : f"processing analysis for experiment_id: {experiment_id}"}
-    
 @app.get("/health")
 def health_check():
-    return {"Hello": "Healty sign from Analysis :)"}
+    return {"Hello": "Healty sign from Analysis :)", "modelLoaded": model_loader.loaded}
@@ -0,0 +1,52 @@
+import json
+import os
+import pytest
+import torch
+import torch.nn as nn
+import analysis.internal.constants as constants
+from analysis.internal.AnalysisManager import AnalysisManager
+from analysis.internal.StorageClient import LocalStorageHandler
+from analysis.internal.TraceModel import TraceModel
+
+EXPERIMENTS = os.path.join(os.path.dirname(os.path.dirname(__file__)), "internal", "oxn", "experiments")
+
+
+def analyze(tmp_path, workers : int) -> dict:
+     torch.manual_seed(0)
+     model = TraceModel(nn.CrossEntropyLoss(), constants.SMALL_MODEL_DIMENSIONS, nn.ReLU())
+     model.eval()
+     output = tmp_path / f"workers_{workers}"
+     output.mkdir()
+     storage_handler = LocalStorageHandler(EXPERIMENTS, "experiments", str(output))
+     AnalysisManager("01737208087", storage_handler, model, workers=workers).analyze_experiment()
+     with open(output / "01737208087_analysis_results.json") as file:
+          return json.load(file)
+
+
+def test_parallel_analysis_matches_serial_analysis(tmp_path):
+     serial = analyze(tmp_path, workers=1)
+     parallel = analyze(tmp_path, workers=2)
+
+     for key in ["metrics", "probability", "aggregation", "failedVariables"]:
+          assert parallel[key] == serial[key]
+     assert set(serial["metrics"]) == {"frontend", "recommendationservice"}
+     for result in [serial, parallel]:
+          assert set(result["timeToResultBreakdown"]) == {"load", "transform", "inference", "evaluation"}
+          assert result["timeToResult"] > 0
+          assert result["inferenceThroughput"] > 0
+
+
+def test_failed_analysis_writes_its_results_and_raises(tmp_path, monkeypatch):
+     model = TraceModel(nn.CrossEntropyLoss(), constants.SMALL_MODEL_DIMENSIONS, nn.ReLU())
+     storage_handler = LocalStorageHandler(EXPERIMENTS, "experiments", str(tmp_path))
+     manager = AnalysisManager("01737208087", storage_handler, model, workers=1)
+     def fail():
+          raise ValueError("inference failed")
+     monkeypatch.setattr(manager, "_transform_and_evaluate_variables", fail)
+
+     with pytest.raises(ValueError):
+          manager.analyze_experiment()
+     with open(tmp_path / "01737208087_analysis_results.json") as file:
+          result = json.load(file)
+     assert result["error"] == "inference failed"
+     assert result["metrics"] == []
@@ -0,0 +1,62 @@
+import os
+import shutil
+import pandas as pd
+import torch
+import torch.nn as nn
+import analysis.internal.constants as constants
+from analysis.internal.AnalysisManager import AnalysisManager
+from analysis.internal.FeatureStore import FeatureStore
+from analysis.internal.RWDGController import transform_variable
+from analysis.internal.StorageClient import LocalStorageHandler
+from analysis.internal.TraceModel import TraceModel
+from analysis.benchmarks.spans import span_table
+
+EXPERIMENTS = os.path.join(os.path.dirname(os.path.dirname(__file__)), "internal", "oxn", "experiments")
+
+
+def test_features_are_reused_until_the_source_changes(tmp_path):
+     source = tmp_path / "1_0_frontend_traces.json"
+     source.write_text("[]")
+     variable = transform_variable(span_table(50), "1", "frontend", "recommendationservice")
+     adf_matrices, error_ratio = variable.adf_matrices, variable.error_ratio
+     store = FeatureStore(tmp_path / "features")
+
+     assert store.load("1", source, "recommendationservice") is None
+     store.save("1", source, "recommendationservice", adf_matrices, error_ratio)
+
+     cached_matrices, cached_ratio = store.load("1", source, "recommendationservice")
+     pd.testing.assert_frame_equal(cached_matrices, adf_matrices)
+     assert cached_ratio == error_ratio
+     assert store.load("1", source, "cartservice") is None
+     assert FeatureStore(tmp_path / "features", version=constants.TRANSFORM_VERSION + 1).load("1", source, "recommendationservice") is None
+     assert len(store.frames()) == 1 and store.frames(["2"]) == []
+
+     source.write_text("[{}]")
+     assert store.load("1", source, "recommendationservice") is None
+
+
+def test_analysis_reads_transformed_variables_from_the_feature_store(tmp_path, monkeypatch):
+     experiments = tmp_path / "experiments"
+     shutil.copytree(EXPERIMENTS, experiments, ignore=lambda _, names : [name for name in names if not name.startswith("01737208087")])
+     output = tmp_path / "analysis"
+     output.mkdir()
+     storage_handler = LocalStorageHandler(str(experiments), "experiments", str(output))
+     store = FeatureStore(tmp_path / "features")
+     model = TraceModel(nn.CrossEntropyLoss(), constants.SMALL_MODEL_DIMENSIONS, nn.ReLU())
+
+     first = AnalysisManager("01737208087", storage_handler, model, workers=1, feature_store=store)
+     first.analyze_experiment()
+     monkeypatch.setattr(storage_handler, "get_file_from_dir", lambda file_name : fail_read(file_name))
+     second = AnalysisManager("01737208087", storage_handler, model, workers=1, feature_store=store)
+     second.analyze_experiment()
+
+     assert len(second.response_variables) == 2
+     for first_variable, second_variable in zip(first.response_variables, second.response_variables):
+          assert second_variable.data is None
+          pd.testing.assert_frame_equal(second_variable.adf_matrices, first_variable.adf_matrices)
+          assert second_variable.error_ratio == first_variable.error_ratio
+          assert torch.equal(second_variable.predictions, first_variable.predictions)
+
+
+def fail_read(file_name : str):
+     raise AssertionError(f"{file_name} was read although its features are cached")
@@ -0,0 +1,79 @@
+import json
+import threading
+import pytest
+import analysis.internal.constants as constants
+from analysis.internal.JobQueue import AnalysisJobQueue
+from analysis.internal.exceptions import JobQueueFull
+
+
+class BlockingAnalysis:
+     '''Analyses that only finish once they are released, failing for experiment ids starting with "fail"'''
+
+     def __init__(self):
+          self.started = threading.Event()
+          self.release = threading.Event()
+          self.analyzed : list[str] = []
+
+     def __call__(self, experiment_id : str) -> None:
+          self.started.set()
+          self.release.wait(timeout=10)
+          self.analyzed.append(experiment_id)
+          if experiment_id.startswith("fail"):
+               raise ValueError("no data")
+
+
+def wait_for(job_queue : AnalysisJobQueue, experiment_id : str, status : str) -> dict:
+     for _ in range(200):
+          job = job_queue.get(experiment_id)
+          if job["status"] == status:
+               return job
+          threading.Event().wait(0.01)
+     raise AssertionError(f"job {experiment_id} did not become {status}: {job}")
+
+
+def test_jobs_are_deduplicated_and_bounded(tmp_path):
+     analysis = BlockingAnalysis()
+     job_queue = AnalysisJobQueue(analysis, tmp_path, workers=1, max_queued=1)
+
+     job_queue.submit("1")
+     assert analysis.started.wait(timeout=10)
+     job, queued = job_queue.submit("1")
+     assert not queued and job["status"] == constants.JOB_RUNNING
+     job_queue.submit("2")
+     with pytest.raises(JobQueueFull):
+          job_queue.submit("3")
+     assert job_queue.get("2")["queue_position"] == 0
+
+     analysis.release.set()
+     done = wait_for(job_queue, "2", constants.JOB_DONE)
+     assert analysis.analyzed == ["1", "2"]
+     assert done["run_seconds"] >= 0 and done["wait_seconds"] >= 0
+     assert job_queue.get("3") is None
+
+
+def test_failures_are_recorded_and_persisted(tmp_path):
+     analysis = BlockingAnalysis()
+     analysis.release.set()
+     job_queue = AnalysisJobQueue(analysis, tmp_path, workers=2)
+
+     job_queue.submit("fail_1")
+     failed = wait_for(job_queue, "fail_1", constants.JOB_FAILED)
+
+     assert failed["error"] == "no data"
+     assert json.loads((tmp_path / "fail_1.json").read_text())["status"] == constants.JOB_FAILED
+     assert job_queue.submit("fail_1")[1]
+
+
+def test_interrupted_jobs_are_queued_again_after_a_restart(tmp_path):
+     for experiment_id, status in [("1", constants.JOB_RUNNING), ("2", constants.JOB_DONE)]:
+          (tmp_path / f"{experiment_id}.json").write_text(json.dumps({
+               "experiment_id" : experiment_id, "status" : status, "queued_at" : 1.0, "started_at" : 2.0, "finished_at" : None, "error" : None,
+          }))
+     analysis = BlockingAnalysis()
+     analysis.release.set()
+
+     job_queue = AnalysisJobQueue(analysis, tmp_path, workers=1)
+
+     wait_for(job_queue, "1", constants.JOB_DONE)
+     assert analysis.analyzed == ["1"]
+     assert job_queue.get("2")["status"] == constants.JOB_DONE
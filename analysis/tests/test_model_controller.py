@@ -0,0 +1,34 @@
+import torch
+import torch.nn as nn
+import analysis.internal.constants as constants
+from analysis.internal.ModelController import ModelController
+from analysis.internal.RWDGController import RWDGController
+from analysis.internal.TraceModel import TraceModel
+from analysis.internal.TraceResponseVariable import TraceResponseVariable
+from analysis.internal.TraceVariableDatasetInference import TraceVariableDatasetInference
+from analysis.benchmarks.spans import span_table
+
+
+def transformed_variables() -> list[TraceResponseVariable]:
+     variables = [TraceResponseVariable(span_table(150, seed=seed), "test", name) for seed, name in enumerate(["frontend", "cartservice"])]
+     RWDGController(variables, "test", "recommendationservice").iterate_over_varibales()
+     return variables
+
+
+def test_batched_inference_predicts_like_single_traces():
+     torch.manual_seed(0)
+     model = TraceModel(nn.CrossEntropyLoss(), constants.SMALL_MODEL_DIMENSIONS, nn.ReLU())
+     model.eval()
+     variables = transformed_variables()
+     controller = ModelController(variables, "test", model, "recommendationservice", local_storage_handler=None)
+     controller.batch_size = 64
+
+     controller.evaluate_variables()
+
+     for variable in variables:
+          dataset = TraceVariableDatasetInference(variable.adf_matrices, controller.one_hot_labels, controller.input_labels)
+          expected = [torch.argmax(model.forward(dataset[x][0].unsqueeze(0)), dim=1).item() for x in range(len(dataset))]
+          assert variable.predictions.tolist() == expected
+          assert variable.micro_f1_score is not None
+     assert controller.inferred_traces == 300
+     assert controller.inference_throughput() > 0
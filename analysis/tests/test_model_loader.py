@@ -0,0 +1,62 @@
+import threading
+import pytest
+import torch
+import torch.nn as nn
+import analysis.internal.constants as constants
+from analysis.internal.ModelLoader import ModelLoader
+from analysis.internal.TraceModel import TraceModel
+from analysis.benchmarks.model import benchmark_backend
+
+
+@pytest.fixture
+def model_path(tmp_path):
+     torch.manual_seed(0)
+     path = tmp_path / "tracemodel.pt"
+     torch.save(TraceModel(nn.CrossEntropyLoss(), constants.SMALL_MODEL_DIMENSIONS, nn.ReLU()).state_dict(), path)
+     return path
+
+
+def test_model_is_loaded_once_on_first_use(model_path, tmp_path):
+     loader = ModelLoader(model_path, cache_path=tmp_path / "cache")
+     assert not loader.loaded
+
+     models = []
+     threads = [threading.Thread(target=lambda : models.append(loader.get())) for _ in range(4)]
+     for thread in threads:
+          thread.start()
+     for thread in threads:
+          thread.join()
+
+     assert loader.loaded and loader.load_time is not None
+     assert all(model is models[0] for model in models)
+     assert not models[0].training
+
+
+def test_torchscript_model_is_cached_and_predicts_like_the_eager_model(model_path, tmp_path, monkeypatch):
+     inputs = torch.rand(300, constants.SMALL_MODEL_DIMENSIONS[0])
+     eager = ModelLoader(model_path, cache_path=tmp_path / "cache").get()
+     scripted = ModelLoader(model_path, backend=constants.MODEL_BACKEND_TORCHSCRIPT, cache_path=tmp_path / "cache").get()
+
+     assert scripted.compiled_forward is not None
+     assert list((tmp_path / "cache").glob("tracemodel.*.torchscript.pt"))
+     assert torch.equal(scripted.predict(inputs, batch_size=64), eager.predict(inputs, batch_size=64))
+
+     def trace(*args, **kwargs):
+          raise AssertionError("the cached module is not traced again")
+     monkeypatch.setattr(torch.jit, "trace", trace)
+     cached = ModelLoader(model_path, backend=constants.MODEL_BACKEND_TORCHSCRIPT, cache_path=tmp_path / "cache").get()
+     assert torch.equal(cached.predict(inputs), eager.predict(inputs))
+
+
+def test_unknown_backends_infer_in_eager_mode(model_path, tmp_path):
+     model = ModelLoader(model_path, backend="onnx", cache_path=tmp_path / "cache").get()
+
+     assert model.compiled_forward is None
+
+
+def test_benchmark_reports_startup_and_latency(model_path):
+     for backend in [constants.MODEL_BACKEND_EAGER, constants.MODEL_BACKEND_TORCHSCRIPT]:
+          results = benchmark_backend(model_path, backend, batch_sizes=[1, 512], repeats=3)
+
+          assert set(results) == {"cold_start", "warm_start", "latency_1", "latency_512"}
+          assert all(seconds > 0 for seconds in results.values())
@@ -0,0 +1,160 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import analysis.internal.constants as constants
+from analysis.internal.RWDGController import RWDGController
+from analysis.internal.StorageClient import LocalStorageHandler
+from analysis.internal.TraceResponseVariable import TraceResponseVariable
+from analysis.benchmarks.spans import span_table
+from analysis.benchmarks.reference import gen_adf, is_grpc_error, is_http_error, mean_normalization, weight_adjency_matrix
+
+EXPERIMENTS = os.path.join(os.path.dirname(os.path.dirname(__file__)), "internal", "oxn", "experiments")
+
+
+def trace_has_error_row_wise(trace_data : pd.DataFrame) -> int:
+     '''trace_has_error as it classified status codes one by one before it was vectorized'''
+     for _ , val in trace_data[constants.REQ_STATUS_CODE].items():
+          if pd.isna(val):
+               continue
+          val = str(int(val))
+          if len(val) == 3 and is_http_error(val):
+               return 1
+          elif len(val) <= 2 and is_grpc_error(val):
+               return 1
+     return 0
+
+
+def normalize_row_wise(adf_matrices : pd.DataFrame, column_names : list[str]) -> pd.DataFrame:
+     '''normalizes_response_variables as it normalized every value with mean_normalization before it was vectorized'''
+     adf_matrices = adf_matrices.copy()
+     for col in column_names:
+          non_zero_values = adf_matrices[col][adf_matrices[col] != 0.0].astype(float)
+          avg = float(non_zero_values.mean()) if len(non_zero_values) > 0 else 0.0
+          max_value, min_value = float(adf_matrices[col].max()), float(adf_matrices[col].min())
+          adf_matrices[col] = adf_matrices[col].apply(lambda val : mean_normalization(val, avg, min_value, max_value)).astype(adf_matrices[col].dtype)
+     return adf_matrices
+
+
+def adf_matrices_row_wise(controller : RWDGController, variable : TraceResponseVariable) -> pd.DataFrame:
+     '''The adjency matrices built trace by trace with gen_adf, as _adj_mat_for_var did before it was vectorized'''
+     dataframe_rows = []
+     for _, single_trace_data in variable.data.groupby(constants.TRACE_ID_COLUMN):
+          new_row = [single_trace_data[constants.TRACE_ID_COLUMN].iloc[0]]
+          new_row.extend(np.array(weight_adjency_matrix(gen_adf(single_trace_df=single_trace_data))).flatten())
+          new_row.append(trace_has_error_row_wise(single_trace_data))
+          new_row.append(variable.service_name)
+          if single_trace_data[controller.supervised_column].iloc[0] == constants.NO_TREATMENT:
+               new_row.extend(controller.gen_one_hot_encpding_for_no_fault())
+          else:
+               new_row.extend(controller.gen_one_hot_encoding_for_exp())
+          new_row.append(single_trace_data[controller.supervised_column].iloc[0])
+          dataframe_rows.append(new_row)
+     adf_matrices = pd.DataFrame(dataframe_rows, columns=[constants.TRACE_ID_COLUMN, *controller.column_names, constants.ERROR_IN_TRACE_COLUMN, "microservice_name", *controller.one_hot_encoding_column_names, controller.supervised_column])
+     # the traces are kept as float32 arrays and categorical columns, see TraceResponseVariable.adf_matrices
+     return adf_matrices.astype({
+          **{name: np.float32 for name in [*controller.column_names, *controller.one_hot_encoding_column_names]},
+          "microservice_name": "category",
+          controller.supervised_column: "category",
+     })
+
+
+def assert_same_adf_matrices(data : pd.DataFrame, service_name : str):
+     variable = TraceResponseVariable(data, "test", service_name)
+     controller = RWDGController([variable], "test", "recommendationservice")
+     controller._adj_mat_for_var(variable)
+     # the reference orders spans that start at the same time with an unstable sort, gen_adf_tensors keeps their order in the data.
+     # The reference gets distinct start times in that order, so that its result does not depend on how its sort breaks ties.
+     order = np.lexsort((np.arange(len(data)), data[constants.START_TIME].to_numpy()))
+     start_ranks = np.empty(len(data), dtype=np.int64)
+     start_ranks[order] = np.arange(len(data))
+     reference = TraceResponseVariable(data.assign(**{constants.START_TIME: start_ranks}), "test", service_name)
+     pd.testing.assert_frame_equal(variable.adf_matrices, adf_matrices_row_wise(controller, reference))
+
+
+def test_adf_matrices_match_row_wise_construction():
+     assert_same_adf_matrices(span_table(300, spans_per_trace=12, seed=1), "frontend")
+
+
+@pytest.mark.parametrize("file_name", ["01737208087_recommendationservice_traces.json", "01737208087_frontend_traces.json"])
+def test_adf_matrices_match_row_wise_construction_for_recorded_traces(file_name):
+     storage_handler = LocalStorageHandler(EXPERIMENTS, "experiments", EXPERIMENTS)
+     data, service_name = storage_handler.get_file_from_dir(file_name)
+     assert_same_adf_matrices(data, service_name)
+
+
+def test_internal_spans_are_added_to_the_last_network_span():
+     '''Internal spans add their time to the preceding request of their trace without counting as a request'''
+     data = pd.DataFrame({
+          constants.TRACE_ID_COLUMN: ["t1", "t1", "t1", "t1", "t2", "t2", None],
+          constants.SPAN_ID_COLUMN: ["a", "b", "c", "d", "e", "f", "g"],
+          constants.START_TIME: [1, 2, 4, 3, 1, 2, 0],
+          constants.DURATION_COLUMN: [100, 40, 5, 10, 7, 3, 1],
+          constants.SERVICE_NAME_COLUMN: ["frontendproxy", "frontend", "frontend", "cartservice", "frontend", "frontend", "frontend"],
+          constants.SPAN_KIND: ["server", "server", "internal", "client", "internal", "server", "server"],
+          constants.REF_TYPE_SPAN_ID: [constants.NOT_AVAILABLE, "a", "b", "b", constants.NOT_AVAILABLE, "unknown", "a"],
+     })
+     controller = RWDGController([TraceResponseVariable(data.assign(loss_treatment=constants.NO_TREATMENT), "test", "frontend")], "test", "recommendationservice")
+
+     trace_codes, counts, durations = controller.gen_adf_tensors(data)
+
+     frontend, frontendproxy, cartservice = (constants.SERVICES[name] for name in ["frontend", "frontendproxy", "cartservice"])
+     assert trace_codes.tolist() == [0, 0, 0, 0, 1, 1, -1]
+     assert counts.shape == (2, 16, 16)
+     assert counts[0, frontend, frontendproxy] == 1 and durations[0, frontend, frontendproxy] == 40
+     # started after the request of cartservice, so it is added onto that one
+     assert counts[0, cartservice, frontend] == 1 and durations[0, cartservice, frontend] == 15
+     assert counts[1].sum() == 0 and durations[1].sum() == 0
+
+
+def test_spans_that_start_at_the_same_time_keep_their_order():
+     '''An internal span is added onto the network span that comes last in the data among the ones that started at the same time'''
+     data = pd.DataFrame({
+          constants.TRACE_ID_COLUMN: ["t1", "t1", "t1", "t1"],
+          constants.SPAN_ID_COLUMN: ["a", "b", "d", "c"],
+          constants.START_TIME: [1, 2, 2, 3],
+          constants.DURATION_COLUMN: [100, 40, 10, 5],
+          constants.SERVICE_NAME_COLUMN: ["frontendproxy", "frontend", "cartservice", "frontend"],
+          constants.SPAN_KIND: ["server", "server", "client", "internal"],
+          constants.REF_TYPE_SPAN_ID: [constants.NOT_AVAILABLE, "a", "b", "b"],
+     })
+     controller = RWDGController([TraceResponseVariable(data.assign(loss_treatment=constants.NO_TREATMENT), "test", "frontend")], "test", "recommendationservice")
+
+     _, counts, durations = controller.gen_adf_tensors(data)
+
+     frontend, frontendproxy, cartservice = (constants.SERVICES[name] for name in ["frontend", "frontendproxy", "cartservice"])
+     assert durations[0, frontend, frontendproxy] == 40
+     assert durations[0, cartservice, frontend] == 15
+
+
+def test_spans_with_error_classifies_http_and_grpc_codes():
+     controller = RWDGController([TraceResponseVariable(span_table(1), "test", "frontend")], "test", "recommendationservice")
+     codes = pd.Series([0, "0", 2, "16", 200, "308", 404, "503", 600, 99, 100, np.nan, None, 503.0], dtype=object)
+
+     assert controller.spans_with_error(codes).tolist() == [False, False, True, True, False, False, True, True, False, True, False, False, False, True]
+
+
+def test_normalization_matches_mean_normalization():
+     variable = TraceResponseVariable(span_table(400, seed=2), "test", "frontend")
+     controller = RWDGController([variable], "test", "recommendationservice")
+     controller._adj_mat_for_var(variable)
+     expected = normalize_row_wise(variable.adf_matrices, controller.column_names[:-1])
+
+     controller.normalizes_response_variables()
+
+     pd.testing.assert_frame_equal(variable.adf_matrices, expected)
+
+
+def test_error_ratios_are_conditioned_on_the_treatment():
+     variable = TraceResponseVariable(span_table(1), "test", "frontend")
+     controller = RWDGController([variable], "test", "recommendationservice")
+     variable.features = np.zeros((6, 256), dtype=np.float32)
+     variable.has_error = np.array([1, 0, 0, 0, 1, 0], dtype=np.int8)
+     variable.treatments = pd.Categorical([constants.NO_TREATMENT] * 4 + ["loss"] * 2)
+
+     controller._calc_error_ratio_for_var(variable)
+
+     assert variable.error_ratio == {
+          constants.FAULTY_ERROR: 0.5, constants.FAULTY_NO_ERROR: 0.5,
+          constants.GOOD_ERROR: 0.25, constants.GOOD_NO_ERROR: 0.75,
+     }
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+import analysis.internal.constants as constants
+from analysis.internal.RWDGController import transform_variable
+from analysis.internal.TraceResponseVariable import TraceResponseVariable, pack_ids
+from analysis.benchmarks.spans import span_table
+
+
+def test_spans_are_kept_with_packed_ids_and_categorical_columns():
+     data = span_table(200)
+     variable = TraceResponseVariable(data, "test", "frontend")
+
+     assert variable.data[constants.SPAN_ID_COLUMN].dtype == np.int64
+     assert variable.data[constants.SERVICE_NAME_COLUMN].dtype == "category"
+     assert variable.data[constants.REQ_STATUS_CODE].dtype == np.float32
+     # equal ids stay equal and different ids stay different
+     assert variable.data[constants.TRACE_ID_COLUMN].nunique() == data[constants.TRACE_ID_COLUMN].nunique()
+     assert variable.data[constants.SPAN_ID_COLUMN].nunique() == len(data)
+     assert variable.treatment_column == "loss_treatment"
+     assert variable.memory_usage()["spans"] < data.memory_usage(deep=True).sum() / 4
+
+
+def test_missing_ids_are_packed_to_the_missing_id():
+     packed = pack_ids(pd.Series(["a", None, np.nan, constants.NOT_AVAILABLE, "a", "b"], name=constants.REF_TYPE_SPAN_ID))
+
+     assert packed[1:4].tolist() == [constants.MISSING_ID] * 3
+     assert packed[0] == packed[4] != packed[5]
+
+
+def test_adf_matrices_are_built_from_the_trace_arrays():
+     variable = transform_variable(span_table(100), "test", "frontend", "recommendationservice")
+     copy = TraceResponseVariable(None, "test", "frontend")
+     copy.adf_matrices = variable.adf_matrices
+
+     assert variable.data is None and variable.features.dtype == np.float32 and variable.features.shape == (100, 256)
+     assert variable.model_inputs().shape == (100, 257)
+     for field in ["trace_ids", "features", "has_error", "classes"]:
+          np.testing.assert_array_equal(getattr(copy, field), getattr(variable, field))
+     assert copy.treatment_column == variable.treatment_column
+     assert list(copy.treatments) == list(variable.treatments)
+     with pytest.raises(AttributeError):
+          variable.unknown_field = 1
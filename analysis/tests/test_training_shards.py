@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import torch
+import torch.nn as nn
+import analysis.internal.constants as constants
+from analysis.internal.DataTransformer import DataTransformerAndAnalyzer
+from analysis.internal.FeatureStore import FeatureStore
+from analysis.internal.RWDGController import transform_variable
+from analysis.internal.TraceModel import TraceModel
+from analysis.internal.TrainingShards import TrainingShardDataset, shards_exist, write_training_shards
+from analysis.internal.utils import gen_one_hot_encoding_col_names, build_colum_names_for_adf_mat_df
+from analysis.benchmarks.spans import span_table
+
+INPUT_NAMES = build_colum_names_for_adf_mat_df() + ["has_error_in_trace"]
+LABEL_NAMES = gen_one_hot_encoding_col_names()
+
+
+def training_frames() -> list[pd.DataFrame]:
+     return [transform_variable(span_table(120, seed=seed), str(seed), "frontend", "recommendationservice").adf_matrices for seed in range(3)]
+
+
+def test_shards_hold_every_row_once_in_a_deterministic_split(tmp_path):
+     frames = training_frames()
+     write_training_shards(frames, tmp_path / "a", INPUT_NAMES, LABEL_NAMES, rows_per_shard=64)
+     write_training_shards(frames, tmp_path / "b", INPUT_NAMES, LABEL_NAMES, rows_per_shard=64)
+     dataset = pd.concat(frames, ignore_index=True)
+
+     row_ids = []
+     for split in ["train", "test"]:
+          shards = TrainingShardDataset(tmp_path / "a", split, batch_size=50)
+          features = torch.cat([batch[0] for batch in shards]).numpy()
+          labels = torch.cat([batch[1] for batch in shards]).numpy()
+          split_ids = shards.row_ids()
+          assert features.dtype == np.float32 and labels.dtype == np.int64
+          np.testing.assert_array_equal(features, dataset[INPUT_NAMES].to_numpy(dtype=np.float32)[split_ids])
+          np.testing.assert_array_equal(labels, np.argmax(dataset[LABEL_NAMES].to_numpy(), axis=1)[split_ids])
+          np.testing.assert_array_equal(split_ids, TrainingShardDataset(tmp_path / "b", split).row_ids())
+          row_ids.append(split_ids)
+
+     assert 0 < len(row_ids[1]) < len(row_ids[0])
+     np.testing.assert_array_equal(np.sort(np.concatenate(row_ids)), np.arange(len(dataset)))
+
+
+def test_batches_are_views_of_the_shards(tmp_path):
+     write_training_shards(training_frames(), tmp_path, INPUT_NAMES, LABEL_NAMES, rows_per_shard=64)
+     shards = TrainingShardDataset(tmp_path, "train", batch_size=16)
+
+     features, labels = shards[1]
+     shard_features, shard_labels = shards._shard(0)
+     assert features.shape == (16, len(INPUT_NAMES)) and labels.shape == (16,)
+     assert features.data_ptr() == shard_features[16:32].ctypes.data
+     assert labels.data_ptr() == shard_labels[16:32].ctypes.data
+
+
+def test_model_trains_on_prefetched_shards(tmp_path):
+     write_training_shards(training_frames(), tmp_path, INPUT_NAMES, LABEL_NAMES, rows_per_shard=64)
+     shards = TrainingShardDataset(tmp_path, "train", batch_size=16)
+     loader = shards.loader(shuffle=True, num_workers=2)
+
+     assert sum(len(labels) for _, labels in loader) == len(shards.row_ids())
+     model = TraceModel(nn.CrossEntropyLoss(), [len(INPUT_NAMES), 32, len(LABEL_NAMES)], nn.ReLU())
+     accuracies, _ = model.train_trace_model_big(loader, num_epochs=1)
+     assert len(accuracies) == len(shards)
+
+
+def test_shards_are_written_again_once_the_feature_store_changed(tmp_path, monkeypatch):
+     monkeypatch.setattr(constants, "TRAINING_SHARDS_PATH", tmp_path / "shards")
+     store = FeatureStore(tmp_path / "features")
+     source = tmp_path / "1_0_frontend_traces.json"
+     source.write_text("[]")
+     frames = training_frames()
+     store.save("1", source, "recommendationservice", frames[0], {})
+     transformer = DataTransformerAndAnalyzer(None, feature_store=store)
+
+     path = transformer._training_shards("unused")
+     rows = len(TrainingShardDataset(path, "train").row_ids())
+     assert transformer._training_shards("unused") == path and shards_exist(path, store.fingerprint())
+
+     store.save("2", source, "recommendationservice", frames[1], {})
+     assert not shards_exist(path, store.fingerprint())
+     assert transformer._training_shards("unused") == path
+     assert len(TrainingShardDataset(path, "train").row_ids()) > rows
+     assert shards_exist(path, store.fingerprint())
@@ -0,0 +1,79 @@
+"""
+Purpose: Generates synthetic Jaeger and Prometheus payloads.
+Functionality: Builds responses with the wire format of the Jaeger and Prometheus HTTP APIs at arbitrary sizes.
+Connection: Used by the benchmarks in this directory.
+
+Synthetic API payloads"""
+import random
+
+SERVICES = [
+    "frontend",
+    "frontendproxy",
+    "cartservice",
+    "checkoutservice",
+    "currencyservice",
+    "productcatalogservice",
+    "recommendationservice",
+    "shippingservice",
+]
+SPAN_KINDS = ["server", "client", "internal", "producer", "consumer"]
+
+
+def jaeger_traces(span_count: int, spans_per_trace: int = 20, seed: int = 0) -> dict:
+    """Return a Jaeger search response holding roughly span_count spans"""
+    rng = random.Random(seed)
+    traces = []
+    start = 1_700_000_000_000_000
+    for trace_idx in range(max(1, span_count // spans_per_trace)):
+        trace_id = f"{trace_idx:032x}"
+        processes = {f"p{idx}": {"serviceName": name} for idx, name in enumerate(SERVICES)}
+        spans = []
+        for span_idx in range(spans_per_trace):
+            span_id = f"{trace_idx:08x}{span_idx:08x}"
+            references = []
+            if span_idx > 0:
+                parent = f"{trace_idx:08x}{rng.randrange(span_idx):08x}"
+                references.append({"refType": "CHILD_OF", "spanID": parent, "traceID": trace_id})
+            tags = [
+                {"key": "otel.library.name", "type": "string", "value": "opentelemetry"},
+                {"key": "span.kind", "type": "string", "value": rng.choice(SPAN_KINDS)},
+                {"key": "rpc.grpc.status_code", "type": "int64", "value": rng.choice([0, 0, 0, 2])},
+                {"key": "net.peer.name", "type": "string", "value": "10.0.0.1"},
+            ]
+            spans.append(
+                {
+                    "traceID": trace_id,
+                    "spanID": span_id,
+                    "operationName": f"op{rng.randrange(30)}",
+                    "references": references,
+                    "startTime": start + trace_idx * 1000 + span_idx,
+                    "duration": rng.randrange(1, 100_000),
+                    "tags": tags,
+                    "logs": [],
+                    "processID": f"p{rng.randrange(len(SERVICES))}",
+                    "warnings": None,
+                }
+            )
+        traces.append({"traceID": trace_id, "spans": spans, "processes": processes, "warnings": None})
+    return {"data": traces, "total": 0, "limit": 0, "offset": 0, "errors": None}
+
+
+def prometheus_matrix(series_count: int, samples_per_series: int = 300, seed: int = 0) -> dict:
+    """Return a Prometheus range query response with series_count series"""
+    rng = random.Random(seed)
+    start = 1_700_000_000.0
+    result = []
+    for series_idx in range(series_count):
+        metric = {
+            "__name__": "http_server_duration_count",
+            "instance": f"10.0.{series_idx // 256}.{series_idx % 256}:9464",
+            "job": "opentelemetry-demo",
+            "service_name": rng.choice(SERVICES),
+            "http_status_code": rng.choice(["200", "404", "500"]),
+        }
+        values = [
+            [start + offset, str(rng.randrange(0, 10_000) if series_idx % 2 else rng.random())]
+            for offset in range(samples_per_series)
+        ]
+        result.append({"metric": metric, "values": values})
+    return {"status": "success", "data": {"resultType": "matrix", "result": result}}
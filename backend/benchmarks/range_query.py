@@ -0,0 +1,79 @@
+"""
+Purpose: Benchmarks the conversion of Prometheus range query responses.
+Functionality: Compares the row-wise reference implementation against the vectorized conversion on synthetic matrices.
+Connection: Exercises MetricResponseVariable._range_query_to_df from responses.py.
+
+Run from the backend directory's parent with:
+    python -m backend.benchmarks.range_query --series 100 1000 10000
+"""
+import argparse
+import time
+from unittest.mock import MagicMock
+
+import pandas as pd
+
+from backend.benchmarks.payloads import prometheus_matrix
+from backend.internal.responses import MetricResponseVariable
+
+
+def _parse_metric_string(metric_value):
+    try:
+        return int(metric_value)
+    except (TypeError, ValueError):
+        try:
+            return float(metric_value)
+        except (TypeError, ValueError):
+            return metric_value
+
+
+def range_query_row_wise(json_data, metric_column_name, name) -> pd.DataFrame:
+    """Reference implementation: one dict per sample"""
+    results = json_data["data"]["result"]
+    columns = list(results[0]["metric"].keys())
+    columns += ["timestamp", metric_column_name, name]
+    rows = []
+    for result in results:
+        for timestamp, value in result["values"]:
+            parsed_value = _parse_metric_string(value)
+            rows.append(
+                {**result["metric"], "timestamp": timestamp, metric_column_name: parsed_value, name: parsed_value}
+            )
+    dataframe = pd.DataFrame(columns=columns, data=rows)
+    dataframe.set_index(pd.to_datetime(dataframe.timestamp, utc=True, unit="s"), inplace=True)
+    return dataframe
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--series", type=int, nargs="+", default=[100, 1_000, 10_000])
+    parser.add_argument("--samples", type=int, default=300, help="samples per series")
+    args = parser.parse_args()
+
+    variable = MetricResponseVariable(
+        orchestrator=MagicMock(),
+        name="requests",
+        experiment_start=0.0,
+        experiment_end=0.0,
+        right_window="0s",
+        left_window="0s",
+        description={"metric_name": "http_server_duration_count", "left_window": "0s", "right_window": "0s"},
+        target="sue",
+    )
+    print(f"{'series':>8} {'samples':>10} {'row-wise [s]':>14} {'vectorized [s]':>15} {'speedup':>8}")
+    for series_count in args.series:
+        payload = prometheus_matrix(series_count, samples_per_series=args.samples)
+        started = time.perf_counter()
+        reference = range_query_row_wise(payload, "http_server_duration_count", "requests")
+        reference_time = time.perf_counter() - started
+        started = time.perf_counter()
+        vectorized = variable._range_query_to_df(payload, metric_column_name="http_server_duration_count")
+        vectorized_time = time.perf_counter() - started
+        assert vectorized.astype(object).equals(reference.astype(object))
+        print(
+            f"{series_count:>8} {len(vectorized):>10} {reference_time:>14.3f} {vectorized_time:>15.3f} "
+            f"{reference_time / vectorized_time:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Purpose: Benchmarks the peak memory of observing a large Jaeger response.
+Functionality: Serves a synthetic trace response over HTTP and measures the peak RSS of TraceResponseVariable.observe
+in a fresh process, once with the buffered and once with the streaming JSON parser.
+Connection: Exercises Jaeger.search_traces / Jaeger.stream_traces through responses.py.
+
+Run from the backend directory's parent with:
+    python -m backend.benchmarks.stream_memory --megabytes 200
+"""
+import argparse
+import http.server
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from unittest.mock import MagicMock
+
+from backend.benchmarks.payloads import jaeger_traces
+
+BYTES_PER_SPAN = 610
+"""Approximate size of a serialized synthetic span"""
+
+
+def _serve(path: str) -> http.server.ThreadingHTTPServer:
+    """Serve the file at path for every GET request on a random local port"""
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(os.path.getsize(path)))
+            self.end_headers()
+            with open(path, "rb") as payload:
+                while chunk := payload.read(1 << 20):
+                    self.wfile.write(chunk)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def observe(url: str, stream: bool) -> None:
+    """Observe a trace response variable against the benchmark server and report peak RSS"""
+    from backend.internal.responses import TraceResponseVariable
+
+    now = time.time()
+    variable = TraceResponseVariable(
+        orchestrator=MagicMock(),
+        name="frontend_traces",
+        experiment_start=now,
+        experiment_end=now,
+        right_window="0s",
+        left_window="0s",
+        description={"service_name": "frontend", "left_window": "0s", "right_window": "0s", "stream": stream},
+    )
+    variable.jaeger.base_url = url
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    dataframe = variable.observe()
+    elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"spans": len(dataframe), "seconds": elapsed, "baseline_kb": baseline, "peak_kb": peak}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--megabytes", type=int, default=200)
+    parser.add_argument("--generate", help=argparse.SUPPRESS)
+    parser.add_argument("--observe", help=argparse.SUPPRESS)
+    parser.add_argument("--stream", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.generate:
+        with open(args.generate, "w") as payload:
+            json.dump(jaeger_traces(args.megabytes * 2**20 // BYTES_PER_SPAN), payload)
+        return
+    if args.observe:
+        observe(args.observe, args.stream)
+        return
+
+    # peak RSS is inherited by child processes, so the payload is generated out of process as well
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as payload:
+        pass
+    try:
+        subprocess.run(
+            [sys.executable, "-m", "backend.benchmarks.stream_memory", "--megabytes", str(args.megabytes),
+             "--generate", payload.name],
+            check=True,
+        )
+        size_mb = os.path.getsize(payload.name) / 2**20
+        server = _serve(payload.name)
+        url = f"http://127.0.0.1:{server.server_address[1]}/"
+        print(f"response size: {size_mb:.0f} MB")
+        print(f"{'mode':>10} {'spans':>10} {'time [s]':>10} {'peak RSS [MB]':>14} {'observe() [MB]':>15}")
+        for stream in (False, True):
+            command = [sys.executable, "-m", "backend.benchmarks.stream_memory", "--observe", url]
+            if stream:
+                command.append("--stream")
+            result = json.loads(subprocess.run(command, check=True, capture_output=True, text=True).stdout)
+            print(
+                f"{'stream' if stream else 'buffered':>10} {result['spans']:>10} {result['seconds']:>10.1f} "
+                f"{result['peak_kb'] / 1024:>14.0f} {(result['peak_kb'] - result['baseline_kb']) / 1024:>15.0f}"
+            )
+        server.shutdown()
+    finally:
+        os.remove(payload.name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Purpose: Benchmarks the tabulation of Jaeger responses.
+Functionality: Compares the row-wise reference implementation against the columnar SpanTable on synthetic payloads.
+Connection: Exercises TraceResponseVariable._tabulate from responses.py.
+
+Run from the backend directory's parent with:
+    python -m backend.benchmarks.tabulate_traces --spans 10000 100000 1000000
+"""
+import argparse
+import time
+
+import pandas as pd
+
+from backend.benchmarks.payloads import jaeger_traces
+from backend.internal.responses import TraceResponseVariable
+
+
+def tabulate_row_wise(trace_json) -> pd.DataFrame:
+    """Reference implementation: one dataframe per trace, concatenated at the end"""
+    columns = [
+        "trace_id", "span_id", "operation", "start_time", "end_time", "duration", "service_name",
+        "span_kind", "req_status_code", "ref_type", "ref_type_span_ID", "ref_type_trace_ID",
+    ]
+    dataframes = []
+    for trace in trace_json["data"]:
+        processes = trace["processes"]
+        trace_rows = []
+        for span in trace["spans"]:
+            req_status_code = "N/A"
+            span_kind = "N/A"
+            for obj in span.get("tags") or []:
+                if obj["key"] == "span.kind":
+                    span_kind = obj["value"]
+                if obj["key"] == "rpc.grpc.status_code":
+                    req_status_code = obj["value"]
+                if obj["key"] == "http.status_code":
+                    req_status_code = obj["value"]
+            ref_type = ref_type_span_id = ref_type_trace_id = "N/A"
+            if span["references"]:
+                ref_type = span["references"][0]["refType"]
+                ref_type_span_id = span["references"][0]["spanID"]
+                ref_type_trace_id = span["references"][0]["traceID"]
+            trace_rows.append([
+                span["traceID"], span["spanID"], span["operationName"], span["startTime"],
+                span["startTime"] + span["duration"], span["duration"],
+                processes[span["processID"]]["serviceName"], span_kind, req_status_code,
+                ref_type, ref_type_span_id, ref_type_trace_id,
+            ])
+        dataframe = pd.DataFrame(trace_rows, columns=columns)
+        dataframe["duration"] = pd.to_numeric(dataframe["duration"])
+        dataframe.reset_index(inplace=True)
+        dataframe.set_index(pd.to_datetime(dataframe.start_time, utc=True, unit="us"), inplace=True)
+        dataframes.append(dataframe)
+    return pd.concat(dataframes)
+
+
+def _timed(function, payload) -> tuple[float, pd.DataFrame]:
+    started = time.perf_counter()
+    result = function(payload)
+    return time.perf_counter() - started, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--spans", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--spans-per-trace", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'spans':>10} {'row-wise [s]':>14} {'columnar [s]':>14} {'speedup':>8} {'memory [MB]':>18}")
+    for span_count in args.spans:
+        payload = jaeger_traces(span_count, spans_per_trace=args.spans_per_trace)
+        reference_time, reference = _timed(tabulate_row_wise, payload)
+        columnar_time, columnar = _timed(TraceResponseVariable._tabulate, payload)
+        assert columnar.astype(object).equals(reference.astype(object))
+        reference_mb = reference.memory_usage(deep=True).sum() / 2**20
+        columnar_mb = columnar.memory_usage(deep=True).sum() / 2**20
+        print(
+            f"{len(columnar):>10} {reference_time:>14.3f} {columnar_time:>14.3f} "
+            f"{reference_time / columnar_time:>7.1f}x {reference_mb:>8.1f} -> {columnar_mb:>7.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Purpose: Shares service addresses and HTTP connection pools between the Prometheus and Jaeger clients of an experiment.
+Functionality: Caches resolved service addresses for a limited time and hands out one keep-alive session per backend.
+Connection: Held by the orchestrator, used by prometheus.py and jaeger.py when a response variable creates its client.
+
+Client registry of an orchestrator"""
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Hashable, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter, Retry
+
+logger = logging.getLogger(__name__)
+
+CLIENT_ADDRESS_TTL = float(os.getenv("OXN_CLIENT_ADDRESS_TTL", "60"))
+"""Seconds a resolved service address is reused before it is resolved again"""
+CLIENT_POOL_SIZE = int(os.getenv("OXN_CLIENT_POOL_SIZE", "16"))
+"""Connections kept open per backend host, should cover the concurrent queries of all response variables"""
+
+
+class ClientRegistry:
+    """
+    Service addresses and HTTP sessions shared by all clients created through one orchestrator.
+
+    An address is resolved through the orchestrator once and then reused for address_ttl seconds,
+    so response variables of the same experiment do not each look up the same service. Every backend
+    gets a single session whose adapter keeps pool_size connections alive, so consecutive runs of an
+    experiment reuse warm connections.
+    """
+
+    def __init__(self, address_ttl: float = CLIENT_ADDRESS_TTL, pool_size: int = CLIENT_POOL_SIZE):
+        self.address_ttl = address_ttl
+        self.pool_size = pool_size
+        self._lock = threading.Lock()
+        self._addresses: Dict[Hashable, Tuple[str, float]] = {}
+        """Resolved addresses with the monotonic time they expire at"""
+        self._sessions: Dict[str, requests.Session] = {}
+
+    def address(self, key: Hashable, resolve: Callable[[], str]) -> str:
+        """Return the cached address for key, resolving it if it is missing or expired"""
+        with self._lock:
+            cached = self._addresses.get(key)
+            if cached is not None and cached[1] > time.monotonic():
+                return cached[0]
+        address = resolve()
+        with self._lock:
+            self._addresses[key] = (address, time.monotonic() + self.address_ttl)
+        return address
+
+    def invalidate(self, key: Hashable) -> None:
+        """Forget a resolved address, the clients call this when they cannot connect because the service moved"""
+        with self._lock:
+            self._addresses.pop(key, None)
+
+    def session(self, backend: str) -> requests.Session:
+        """Return the session of a backend, retrying requests that fail with server errors"""
+        with self._lock:
+            session = self._sessions.get(backend)
+            if session is None:
+                session = requests.Session()
+                retries = Retry(total=5, backoff_factor=0.1, status_forcelist=[500, 502, 503, 504])
+                # one pool per host, a backend can have a few hosts, e.g. the Prometheus of the SUE and of oxn
+                adapter = HTTPAdapter(max_retries=retries, pool_connections=4, pool_maxsize=self.pool_size)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._sessions[backend] = session
+                logger.debug(f"Created {backend} session with {self.pool_size} pooled connections")
+            return session
@@ -0,0 +1,264 @@
+"""
+Purpose: Caches the pods and services of the cluster for all Kubernetes orchestrators of the process.
+Functionality: Lists every resource once and keeps it up to date with a watch per resource and namespace, relisting after every resync interval.
+Connection: Started by kubernetes_orchestrator.py, whose read-only pod and service lookups are answered from the cache.
+
+Watch-backed cluster state cache"""
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from kubernetes import client, watch
+from kubernetes.client.exceptions import ApiException
+
+logger = logging.getLogger(__name__)
+
+CLUSTER_CACHE_ENABLED = os.getenv("OXN_CLUSTER_CACHE", "true").lower() not in ("0", "false", "no")
+"""Answer pod and service lookups from the cache instead of the API server"""
+CLUSTER_CACHE_NAMESPACES = [namespace.strip() for namespace in os.getenv("OXN_CLUSTER_CACHE_NAMESPACES", "").split(",") if namespace.strip()]
+"""Namespaces that are cached, all namespaces if empty"""
+CLUSTER_CACHE_RESYNC_SECONDS = int(os.getenv("OXN_CLUSTER_CACHE_RESYNC_SECONDS", "300"))
+"""Seconds after which a watch is ended and its resource is listed again"""
+CLUSTER_CACHE_SYNC_TIMEOUT = float(os.getenv("OXN_CLUSTER_CACHE_SYNC_TIMEOUT", "30"))
+"""Seconds a lookup waits for the first list of a resource before it falls back to the API server"""
+CLUSTER_CACHE_RETRY_SECONDS = 5.0
+"""Wait before listing a resource again after the API server returned an error"""
+
+PODS = "pods"
+SERVICES = "services"
+
+
+def parse_selector(label_selector: Optional[str]) -> Optional[Dict[str, str]]:
+    """Parse an equality based label selector like a=b,c=d, return None for selectors the cache cannot evaluate"""
+    labels = {}
+    for requirement in (label_selector or "").split(","):
+        if not requirement.strip():
+            continue
+        key, separator, value = requirement.partition("=")
+        value = value[1:] if value.startswith("=") else value
+        if not separator or key.endswith("!") or not key.strip():
+            return None
+        labels[key.strip()] = value.strip()
+    return labels
+
+
+class Informer:
+    """
+    Local copy of one kind of resource in one namespace, or in all namespaces.
+
+    The resource is listed once and then watched from the resource version of the list. The watch
+    ends after resync_seconds, the resource is then listed again, which also recovers from events
+    that were missed while the watch was down or that expired on the API server.
+    """
+
+    def __init__(self, kind: str, list_function: Callable, namespace: Optional[str] = None,
+                 resync_seconds: int = CLUSTER_CACHE_RESYNC_SECONDS):
+        self.kind = kind
+        self.namespace = namespace
+        self.resync_seconds = resync_seconds
+        self._list_function = list_function
+        self._lock = threading.Lock()
+        self._items: Dict[Tuple[str, str], object] = {}
+        self._synced = threading.Event()
+        self._stopped = threading.Event()
+        self._watch: Optional[watch.Watch] = None
+        self.resource_version: Optional[str] = None
+        self.last_sync: Optional[float] = None
+        """Time of the last completed list"""
+        self.last_event: Optional[float] = None
+        """Time of the last event received from the watch"""
+        self.counters = {"lists": 0, "events": 0, "expired": 0, "errors": 0}
+
+    def _kwargs(self) -> Dict:
+        return {"namespace": self.namespace} if self.namespace is not None else {}
+
+    def start(self) -> None:
+        thread = threading.Thread(target=self._run, name=f"informer-{self.kind}-{self.namespace or 'all'}", daemon=True)
+        thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._watch is not None:
+            self._watch.stop()
+
+    def wait_synced(self, timeout: float) -> bool:
+        """Wait until the resource was listed once"""
+        return self._synced.wait(timeout)
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                self._relist()
+                self._watch_events()
+            except ApiException as e:
+                if e.status == 410:
+                    # the resource version of the last list is too old, list again right away
+                    self.counters["expired"] += 1
+                    continue
+                self.counters["errors"] += 1
+                logger.warning(f"Error watching {self.kind} in {self.namespace or 'all namespaces'}: {e.reason}")
+                self._stopped.wait(CLUSTER_CACHE_RETRY_SECONDS)
+            except Exception as e:
+                self.counters["errors"] += 1
+                logger.warning(f"Error watching {self.kind} in {self.namespace or 'all namespaces'}: {e}")
+                self._stopped.wait(CLUSTER_CACHE_RETRY_SECONDS)
+
+    def _relist(self) -> None:
+        result = self._list_function(**self._kwargs())
+        items = {(item.metadata.namespace, item.metadata.name): item for item in result.items}
+        with self._lock:
+            self._items = items
+            self.resource_version = result.metadata.resource_version
+            self.last_sync = time.time()
+            self.counters["lists"] += 1
+        self._synced.set()
+
+    def _watch_events(self) -> None:
+        self._watch = watch.Watch()
+        for event in self._watch.stream(
+            self._list_function,
+            resource_version=self.resource_version,
+            timeout_seconds=self.resync_seconds,
+            allow_watch_bookmarks=True,
+            **self._kwargs(),
+        ):
+            self.apply(event["type"], event["object"])
+            if self._stopped.is_set():
+                self._watch.stop()
+
+    def apply(self, event_type: str, item) -> None:
+        """Apply an event of the watch to the local copy"""
+        with self._lock:
+            self.last_event = time.time()
+            self.counters["events"] += 1
+            self.resource_version = item.metadata.resource_version or self.resource_version
+            if event_type == "BOOKMARK":
+                return
+            key = (item.metadata.namespace, item.metadata.name)
+            if event_type == "DELETED":
+                self._items.pop(key, None)
+            else:
+                self._items[key] = item
+
+    def list(self, namespace: Optional[str] = None, labels: Optional[Dict[str, str]] = None) -> List:
+        """Items in a namespace, or in all namespaces, whose labels contain labels"""
+        with self._lock:
+            items = list(self._items.values())
+        return [
+            item for item in items
+            if (namespace is None or item.metadata.namespace == namespace)
+            and all((item.metadata.labels or {}).get(key) == value for key, value in (labels or {}).items())
+        ]
+
+    def get(self, namespace: str, name: str):
+        with self._lock:
+            return self._items.get((namespace, name))
+
+    def stats(self) -> Dict:
+        now = time.time()
+        with self._lock:
+            return {
+                "kind": self.kind,
+                "namespace": self.namespace,
+                "synced": self._synced.is_set(),
+                "items": len(self._items),
+                "resource_version": self.resource_version,
+                "seconds_since_sync": round(now - self.last_sync, 3) if self.last_sync is not None else None,
+                "seconds_since_event": round(now - self.last_event, 3) if self.last_event is not None else None,
+                **self.counters,
+            }
+
+
+class ClusterCache:
+    """
+    Process-wide cache of the pods and services in the configured namespaces.
+
+    Lookups return None if the cache cannot answer them, because it was not started, the namespace is
+    not cached, the first list did not complete within sync_timeout or the label selector is not
+    equality based. Callers then ask the API server instead. Returned objects are shared by all
+    callers and must not be modified. Objects that are changed and written back, like deployments,
+    are read from the API server, a cached copy may still hold an outdated resource version.
+    """
+
+    def __init__(self, namespaces: Optional[List[str]] = None, resync_seconds: int = CLUSTER_CACHE_RESYNC_SECONDS,
+                 sync_timeout: float = CLUSTER_CACHE_SYNC_TIMEOUT):
+        self.namespaces = list(namespaces if namespaces is not None else CLUSTER_CACHE_NAMESPACES)
+        self.resync_seconds = resync_seconds
+        self.sync_timeout = sync_timeout
+        self._lock = threading.Lock()
+        self._informers: Dict[Tuple[str, Optional[str]], Informer] = {}
+
+    @property
+    def started(self) -> bool:
+        return bool(self._informers)
+
+    def start(self, core_api: Optional[client.CoreV1Api] = None) -> None:
+        """Start the informers, subsequent calls do nothing. Expects the kubernetes config to be loaded"""
+        with self._lock:
+            if self._informers:
+                return
+            # the watches hold their connections open, they get their own api client
+            core_api = core_api or client.CoreV1Api(client.ApiClient())
+            list_functions = {
+                PODS: (core_api.list_pod_for_all_namespaces, core_api.list_namespaced_pod),
+                SERVICES: (core_api.list_service_for_all_namespaces, core_api.list_namespaced_service),
+            }
+            for kind, (list_all, list_namespaced) in list_functions.items():
+                for namespace in self.namespaces or [None]:
+                    informer = Informer(kind, list_namespaced if namespace else list_all, namespace, self.resync_seconds)
+                    self._informers[(kind, namespace)] = informer
+            for informer in self._informers.values():
+                informer.start()
+            logger.info(f"Started cluster cache for {', '.join(self.namespaces) or 'all namespaces'}")
+
+    def stop(self) -> None:
+        with self._lock:
+            for informer in self._informers.values():
+                informer.stop()
+            self._informers = {}
+
+    def _informer(self, kind: str, namespace: Optional[str]) -> Optional[Informer]:
+        informer = self._informers.get((kind, None))
+        if informer is None and namespace is not None:
+            informer = self._informers.get((kind, namespace))
+        if informer is None or not informer.wait_synced(self.sync_timeout):
+            return None
+        return informer
+
+    def list(self, kind: str, namespace: Optional[str] = None, label_selector: Optional[str] = None) -> Optional[List]:
+        """
+        Items of a kind in a namespace matching an equality based label selector, None if not cached
+
+        Without a namespace, items of all namespaces are returned if the cache watches the whole cluster.
+        """
+        labels = parse_selector(label_selector)
+        if labels is None:
+            return None
+        if namespace is None:
+            # a cache scoped to some namespaces cannot answer for the whole cluster
+            if self.namespaces:
+                return None
+            informer = self._informer(kind, None)
+            return informer.list(labels=labels) if informer is not None else None
+        informer = self._informer(kind, namespace)
+        return informer.list(namespace, labels) if informer is not None else None
+
+    def get(self, kind: str, namespace: str, name: str):
+        """Item of a kind by name, None if it is not cached"""
+        informer = self._informer(kind, namespace)
+        return informer.get(namespace, name) if informer is not None else None
+
+    def stats(self) -> Dict:
+        """State, size and age of every informer"""
+        return {
+            "enabled": CLUSTER_CACHE_ENABLED,
+            "namespaces": self.namespaces,
+            "resync_seconds": self.resync_seconds,
+            "informers": [informer.stats() for informer in list(self._informers.values())],
+        }
+
+
+CLUSTER_CACHE = ClusterCache()
+"""Cache shared by all Kubernetes orchestrators of the process"""
@@ -7,6 +7,7 @@ Connection: Central component that coordinates between treatments, load generati
 
 import datetime
 import logging
+import threading
 import time
 from typing import Tuple
 import yaml
@@ -54,6 +55,8 @@ class Engine:
         self.error_message = None
         self.started_at = None
         self.completed_at = None
+        self.cancelled = threading.Event()
+        """Set when the experiment was cancelled, shared with the runner and its treatments"""
         # If you want to see the locust logs, set this to True
         self.doLocustLog = False
     def run(
@@ -77,6 +80,7 @@ class Engine:
             random_treatment_order=randomize,
             accountant_names=names,
             orchestrator=self.orchestrator,
+            cancelled=self.cancelled,
         )
         self.runner.execute_compile_time_treatments()
         self.orchestrator.orchestrate()
@@ -147,12 +151,28 @@ class Engine:
             runner=self.runner, request_stats=self.generator.env.stats
         )
         self.reporter.add_experiment_data(experiment_start=experiment_start, experiment_end=experiment_end, runner=self.runner)
+        self.reporter.add_observation_data(self.runner)
         # Now we return two dicts, one with the dataframes and one with the report. This data then gets written to disk by the caller (ExperimentManager)
 
         # Add treatment data to the report
         self.reporter.add_treatment_data(self.runner, treatment_data)
 
         return self.runner.observer.variables(), self.reporter.get_report_data()
+    def cancel(self) -> None:
+        """
+        Abort a running experiment
+
+        Running treatments are cleaned, treatments that did not start are skipped and the load generation is
+        stopped. The run then observes and reports the data collected so far.
+        """
+        logger.info(f"Cancelling experiment {self.id}")
+        self.cancelled.set()
+        if self.runner is not None:
+            self.runner.cancel()
+        generator = getattr(self, "generator", None)
+        if generator is not None:
+            generator.kill()
+
     def _execute_loadgen(self) -> None:
         """
         This method starts the load generator and allows it to run for its full duration.
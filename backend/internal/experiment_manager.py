@@ -1,8 +1,7 @@
-import zipfile
-
 from fastapi import HTTPException
 from backend.internal.analysis import ExperimentAnalyzer
 from backend.internal.errors import StoreException
+from backend.internal.export import ZipExport
 from backend.internal.fault_detection import PrometheusDetectionAnalyzer
 from pathlib import Path
 import json
@@ -10,29 +9,39 @@ import time
 from datetime import datetime, timedelta
 import fcntl
 import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from typing import Dict, Optional, Tuple, List
 import pandas as pd
 from backend.internal.engine import Engine
 from backend.internal.kubernetes_orchestrator import KubernetesOrchestrator
+from backend.internal.locks import NamespaceLock, experiment_namespaces, namespaces_overlap
 from backend.internal.models.experiment import CreateBatchExperimentResponse, CreateExperimentResponse, Experiment, ExperimentStatus
 from backend.internal.models.fault_detection import DetectionAnalysisResult
 from backend.internal.prometheus import Prometheus
 from backend.internal.utils import dict_product, update_dict_with_parameter_variations
 from backend.internal.store import DocumentStore, FileFormat
 from backend.internal.models.analysis_status import AnalysisStatus
-import io
 import os
 import requests
 logger = logging.getLogger(__name__)
+
+ANALYSIS_SUBMIT_TIMEOUT = float(os.getenv("OXN_ANALYSIS_SUBMIT_TIMEOUT", "600"))
+"""Seconds to keep submitting an analysis while the job queue of the analysis service is full"""
+ANALYSIS_RETRY_SECONDS = 30.0
+"""Wait between submissions if the analysis service does not send a Retry-After header"""
+BATCH_PARALLELISM = int(os.getenv("OXN_BATCH_PARALLELISM", "1"))
+"""Default number of sub experiments of a batch that run at the same time if their namespaces do not overlap"""
+BATCH_LOCK_TIMEOUT = float(os.getenv("OXN_BATCH_LOCK_TIMEOUT", "3600"))
+"""Seconds a sub experiment waits for namespaces that are locked by experiments outside of its batch"""
 """
 Experiment Config filename : <experiment_id>_config.json
 Experiment Report filename : <experiment_id>_report.yaml
-Experiment Responses filename : <experiment_id>_<run_idx>_<response_name>.json / .csv
+Experiment Responses filename : <experiment_id>_<run_idx>_<response_name>.json / .csv / .parquet / .feather
 
 Batch Experiment Config filename : <batch_id>_config.json
 Batch Sub Experiment Config filename : <batch_id>_<sub_experiment_id>_config.json
 Batch Sub Experiment Report filename : <batch_id>_<sub_experiment_id>_report.yaml
-Batch Sub Experiment Responses filename : <batch_id>_<sub_experiment_id>_<run_idx>_<response_name>.json / .csv
+Batch Sub Experiment Responses filename : <batch_id>_<sub_experiment_id>_<run_idx>_<response_name>.json / .csv / .parquet / .feather
 Batch Experiment Params to ID filename : <batch_id>_params_to_id.json
 """
 
@@ -42,6 +51,9 @@ class ExperimentManager:
         self.base_path = base_path
         self.experiments_dir = self.base_path / 'experiments'
         self.lock_file = self.base_path / '.lock'
+        self.namespace_lock_dir = self.base_path / '.locks'
+        self.engines: Dict[str, Engine] = {}
+        """Engines of the experiments that are running in this process, by experiment id"""
         self.counter = 0
         self.store = store
         
@@ -192,11 +204,23 @@ class ExperimentManager:
         return AnalysisStatus.INTERNAL_ERROR.value
     
 
-    def run_batch_experiment(self, batch_id: str, output_formats: List[FileFormat], runs: int, analyse_fault_detection: bool = False):
-        """Run a batch experiment"""
+    def run_batch_experiment(self, batch_id: str, output_formats: List[FileFormat], runs: int, analyse_fault_detection: bool = False,
+                             parallelism: Optional[int] = None):
+        """
+        Run a batch experiment
+
+        Up to parallelism sub experiments run at the same time, as long as they act on different namespaces.
+        Sub experiments start in the order of their ids, one whose namespaces overlap with a running sub
+        experiment is skipped until that one completed. After a failed sub experiment no further sub
+        experiments are started. The batch report lists the run time of every sub experiment and the
+        wall-clock time saved compared to running them one after another.
+        """
+        parallelism = max(1, parallelism or BATCH_PARALLELISM)
+        started_at = datetime.now()
+        sub_experiments: List[Dict] = []
         try:
-            logger.info(f"Running batch experiment: {batch_id}")
-            self.update_experiment_config(batch_id, {'status': 'RUNNING'})
+            logger.info(f"Running batch experiment: {batch_id} with parallelism {parallelism}")
+            self.update_experiment_config(batch_id, {'status': 'RUNNING', 'started_at': started_at.isoformat()})
 
             params_to_id = self.store.load(f"{batch_id}_params_to_id", FileFormat.JSON)
             if params_to_id is None:
@@ -204,36 +228,82 @@ class ExperimentManager:
                 return
             total_sub_experiments = len(params_to_id)
             logger.info(f"Total sub experiments: {total_sub_experiments}")
-            
+
+            pending = []
             for params in params_to_id:
-                sub_experiment_id = params['sub_experiment_id']
-                try:
-                    logger.info(f"Running sub experiment {sub_experiment_id} with params: {params}")
-                    self.run_experiment(f"{batch_id}_{sub_experiment_id}", output_formats, runs, False)
-                    if analyse_fault_detection:
-                        # output data is stored - can be retrieved later using get_experiment_data
-                        self.analyze_fault_detection(f"{batch_id}_{sub_experiment_id}")
-                except Exception as e:
-                    logger.error(f"Error running sub experiment {sub_experiment_id}: {e}")
-                    raise e
-                
-            
+                experiment_id = f"{batch_id}_{params['sub_experiment_id']}"
+                pending.append((params, experiment_namespaces(self.get_experiment_config(experiment_id))))
+
+            with ThreadPoolExecutor(max_workers=parallelism, thread_name_prefix=batch_id) as executor:
+                running = {}
+                error = None
+                while pending or running:
+                    for entry in list(pending):
+                        if error is not None or len(running) >= parallelism:
+                            break
+                        params, namespaces = entry
+                        if any(namespaces_overlap(namespaces, other) for _, other in running.values()):
+                            continue
+                        pending.remove(entry)
+                        logger.info(f"Running sub experiment {params['sub_experiment_id']} with params: {params}")
+                        future = executor.submit(self._run_sub_experiment, batch_id, params['sub_experiment_id'], output_formats, runs, analyse_fault_detection)
+                        running[future] = (params, namespaces)
+                    if not running:
+                        break
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        params, _ = running.pop(future)
+                        sub_experiment = future.result()
+                        sub_experiments.append(sub_experiment)
+                        if sub_experiment['error_message'] and error is None:
+                            logger.error(f"Error running sub experiment {params['sub_experiment_id']}: {sub_experiment['error_message']}")
+                            error = Exception(f"Sub experiment {params['sub_experiment_id']} failed: {sub_experiment['error_message']}")
+            if error is not None:
+                raise error
+            self.update_experiment_config(batch_id, {'status': 'COMPLETED', 'completed_at': datetime.now().isoformat()})
+
         except Exception as e:
             logger.error(f"Error running batch experiment: {e}")
             self.update_experiment_config(batch_id, {'status': 'FAILED', 'error_message': str(e)})
         finally:
-            pass
-
+            if sub_experiments:
+                self.store.save(f"{batch_id}_report", batch_report(sub_experiments, started_at, datetime.now(), parallelism), FileFormat.YAML)
 
+    def _run_sub_experiment(self, batch_id: str, sub_experiment_id, output_formats: List[FileFormat], runs: int,
+                            analyse_fault_detection: bool) -> Dict:
+        """Run a sub experiment of a batch and return its entry of the batch report"""
+        experiment_id = f"{batch_id}_{sub_experiment_id}"
+        started = time.monotonic()
+        error_message = ""
+        try:
+            if self.run_experiment(experiment_id, output_formats, runs, False, lock_timeout=BATCH_LOCK_TIMEOUT) is False:
+                raise TimeoutError("the namespaces of the sub experiment stayed locked by other experiments")
+            if analyse_fault_detection:
+                # output data is stored - can be retrieved later using get_experiment_data
+                self.analyze_fault_detection(experiment_id)
+        except Exception as e:
+            error_message = str(e) or type(e).__name__
+        return {
+            'sub_experiment_id': sub_experiment_id,
+            'status': 'FAILED' if error_message else 'COMPLETED',
+            'error_message': error_message,
+            'seconds': round(time.monotonic() - started, 3),
+        }
 
     def get_experiment_report(self, experiment_id):
         """Get experiment report"""
         return self.store.load(f"{experiment_id}_report", FileFormat.YAML)
     
-    def run_experiment(self, experiment_id, output_formats:List[FileFormat], runs, analysisEnabled:bool):
-        """Run experiment"""
-        if not self.acquire_lock():
-            logger.info("Lock already held, skipping experiment check")
+    def run_experiment(self, experiment_id, output_formats:List[FileFormat], runs, analysisEnabled:bool, lock_timeout: float = 0.0):
+        """
+        Run experiment
+
+        Experiments lock the namespaces they act on, see locks.py. If another experiment holds one of
+        them for longer than lock_timeout seconds the experiment is skipped and False is returned.
+        """
+        namespace_lock = NamespaceLock(self.namespace_lock_dir, experiment_namespaces(self.get_experiment_config(experiment_id)))
+        if not namespace_lock.acquire(lock_timeout):
+            logger.info("Namespaces of the experiment are locked by another experiment, skipping experiment")
             return False
         try:
             logger.info(f"Changing experiment status to RUNNING")
@@ -241,11 +311,17 @@ class ExperimentManager:
             self.update_experiment_config(experiment_id, {'started_at': datetime.now().isoformat()})
             logger.debug(f"experiment config: {self.get_experiment_config(experiment_id)}")
             experiment = self.get_experiment_config(experiment_id)
+            output_formats = [FileFormat(output_format) for output_format in output_formats or [FileFormat.JSON]]
+            unsupported = [output_format.value for output_format in output_formats if not self.store.supports(output_format)]
+            if unsupported:
+                # fail before running the experiment instead of after collecting all data
+                raise ValueError(f"Output formats {unsupported} are not supported by the store, pyarrow may be missing")
         
             engine = Engine(
                 spec=experiment,
                 id=experiment_id
             )
+            self.engines[experiment_id] = engine
             report_data = {}
             for idx in range(runs):
                 # report contains different run keys for each run.
@@ -259,18 +335,16 @@ class ExperimentManager:
                     # construct key
                     key = f"{experiment_id}_{idx}_{response.name}"
                     if response.data is not None:
-                        if isinstance(response.data, pd.DataFrame):
-                            response.data = response.data.to_dict(orient='records')
-                        self.store.save(key, response.data, FileFormat.JSON)
+                        for output_format in output_formats:
+                            self.store.save(key, response.data, output_format)
                     else:
                         logger.error(f"response data is None for {response.name}")
+                if engine.cancelled.is_set():
+                    logger.info(f"Experiment {experiment_id} was cancelled after run {idx}, skipping the remaining runs")
+                    break
 
             self.store.save(f"{experiment_id}_report", report_data, FileFormat.YAML)
             self.update_experiment_config(experiment_id, {'completed_at': datetime.now().isoformat()})
-            # Call the analysis service here
-            if analysisEnabled:
-                self.call_analysis_service(experiment_id)
-                self.update_experiment_config(experiment_id, {'analysis_status': AnalysisStatus.IN_PROGRESS.value})
 
         except Exception as e:
             logger.error(f"Error running experiment: {e}")
@@ -279,27 +353,70 @@ class ExperimentManager:
             self.update_experiment_config(experiment_id, {'status': 'FAILED', 'error_message': str(e)})
             raise e
         finally:
+            self.engines.pop(experiment_id, None)
             self.update_experiment_config(experiment_id, {'status': 'COMPLETED'})
-            self.release_lock()
+            namespace_lock.release()
 
-    def call_analysis_service(self, experiment_id: str) -> None:
-        """Calls the analysis service to analyze the experiment results"""
-        try:
-            analysis_url = os.getenv("ANALYSIS_URL", "http://analysis-module:8001")
-            response = requests.get(
-                f"{analysis_url}/analyze",
-                params={"experiment_id": experiment_id}
-            )
-            
-            if response.status_code != 200:
+        # Call the analysis service here, it may wait for a full analysis queue,
+        # so the namespaces are released and the experiment is completed before
+        if analysisEnabled:
+            if self.call_analysis_service(experiment_id):
+                analysis_status = AnalysisStatus.IN_PROGRESS
+            else:
+                analysis_status = AnalysisStatus.INTERNAL_ERROR
+            self.update_experiment_config(experiment_id, {'analysis_status': analysis_status.value})
+
+    def cancel_experiment(self, experiment_id: str) -> bool:
+        """
+        Cancel a running experiment
+
+        The current run stops its treatments and load generation and stores the data collected so far,
+        the remaining runs are skipped. Returns False if the experiment is not running in this process.
+        """
+        engine = self.engines.get(experiment_id)
+        if engine is None:
+            return False
+        self.update_experiment_config(experiment_id, {'cancelled_at': datetime.now().isoformat()})
+        engine.cancel()
+        return True
+
+    def call_analysis_service(self, experiment_id: str) -> bool:
+        """
+        Queue the analysis of the experiment results in the analysis service
+
+        While the job queue of the analysis service is full it answers with 503, the analysis is then
+        submitted again after the time it asks for until OXN_ANALYSIS_SUBMIT_TIMEOUT is reached.
+        Returns whether the analysis was queued.
+        """
+        analysis_url = os.getenv("ANALYSIS_URL", "http://analysis-module:8001")
+        deadline = time.monotonic() + ANALYSIS_SUBMIT_TIMEOUT
+        while True:
+            try:
+                response = requests.get(
+                    f"{analysis_url}/analyze",
+                    params={"experiment_id": experiment_id},
+                    timeout=30,
+                )
+            except Exception as e:
+                logger.error(f"Error calling analysis service: {str(e)}")
+                return False
+
+            if response.status_code == 200:
+                logger.info(f"Analysis service successfully called for experiment {experiment_id}")
+                return True
+            if response.status_code != 503:
                 logger.error(f"Error calling analysis service: {response.status_code}")
-                return
-                
-            logger.info(f"Analysis service successfully called for experiment {experiment_id}")
-            
-        except Exception as e:
-            logger.error(f"Error calling analysis service: {str(e)}")
+                return False
 
+            try:
+                retry_after = float(response.headers.get("Retry-After", ANALYSIS_RETRY_SECONDS))
+            except ValueError:
+                retry_after = ANALYSIS_RETRY_SECONDS
+            if time.monotonic() + retry_after > deadline:
+                logger.error(f"Analysis queue stayed full, giving up on analysis of experiment {experiment_id}")
+                return False
+            logger.info(f"Analysis queue is full, submitting experiment {experiment_id} again in {retry_after}s")
+            time.sleep(retry_after)
 
     def update_experiment_config(self, experiment_id, updates):
         """Update experiment config"""
@@ -319,34 +436,24 @@ class ExperimentManager:
             raise e
     
     def list_experiments_status(self, status_filter: Optional[str] = None, limit: int = 1000) -> List[ExperimentStatus]:
-        """List all Status of all experiments"""
-        all_documents = self.store.list_keys()
+        """List the status of all experiments, served from the store index without loading their configs"""
         experiments = []
-        length = 0
-        for document in all_documents:
-            if document.endswith("_config"):  # Changed condition to look for config files
-                experiment_config = self.store.load(document, FileFormat.JSON)
-                if experiment_config is not None and isinstance(experiment_config, dict):
-                    if status_filter is not None and experiment_config.get('status') != status_filter:
-                        continue
-                    length += 1
-                    if length > limit:
-                        break
-                    # Extract only the fields needed for ExperimentStatus
-                    status_data = {
-                        'id': experiment_config.get('id', ""),
-                        'name': experiment_config.get('name', ""),
-                        'status': experiment_config.get('status', ""),
-                        'started_at': experiment_config.get('started_at', ""),
-                        'completed_at': experiment_config.get('completed_at', ""),
-                        'error_message': experiment_config.get('error_message', ""),
-                        'analysis_status': experiment_config.get('analysis_status', "")
-                    }
-                    try:
-                        experiments.append(ExperimentStatus(**status_data))
-                    except Exception as e:
-                        logger.error(f"could not create experiment status for {status_data}: {e}")
-                        continue
+        for experiment_config in self.store.list_experiments(status=status_filter, limit=limit):
+            # Extract only the fields needed for ExperimentStatus
+            status_data = {
+                'id': experiment_config.get('id') or "",
+                'name': experiment_config.get('name') or "",
+                'status': experiment_config.get('status') or "",
+                'started_at': experiment_config.get('started_at') or "",
+                'completed_at': experiment_config.get('completed_at') or "",
+                'error_message': experiment_config.get('error_message') or "",
+                'analysis_status': experiment_config.get('analysis_status') or ""
+            }
+            try:
+                experiments.append(ExperimentStatus(**status_data))
+            except Exception as e:
+                logger.error(f"could not create experiment status for {status_data}: {e}")
+                continue
         return experiments
     
 
@@ -370,38 +477,11 @@ class ExperimentManager:
             delattr(self, 'lock_fd')
     
     def get_experiment_response_data(self,run: int, experiment_id: str, response_name: str, file_ending: str):
-        documents = self.store.list_keys()
-        for document in documents:
-            if document.endswith(f"{experiment_id}_{run}_{response_name}.{file_ending}"):
-                return self.store.load(document, FileFormat.JSON)
-        return None
+        return self.store.load(f"{experiment_id}_{run}_{response_name}", FileFormat(file_ending))
     
-    def get_experiment_data(self, experiment_id: str) -> io.BytesIO:
-        files = self.store.list_files()
-        memory_zip = io.BytesIO()
-        with zipfile.ZipFile(memory_zip, 'w', zipfile.ZIP_DEFLATED, compresslevel=7) as zipf:
-            for document in files:
-                if document.startswith(f"{experiment_id}_"):
-                    # Get data from the store and determine format
-                    format = FileFormat.JSON
-                    if document.endswith('.csv'):
-                        format = FileFormat.CSV
-                    elif document.endswith('.yaml'):
-                        format = FileFormat.YAML
-                    elif document.endswith('.json'):
-                        format = FileFormat.JSON
-                
-                    data = self.store.load(document.rsplit('.', 1)[0], format)
-                    if data is not None:
-                        
-                        if isinstance(data, (dict, list)):
-                            data = json.dumps(data, default=str).encode('utf-8')
-                        elif isinstance(data, str):
-                            data = data.encode('utf-8')
-                        # Write the data directly to the zip file with original filename
-                        zipf.writestr(f"{document}", data)
-        memory_zip.seek(0)
-        return memory_zip
+    def get_experiment_data(self, experiment_id: str, compression_level: Optional[int] = None) -> ZipExport:
+        """Zip export of all stored files of an experiment, the files are copied into the archive as they are stored"""
+        return ZipExport(self.store, f"{experiment_id}_", compression_level)
     
     def get_batched_experiment_id_by_params(self, batch_id: str, params: dict) -> Optional[str]:
         '''gets the experiment id for a given batch id and parameter combination'''
@@ -579,3 +659,20 @@ class ExperimentManager:
             
         return responses
 
+
+def batch_report(sub_experiments: List[Dict], started_at: datetime, completed_at: datetime, parallelism: int) -> Dict:
+    """Report of a batch run with the wall-clock time saved by running sub experiments concurrently"""
+    wall_clock = (completed_at - started_at).total_seconds()
+    sequential = sum(sub_experiment['seconds'] for sub_experiment in sub_experiments)
+    return {
+        'started_at': started_at.isoformat(),
+        'completed_at': completed_at.isoformat(),
+        'parallelism': parallelism,
+        'sub_experiments': sorted(sub_experiments, key=lambda sub_experiment: int(sub_experiment['sub_experiment_id'])),
+        'summary': {
+            'wall_clock_seconds': round(wall_clock, 3),
+            'sequential_seconds': round(sequential, 3),
+            'saved_seconds': round(sequential - wall_clock, 3),
+            'speedup': round(sequential / wall_clock, 2) if wall_clock > 0 else None,
+        },
+    }
@@ -0,0 +1,182 @@
+"""
+Purpose: Exports the stored files of an experiment as a zip archive.
+Functionality: Copies the files byte for byte into a zip stream that is produced chunk by chunk and can be resumed at a byte offset.
+Connection: Created by experiment_manager.py and served by the data endpoints in main.py.
+
+Streaming zip export of experiment data"""
+import hashlib
+import logging
+import os
+import threading
+import zipfile
+from collections import OrderedDict
+from typing import Iterator, List, Optional, Tuple
+
+from fastapi.responses import Response, StreamingResponse
+
+from backend.internal.store import DocumentStore
+
+logger = logging.getLogger(__name__)
+
+EXPORT_COMPRESSION_LEVEL = int(os.getenv("OXN_EXPORT_COMPRESSION_LEVEL", "6"))
+"""Default deflate level of exported files, 0 stores all files uncompressed"""
+EXPORT_CHUNK_SIZE = 1 << 20
+"""Number of bytes read from a stored file at a time"""
+STORED_SUFFIXES = (".parquet", ".feather")
+"""Files that are already compressed and are always stored without compression"""
+
+_archive_sizes: "OrderedDict[str, int]" = OrderedDict()
+"""Sizes of recently requested archives by their ETag, to answer range requests without measuring them again"""
+_MAX_ARCHIVE_SIZES = 256
+_archive_sizes_lock = threading.Lock()
+
+
+class _ChunkWriter:
+    """Unseekable file object that collects what the zip writer produces until it is drained"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> List[bytes]:
+        chunks, self.chunks = self.chunks, []
+        return chunks
+
+
+class ZipExport:
+    """
+    Zip archive of all stored files whose name starts with a prefix.
+
+    The archive is written on the fly and never held in memory as a whole. It is deterministic
+    for the same files and compression level: entries are ordered by name and all carry the zip
+    epoch 1980-01-01 as their timestamp. A download can therefore be resumed by producing the archive
+    again and skipping the bytes that were already received. Note that this deflates the archive
+    from byte 0 again, so serving a range of a large export, or measuring its size for the first
+    time, costs as much CPU as a full download.
+    """
+
+    def __init__(self, store: DocumentStore, prefix: str, compression_level: Optional[int] = None):
+        self.store = store
+        self.compression_level = EXPORT_COMPRESSION_LEVEL if compression_level is None else compression_level
+        self.entries: List[Tuple[str, int, float]] = []
+        """Name, size and modification time of the exported files"""
+        for file_name in sorted(store.list_files(prefix=prefix)):
+            info = store.file_info(file_name)
+            if info is None:
+                logger.warning(f"Skipping {file_name} in export, the file is no longer stored")
+                continue
+            self.entries.append((file_name, *info))
+
+    @property
+    def etag(self) -> str:
+        """Identifies the archive bytes, changes whenever a file or the compression level changes"""
+        digest = hashlib.sha256(str(self.compression_level).encode())
+        for name, size, modified in self.entries:
+            digest.update(f"{name}\0{size}\0{modified}\0".encode())
+        return f'"{digest.hexdigest()[:32]}"'
+
+    def size(self) -> int:
+        """Return the size of the archive, producing it once if it was not measured before"""
+        etag = self.etag
+        with _archive_sizes_lock:
+            if etag in _archive_sizes:
+                _archive_sizes.move_to_end(etag)
+                return _archive_sizes[etag]
+        size = sum(len(chunk) for chunk in self.iter_bytes())
+        with _archive_sizes_lock:
+            _archive_sizes[etag] = size
+            while len(_archive_sizes) > _MAX_ARCHIVE_SIZES:
+                _archive_sizes.popitem(last=False)
+        return size
+
+    def _open_entry(self, archive: zipfile.ZipFile, name: str, size: int):
+        """Open an entry by name to deflate it with the level of the archive, already compressed files are stored"""
+        if self.compression_level == 0 or name.endswith(STORED_SUFFIXES):
+            info = zipfile.ZipInfo(name)
+            info.file_size = size
+            return archive.open(info, "w")
+        # the size of an entry opened by name is unknown, zip64 is decided like for a ZipInfo with the size
+        return archive.open(name, "w", force_zip64=size * 1.05 > zipfile.ZIP64_LIMIT)
+
+    def _iter_archive(self) -> Iterator[bytes]:
+        writer = _ChunkWriter()
+        with zipfile.ZipFile(writer, "w", zipfile.ZIP_DEFLATED, compresslevel=self.compression_level) as archive:
+            for name, size, _ in self.entries:
+                with self.store.open_file(name) as source, self._open_entry(archive, name, size) as entry:
+                    while chunk := source.read(EXPORT_CHUNK_SIZE):
+                        entry.write(chunk)
+                        yield from writer.drain()
+                yield from writer.drain()
+        yield from writer.drain()
+
+    def iter_bytes(self, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """Yield the archive from byte start up to and including byte end"""
+        position = 0
+        for chunk in self._iter_archive():
+            chunk_end = position + len(chunk)
+            if chunk_end > start:
+                first = max(start - position, 0)
+                last = len(chunk) if end is None else min(end + 1 - position, len(chunk))
+                if first < last:
+                    yield chunk[first:last]
+            position = chunk_end
+            if end is not None and position > end:
+                return
+
+
+def _parse_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single byte range, return None if it cannot be satisfied"""
+    unit, _, ranges = range_header.partition("=")
+    if unit.strip() != "bytes" or "," in ranges:
+        raise ValueError(f"Unsupported range {range_header}")
+    first, _, last = ranges.strip().partition("-")
+    if not first:
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        return None
+    return start, end
+
+
+def export_response(export: ZipExport, filename: str, range_header: Optional[str] = None,
+                    if_range: Optional[str] = None) -> Response:
+    """
+    Stream an export, answering single byte range requests with partial content
+
+    Multi-range and malformed range requests, and ranges of an archive that changed since
+    the ETag in If-Range, are answered with the full archive.
+    """
+    etag = export.etag
+    headers = {
+        "Content-Disposition": f"attachment; filename={filename}",
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+    }
+    if range_header and (if_range is None or if_range == etag):
+        size = export.size()
+        try:
+            byte_range = _parse_range(range_header, size)
+        except ValueError:
+            logger.debug(f"Ignoring range {range_header} for {filename}")
+        else:
+            if byte_range is None:
+                return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            headers["Content-Length"] = str(end - start + 1)
+            return StreamingResponse(
+                export.iter_bytes(start, end), status_code=206, media_type="application/zip", headers=headers
+            )
+    with _archive_sizes_lock:
+        size = _archive_sizes.get(etag)
+    if size is not None:
+        headers["Content-Length"] = str(size)
+    return StreamingResponse(export.iter_bytes(), media_type="application/zip", headers=headers)
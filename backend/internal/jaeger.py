@@ -4,15 +4,24 @@ Functionality: Provides methods to query traces and services from Jaeger.
 Connection: Used by responses.py and validation.py to gather trace data and validate configurations.
 
 Wrapper around the internal Jaeger tracing API"""
-from typing import Optional, Union
+import json
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Iterator, Optional, Union
 
 import requests
-from requests.adapters import HTTPAdapter, Retry
+import urllib3
 import logging
 
+try:
+    import ijson
+except ImportError:  # optional dependency, only required for streaming responses
+    ijson = None
+
 from backend.internal.models.orchestrator import Orchestrator
 
 from backend.internal.errors import JaegerException
+from backend.internal.query_cache import QUERY_CACHE, QueryCache
 
 LOGGER = logging.getLogger(__name__)
 
@@ -20,25 +29,28 @@ LOGGER = logging.getLogger(__name__)
 # NOTE: jaeger timestamps wire format is microseconds since epoch in utc cf.
 # https://github.com/jaegertracing/jaeger/pull/712
 
+HARVEST_WORKERS = 4
+"""Default number of time slices that are fetched concurrently when harvesting traces"""
+MIN_HARVEST_SLICE = 1_000_000
+"""Slices that hit the trace limit are not split below this duration in microseconds"""
+
 
 class Jaeger:
     """
     Wrapper around the undocumented Jaeger HTTP API.
     """
 
-    def __init__(self, orchestrator: Orchestrator, jaeger_service_name: str = "jaeger"):
+    def __init__(
+        self, orchestrator: Orchestrator, jaeger_service_name: str = "jaeger", cache: Optional[QueryCache] = None
+    ):
         assert orchestrator is not None
         self.orchestrator = orchestrator
-        self.session = requests.Session()
-        retries = Retry(
-            total=5, backoff_factor=0.1, status_forcelist=[500, 502, 503, 504]
-        )
-        """Retry policy. Force retries on server errors"""
-        self.session.mount("http://", HTTPAdapter(max_retries=retries))
-        """Mount the retry adapter"""
-        address = orchestrator.get_jaeger_address()
-        assert address is not None
-        self.base_url = f"http://{address}:16686/jaeger/ui/api/"
+        self.cache = cache or QUERY_CACHE
+        """Cache for trace searches over closed windows"""
+        self.clients = orchestrator.clients
+        self.session = self.clients.session("jaeger")
+        """Session shared by all Jaeger clients of the orchestrator, retries on server errors"""
+        self.base_url = self._base_url()
         """Jaeger base url"""
         self.endpoints = {
             "traces": "traces",
@@ -49,6 +61,29 @@ class Jaeger:
         }
         """Jaeger API endpoints"""
 
+    def _base_url(self) -> str:
+        address = self.clients.address(("jaeger",), self.orchestrator.get_jaeger_address)
+        assert address is not None
+        return f"http://{address}:16686/jaeger/ui/api/"
+
+    def _request(self, url: str, **kwargs) -> requests.Response:
+        """
+        Send a GET request to Jaeger
+
+        If Jaeger cannot be reached its cached address is dropped, since the pod may have moved,
+        and the request is sent once more if the address now resolves to a different one.
+        """
+        try:
+            return self.session.get(url, **kwargs)
+        except requests.exceptions.ConnectionError:
+            base_url = self.base_url
+            self.clients.invalidate(("jaeger",))
+            self.base_url = self._base_url()
+            if self.base_url == base_url or not url.startswith(base_url):
+                raise
+            LOGGER.info(f"Jaeger moved from {base_url} to {self.base_url}, sending the request again")
+            return self.session.get(self.base_url + url[len(base_url):], **kwargs)
+
     def get_services(self) -> Union[list, None]:
         """Returns a list of all services"""
         endpoint = self.endpoints.get("services")
@@ -59,7 +94,7 @@ class Jaeger:
             )
         url = self.base_url + endpoint
         try:
-            response = self.session.get(
+            response = self._request(
                 url=url,
             )
             response.raise_for_status()
@@ -76,6 +111,16 @@ class Jaeger:
             LOGGER.error(f"Could not connect to jaeger at {url}")
             raise JaegerException from error
 
+    def _search_endpoint(self) -> str:
+        """Return the url of the trace search endpoint"""
+        traces = self.endpoints.get("traces")
+        if traces is None:
+            raise JaegerException(
+                message="Invalid Jaeger endpoint",
+                explanation="The traces endpoint is invalid",
+            )
+        return self.base_url + traces
+
     def search_traces(
         self,
         start=None,
@@ -86,14 +131,8 @@ class Jaeger:
         min_duration=None,
         service_name="adservice",
     ) -> Optional[dict]:
-        """Search Jaeger traces"""
-        traces = self.endpoints.get("traces")
-        if traces is None:
-            raise JaegerException(
-                message="Invalid Jaeger endpoint",
-                explanation="The traces endpoint is invalid",
-            )
-        endpoint = self.base_url + traces
+        """Search Jaeger traces, searches that ended before now are served from the query cache"""
+        endpoint = self._search_endpoint()
         params = {
             "start": start,
             "end": end,
@@ -103,16 +142,122 @@ class Jaeger:
             "service": service_name,
             "limit": limit,
         }
-        try:
-            response = self.session.get(url=endpoint, params=params)
+
+        def request() -> bytes:
+            response = self._request(url=endpoint, params=params)
             response.raise_for_status()
-            return response.json()
+            return response.content
+
+        window_end = end / 1_000_000 if isinstance(end, (int, float)) else None
+        try:
+            return json.loads(self.cache.fetch(endpoint, params, window_end, request))
         except requests.exceptions.RequestException as error:
             raise JaegerException(
                 message=f"Error while talking to Jaeger at {endpoint}",
                 explanation=error,
             )
 
+    def stream_traces(
+        self,
+        start=None,
+        end=None,
+        limit=None,
+        service_name="adservice",
+    ) -> Iterator[dict]:
+        """
+        Search Jaeger traces and parse the response incrementally
+
+        The response body is read in chunks and parsed with ijson, so only a single trace
+        is held as Python objects at a time. Yields the traces in the order Jaeger sent them.
+        """
+        if ijson is None:
+            raise JaegerException(
+                message="Cannot stream Jaeger responses",
+                explanation="Streaming requires the optional ijson dependency (backend[stream])",
+            )
+        endpoint = self._search_endpoint()
+        params = {
+            "start": start,
+            "end": end,
+            "service": service_name,
+            "limit": limit,
+        }
+        try:
+            with self._request(url=endpoint, params=params, stream=True) as response:
+                response.raise_for_status()
+                response.raw.decode_content = True
+                yield from ijson.items(response.raw, "data.item", use_float=True)
+        except (requests.exceptions.RequestException, urllib3.exceptions.HTTPError) as error:
+            raise JaegerException(
+                message=f"Error while talking to Jaeger at {endpoint}",
+                explanation=error,
+            )
+        except ijson.JSONError as error:
+            raise JaegerException(
+                message=f"Received invalid JSON from Jaeger at {endpoint}",
+                explanation=error,
+            )
+
+    def harvest_traces(
+        self,
+        service_name: str,
+        start: int,
+        end: int,
+        limit: int,
+        slice_duration: Optional[int] = None,
+        max_workers: int = HARVEST_WORKERS,
+        min_slice_duration: int = MIN_HARVEST_SLICE,
+    ) -> Iterator[list]:
+        """
+        Search all Jaeger traces of a service between start and end
+
+        The window is split into time slices that are searched concurrently over the shared session.
+        A slice that returns as many traces as the limit is likely truncated, so it is split in half and
+        searched again until it fits or reaches the minimum slice duration. Traces that cross a slice border
+        are returned by both slices and de-duplicated by their trace id.
+        Yields the previously unseen traces of every completed slice.
+        """
+        if slice_duration is None:
+            slice_duration = -(-(end - start) // max_workers)
+        slice_duration = max(slice_duration, 1)
+        slices = deque(
+            (slice_start, min(slice_start + slice_duration, end))
+            for slice_start in range(start, end, slice_duration)
+        )
+        seen_trace_ids = set()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = {}
+            while slices or pending:
+                while slices and len(pending) < max_workers:
+                    slice_start, slice_end = slices.popleft()
+                    future = executor.submit(
+                        self.search_traces,
+                        start=slice_start,
+                        end=slice_end,
+                        limit=limit,
+                        service_name=service_name,
+                    )
+                    pending[future] = (slice_start, slice_end)
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    slice_start, slice_end = pending.pop(future)
+                    traces = (future.result() or {}).get("data") or []
+                    if len(traces) >= limit:
+                        if slice_end - slice_start > min_slice_duration:
+                            middle = (slice_start + slice_end) // 2
+                            slices.extend([(slice_start, middle), (middle, slice_end)])
+                            continue
+                        LOGGER.warning(
+                            f"Jaeger returned {len(traces)} traces for {service_name} between {slice_start} "
+                            f"and {slice_end}, traces in this slice may be truncated"
+                        )
+                    unseen = []
+                    for trace in traces:
+                        if trace["traceID"] not in seen_trace_ids:
+                            seen_trace_ids.add(trace["traceID"])
+                            unseen.append(trace)
+                    yield unseen
+
     def get_service_operations(self, service="adservice") -> [dict, None]:
         """Get all service operations for a given service from Jaeger"""
         operations = self.endpoints.get("operations")
@@ -124,7 +269,7 @@ class Jaeger:
         endpoint = self.base_url + operations
         endpoint = endpoint % service
         try:
-            response = self.session.get(endpoint)
+            response = self._request(endpoint)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as error:
@@ -144,7 +289,7 @@ class Jaeger:
         endpoint = self.base_url + dependencies
         params = {"endTs": end_timestamp, "lookback": lookback}
         try:
-            response = self.session.get(endpoint, params=params)
+            response = self._request(endpoint, params=params)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as error:
@@ -163,7 +308,7 @@ class Jaeger:
             )
         endpoint = self.base_url + trace % trace_id
         try:
-            response = self.session.get(endpoint)
+            response = self._request(endpoint)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as error:
@@ -3,9 +3,13 @@
 
 from cProfile import label
 from math import exp
+import os
 import re
+import threading
 import yaml
 import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 
 import logging
 from typing import Optional, List, Tuple
@@ -16,34 +20,37 @@ from kubernetes.client.exceptions import ApiException
 from kubernetes.client.models.v1_deployment import V1Deployment
 from kubernetes.client.models.v1_pod import V1Pod
 
+from backend.internal.cluster_cache import CLUSTER_CACHE, CLUSTER_CACHE_ENABLED, PODS, SERVICES
 from backend.internal.models.experiment import Experiment
 from backend.internal.models.orchestrator import Orchestrator  # Import the abstract base class
+from backend.internal.models.pod_exec import PodExecReport, PodExecResult, PodExecStatus
+from backend.internal.rollout import ROLLOUT_TIMEOUT, Rollout, deployment_rolled_out, pod_ready, timed, watch_until
 logger = logging.getLogger(__name__)
 
 from backend.internal.errors import OxnException, OrchestratorException, OrchestratorResourceNotFoundException
 
+POD_EXEC_WORKERS = int(os.getenv("OXN_POD_EXEC_WORKERS", "32"))
+"""Maximum number of pods a command is executed in at the same time"""
+POD_EXEC_TIMEOUT = float(os.getenv("OXN_POD_EXEC_TIMEOUT", "60"))
+"""Seconds a command may run in a single pod"""
+COMMAND_NOT_FOUND_EXIT_CODES = (126, 127)
+"""Exit codes of sh if a command does not exist or cannot be executed"""
+
 class KubernetesOrchestrator(Orchestrator):
     def __init__(self, experiment_config: Experiment):
         logger.info("Initializing Kubernetes orchestrator")
         #import sys
         #sys.setrecursionlimit(10000) 
         self.experiment_config = experiment_config
+        self._exec_clients = threading.local()
         try:
             config.load_incluster_config()
             self.kube_client = client.CoreV1Api()
             self.api_client = client.AppsV1Api()
 
-            logger.info("Loading all running resources in k8s cluster")
-            
-            
-            try:
-                self.list_of_all_pods = self.kube_client.list_pod_for_all_namespaces(watch=False)
-                self.list_of_all_services = self.kube_client.list_service_for_all_namespaces(watch=False)
-            except Exception as e:
-                logger.error(f"Error loading cluster resources: {str(e)}")
-                #  fallback
-                self.list_of_all_pods = []
-                self.list_of_all_services = []
+            if CLUSTER_CACHE_ENABLED:
+                # pods and services are watched once per process instead of listed per orchestrator
+                CLUSTER_CACHE.start()
 
             self.required_services = self.experiment_config.sue.required
             
@@ -61,7 +68,7 @@ class KubernetesOrchestrator(Orchestrator):
             return True
         for service in self.required_services:
             try:
-                service = self.kube_client.read_namespaced_service(service.name, service.namespace)
+                self._read_service(service.namespace, service.name)
             except ApiException as e:
                 raise OxnException(
                     message=f"Service {service.name} in namespace {service.namespace} is not running but set as a required service",
@@ -90,7 +97,25 @@ class KubernetesOrchestrator(Orchestrator):
         pass
 
     def running_services(self) -> List[str]:
-        return [service.metadata.name for service in self.list_of_all_services]
+        services = CLUSTER_CACHE.list(SERVICES) if CLUSTER_CACHE_ENABLED else None
+        if services is None:
+            services = self.kube_client.list_service_for_all_namespaces(watch=False).items
+        return [service.metadata.name for service in services]
+
+    def _list_pods(self, namespace: str, label_selector: str) -> List[V1Pod]:
+        """Pods matching a label selector, from the cluster cache if it holds the namespace"""
+        pods = CLUSTER_CACHE.list(PODS, namespace, label_selector) if CLUSTER_CACHE_ENABLED else None
+        if not pods:
+            # the cache may not have seen pods that were just created yet
+            pods = self.kube_client.list_namespaced_pod(namespace=namespace, label_selector=label_selector).items
+        return pods
+
+    def _read_service(self, namespace: str, name: str) -> client.V1Service:
+        """Service by name, from the cluster cache if it holds the namespace"""
+        service = CLUSTER_CACHE.get(SERVICES, namespace, name) if CLUSTER_CACHE_ENABLED else None
+        if service is None:
+            service = self.kube_client.read_namespaced_service(namespace=namespace, name=name)
+        return service
 
     """
     Get all pods for a given service and execute a command on them and aggregate the results
@@ -105,75 +130,106 @@ class KubernetesOrchestrator(Orchestrator):
             command: The command to execute
 
         Returns:
-            A tuple of the return code and the output of the command
+            A tuple of the return code and the output of the command. The return code is 0 if the command
+            succeeded in all pods, -1 if the command was not found and the exit code of the first failing pod otherwise
 
         Throws:
             OrchestratorResourceNotFoundException: If no pods are found for the given label
-            OrchestratorException: If an error occurs while executing the command
+            OrchestratorException: If the command could not be executed on a pod or did not complete within the timeout
         
         """
-        #logger.info("execute_console_command noop implementation for service %s with command %s", service, command)
+        report = self.execute_on_all_matching_pods(label_selector, label, namespace, command)
+        if report.errors:
+            failed = ", ".join(f"{result.pod} ({result.error})" for result in report.errors)
+            raise OrchestratorException(
+                message=f"Error while executing command {command} on pods in namespace {namespace}: {failed}",
+                explanation=f"{len(report.errors)} of {len(report.results)} pods with {label_selector}={label} did not complete the command",
+            )
+        if report.status == PodExecStatus.SUCCEEDED:
+            return 0, "Success"
+        if report.exit_code in COMMAND_NOT_FOUND_EXIT_CODES:
+            return -1, f"Command not found: {' '.join(command)}"
+        return report.exit_code, "\n".join(f"{result.pod}: {result.output}" for result in report.results if not result.succeeded)
+
+    def execute_on_all_matching_pods(self, label_selector: str, label: str, namespace: str, command: List[str],
+                                     timeout: float = POD_EXEC_TIMEOUT, workers: int = POD_EXEC_WORKERS) -> PodExecReport:
+        """
+        Execute a command concurrently in all pods with a given label
 
-        # Get all pods with label app.kubernetes.io/name=service
-        pods = self.kube_client.list_namespaced_pod(namespace=namespace, label_selector=f"{label_selector}={label}")
-        #pods = self.kube_client.list_pod_for_all_namespaces(label_selector=f"app.kubernetes.io/name={label}")
+        The command is started in up to workers pods at the same time, so that a fault reaches all replicas
+        of a deployment at nearly the same time. Every pod gets timeout seconds to complete the command.
 
-        if not pods.items:
+        Returns:
+            A report with the exit code, output and timestamps of every pod
+
+        Throws:
+            OrchestratorResourceNotFoundException: If no pods are found for the given label
+        """
+        pods = self._list_pods(namespace, f"{label_selector}={label}")
+        if not pods:
             raise OrchestratorResourceNotFoundException(
                 message=f"No pods found with the given label selector {label_selector}={label}",
-                explanation="No pods found with the given label selector {label_selector}={label}",
+                explanation=f"No pods found with the given label selector {label_selector}={label} in namespace {namespace}",
             )
-        
-        # Execute the command on each pod
-        for pod in pods.items:
-            try:
-                exec_command = command
-                assert pod.metadata.labels[label_selector]
-                
-                container = None
-                if pod.spec.containers and pod.spec.containers.__len__() > 1:
-                    logger.warning(f"Pod {pod.metadata.name} in namespace {label} has more than one container. Using the first container to execute the command. (Container: {pod.spec.containers[0].name})")
-                    container = pod.spec.containers[0]
-                else:
-                    container = pod.spec.containers[0]
-
-                wrapped_command = ['sh', '-c', f"{' '.join(exec_command)}; echo $?"]
-    
-                response = stream(self.kube_client.connect_get_namespaced_pod_exec,
-                                name=pod.metadata.name,
-                                namespace=pod.metadata.namespace,
-                                command=wrapped_command,
-                                container=container.name,
-                                stderr=True,
-                                stdin=False,
-                                stdout=True,
-                                tty=False)
-                
-                if response == "0":
-                    return 0, "Success"
-                
-                # if response includes "not found" or "no such file or directory" then the command was not found
-                if "not found" in response or "no such file or directory" in response:
-                    return -1, f"Command not found: {' '.join(exec_command)}"
-                    
-                # Split the response to separate the command output and exit status
-                response_lines = response.split('\n')
-                exit_status_line = response_lines[-2].strip()
-                print(exit_status_line)
-                exit_status = int(exit_status_line)
-                command_output = '\n'.join(response_lines[:-2])
-                
-                return exit_status, command_output
-                
-                logger.info(response)
-            except ApiException as e:
-                raise OrchestratorException(
-                    message=f"Error while executing command {command} on pod {pod.metadata.name} in namespace {label}: {e.body}",
-                    explanation=str(e),
-                )
-            
 
-        return 0, "Success"
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(pods))), thread_name_prefix="pod-exec") as executor:
+            results = list(executor.map(lambda pod: self._execute_on_pod(pod, command, timeout), pods))
+        report = PodExecReport(command=command, results=results)
+        logger.info(
+            f"Executed {command} in {len(results)} pods with {label_selector}={label}: {report.status.value}, "
+            f"started within {report.onset_spread * 1000:.0f}ms"
+        )
+        return report
+
+    def _exec_client(self) -> client.CoreV1Api:
+        """
+        CoreV1Api of the current thread. stream() swaps the request method of the api client while it connects,
+        so concurrent execs must not share a client.
+        """
+        exec_client = getattr(self._exec_clients, "client", None)
+        if exec_client is None:
+            exec_client = self._exec_clients.client = client.CoreV1Api(client.ApiClient())
+        return exec_client
+
+    def _execute_on_pod(self, pod: V1Pod, command: List[str], timeout: float) -> PodExecResult:
+        """Execute a command in the first container of a pod"""
+        container = pod.spec.containers[0]
+        if len(pod.spec.containers) > 1:
+            logger.warning(f"Pod {pod.metadata.name} in namespace {pod.metadata.namespace} has more than one container. Using the first container to execute the command. (Container: {container.name})")
+        result = PodExecResult(
+            pod=pod.metadata.name,
+            namespace=pod.metadata.namespace,
+            container=container.name,
+            started_at=datetime.now(),
+            completed_at=datetime.now(),
+        )
+        response = None
+        try:
+            response = stream(self._exec_client().connect_get_namespaced_pod_exec,
+                            name=pod.metadata.name,
+                            namespace=pod.metadata.namespace,
+                            command=['sh', '-c', ' '.join(command)],
+                            container=container.name,
+                            stderr=True,
+                            stdin=False,
+                            stdout=True,
+                            tty=False,
+                            _preload_content=False)
+            response.run_forever(timeout=timeout)
+            result.output = response.read_all().strip()
+            if response.is_open():
+                result.error = f"command did not complete within {timeout}s"
+            else:
+                result.exit_code = response.returncode
+        except ApiException as e:
+            result.error = str(e.body or e.reason)
+        except Exception as e:
+            result.error = str(e) or type(e).__name__
+        finally:
+            if response is not None:
+                response.close()
+            result.completed_at = datetime.now()
+        return result
     
     def apply_security_context_to_deployment(self, label_selector:str, label: str, namespace: str, capabilities: dict) -> Tuple[int, str]:
         """
@@ -254,7 +310,7 @@ class KubernetesOrchestrator(Orchestrator):
 
         """
         
-        service = self.kube_client.read_namespaced_service(namespace=namespace, name=name)
+        service = self._read_service(namespace, name)
         if not service:
             raise OrchestratorResourceNotFoundException(
                 message=f"No service found for service {label}",
@@ -266,13 +322,13 @@ class KubernetesOrchestrator(Orchestrator):
             logger.info(f"Service {name} in namespace {namespace} has no cluster IP. Falling back to pod IP by selecting first pod and receiving its IP")
             # fall back to pod IP
             name_label_of_service = service.metadata.labels["app.kubernetes.io/name"]
-            pods = self.kube_client.list_namespaced_pod(namespace=namespace, label_selector=f"app.kubernetes.io/name={name_label_of_service}")
-            if not pods.items:
+            pods = self._list_pods(namespace, f"app.kubernetes.io/name={name_label_of_service}")
+            if not pods:
                 raise OrchestratorResourceNotFoundException(
                     message=f"No pods found for service {label}",
                     explanation="No pods found for the given service",
                 )
-            cluster_ip = pods.items[0].status.pod_ip
+            cluster_ip = pods[0].status.pod_ip
         
         return cluster_ip
         
@@ -350,18 +406,19 @@ class KubernetesOrchestrator(Orchestrator):
             The deployment of the service
 
         """
-        deployments = self.api_client.list_namespaced_deployment(namespace, label_selector=f"{label_selector}={label}")
-        if not deployments.items:
+        # read from the API server, callers change the deployment and write it back with its resource version
+        deployments = self.api_client.list_namespaced_deployment(namespace, label_selector=f"{label_selector}={label}").items
+        if not deployments:
             raise OrchestratorResourceNotFoundException(
                 message=f"No deployments found for service {label}",
                 explanation="No deployments found for the given service",
             )
-        if len(deployments.items) > 1:
+        if len(deployments) > 1:
             raise OrchestratorException(
                 message=f"Multiple deployments found for service {label}",
                 explanation="Multiple deployments found for the given service",
             )
-        return deployments.items[0]
+        return deployments[0]
     
     def scale_deployment(self, deployment: V1Deployment, replicas: int):
         """
@@ -401,13 +458,13 @@ class KubernetesOrchestrator(Orchestrator):
             The pods of the service
 
         """
-        pods = self.kube_client.list_namespaced_pod(namespace, label_selector=f"{label_selector}={label}")
-        if not pods.items:
+        pods = self._list_pods(namespace, f"{label_selector}={label}")
+        if not pods:
             raise OrchestratorResourceNotFoundException(
                 message=f"No pods found with the given label selector {label_selector}={label}",
                 explanation="No pods found with the given label selector {label_selector}={label}",
             )
-        return pods.items
+        return pods
     
     def kill_pod(self, pod: V1Pod):
         """
@@ -837,13 +894,16 @@ class KubernetesOrchestrator(Orchestrator):
                 explanation=str(e),
             )
 
-    def restart_pods_of_deployment(self, deployment: V1Deployment):
+    def restart_pods_of_deployment(self, deployment: V1Deployment) -> Rollout:
         """
         Restart pods for a service
 
         Args:
             deployment: The deployment to restart the pods for
 
+        Returns:
+            The rollout of the replacement pods
+
         """
         assert deployment is not None
         assert deployment.metadata is not None
@@ -858,27 +918,82 @@ class KubernetesOrchestrator(Orchestrator):
         label_selector_str = ','.join([f"{key}={value}" for key, value in label_selector.items()])
 
       # List all pods with the label selector
-        pods = self.kube_client.list_namespaced_pod(
-            namespace=deployment.metadata.namespace, 
-            label_selector=label_selector_str)
+        pods = self._list_pods(deployment.metadata.namespace, label_selector_str)
 
-        if not pods.items:
+        if not pods:
             raise OrchestratorResourceNotFoundException(
                 message=f"No pods found for deployment {deployment.metadata.name}",
                 explanation="No pods found for the given deployment",
             )
         
-        for pod in pods.items:
+        started = time.time()
+        for pod in pods:
             self.kill_pod(pod)
             logger.info(f"Pod {pod.metadata.name} in namespace {deployment.metadata.namespace} has been killed because of restart")
-            
-        time.sleep(4)
-        for i in range(0, 10):
-            if self.is_deployment_ready(deployment):
-                break
-            time.sleep(i * 2)
-            logger.info(f"Waiting for deployment {deployment.metadata.name} to be ready after restart. Retry {i}")
-            
-        logger.info(f"Deployment {deployment.metadata.name} is ready after restart")
-            
-        
+
+        return self.wait_for_replaced_pods(deployment, [pod.metadata.uid for pod in pods], "restart", started)
+
+    def wait_for_deployment_rollout(self, deployment: V1Deployment, reason: str = "update", started: Optional[float] = None,
+                                    timeout: float = ROLLOUT_TIMEOUT) -> Rollout:
+        """
+        Wait until a deployment rolled out its latest spec
+
+        Args:
+            deployment: The deployment that was changed
+            reason: What was changed, recorded in the rollout
+            started: Unix timestamp of the change, defaults to now
+            timeout: Seconds to wait for the rollout
+
+        Returns:
+            The rollout with its measured duration, completed is False if the deadline passed
+
+        """
+        assert deployment.metadata is not None
+        return timed(deployment.metadata.name, deployment.metadata.namespace, reason, started or time.time(), lambda: watch_until(
+            self.api_client.list_namespaced_deployment,
+            lambda deployments: any(deployment_rolled_out(current) for current in deployments.values()),
+            timeout,
+            namespace=deployment.metadata.namespace,
+            field_selector=f"metadata.name={deployment.metadata.name}",
+        ))
+
+    def wait_for_replaced_pods(self, deployment: V1Deployment, replaced_uids: List[str], reason: str = "restart",
+                               started: Optional[float] = None, timeout: float = ROLLOUT_TIMEOUT) -> Rollout:
+        """
+        Wait until pods of a deployment that were deleted are replaced by ready pods
+
+        Args:
+            deployment: The deployment the pods belong to
+            replaced_uids: The uids of the deleted pods
+            reason: What was changed, recorded in the rollout
+            started: Unix timestamp of the deletion, defaults to now
+            timeout: Seconds to wait for the replacements
+
+        Returns:
+            The rollout with its measured duration, completed is False if the deadline passed
+
+        """
+        assert deployment.metadata is not None
+        assert deployment.spec is not None
+        assert deployment.spec.selector is not None
+        label_selector = ','.join(f"{key}={value}" for key, value in (deployment.spec.selector.match_labels or {}).items())
+        replicas = deployment.spec.replicas if deployment.spec.replicas is not None else 1
+        return self.wait_for_ready_pods(deployment.metadata.namespace, label_selector, replicas, replaced_uids, reason, started, timeout)
+
+    def wait_for_ready_pods(self, namespace: str, label_selector: str, replicas: int, replaced_uids: List[str] = (),
+                            reason: str = "restart", started: Optional[float] = None, timeout: float = ROLLOUT_TIMEOUT) -> Rollout:
+        """
+        Wait until replicas pods matching a label selector are ready, not counting the pods in replaced_uids
+
+        Returns:
+            The rollout with its measured duration, completed is False if the deadline passed
+
+        """
+        replaced = set(replaced_uids)
+        return timed(label_selector, namespace, reason, started or time.time(), lambda: watch_until(
+            self.kube_client.list_namespaced_pod,
+            lambda pods: sum(uid not in replaced and pod_ready(pod) for uid, pod in pods.items()) >= replicas,
+            timeout,
+            namespace=namespace,
+            label_selector=label_selector,
+        ))
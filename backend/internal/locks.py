@@ -0,0 +1,97 @@
+"""
+Purpose: Keeps experiments that act on the same namespaces from running at the same time.
+Functionality: Takes an fcntl lock file per namespace, experiments that do not declare their namespaces lock the whole cluster.
+Connection: Used by experiment_manager.py to run the experiments of a batch concurrently.
+
+Namespace locks of running experiments"""
+import fcntl
+import logging
+import os
+import time
+from pathlib import Path
+from typing import FrozenSet, List, Optional
+
+from backend.internal.models.experiment import Experiment
+
+logger = logging.getLogger(__name__)
+
+LOCK_POLL_SECONDS = 1.0
+"""Wait between attempts to take locks that are held by another experiment"""
+CLUSTER_LOCK = ".cluster"
+"""Shared by every running experiment, exclusive for experiments whose namespaces are unknown"""
+
+
+def experiment_namespaces(spec: Experiment) -> Optional[FrozenSet[str]]:
+    """
+    Namespaces an experiment changes or puts load on: the required deployments of the SUE, the target of
+    the load generator and the namespaces of its treatments. The namespaces of the observability services
+    are only read from and are left out. Returns None if the experiment does not declare any namespace.
+    """
+    namespaces = set()
+    for required in spec.sue.required or []:
+        namespaces.add(required.namespace)
+    if spec.loadgen.target is not None:
+        namespaces.add(spec.loadgen.target.namespace)
+    for treatment in spec.treatments or []:
+        for definition in treatment.values():
+            namespace = definition.params.get("namespace")
+            if namespace:
+                namespaces.add(str(namespace))
+    return frozenset(namespaces) or None
+
+
+def namespaces_overlap(first: Optional[FrozenSet[str]], second: Optional[FrozenSet[str]]) -> bool:
+    """Unknown namespaces overlap with everything"""
+    return first is None or second is None or bool(first & second)
+
+
+class NamespaceLock:
+    """
+    Exclusive fcntl locks on the namespaces of an experiment.
+
+    The locks are files in lock_dir, so they also keep apart experiments run by other backend
+    processes. Every holder takes a shared lock on the cluster lock file, a holder without
+    namespaces takes it exclusively and therefore waits for all other experiments.
+    """
+
+    def __init__(self, lock_dir: Path, namespaces: Optional[FrozenSet[str]]):
+        self.lock_dir = Path(lock_dir)
+        self.namespaces = namespaces
+        self._fds: List = []
+
+    def _try_lock(self, name: str, mode: int) -> bool:
+        fd = open(self.lock_dir / f"{name}.lock", "w")
+        try:
+            fcntl.flock(fd, mode | fcntl.LOCK_NB)
+        except (IOError, BlockingIOError):
+            fd.close()
+            return False
+        self._fds.append(fd)
+        return True
+
+    def _try_acquire(self) -> bool:
+        exclusive = self.namespaces is None
+        locked = self._try_lock(CLUSTER_LOCK, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        # namespaces are always locked in the same order
+        for namespace in sorted(self.namespaces or []):
+            locked = locked and self._try_lock(namespace, fcntl.LOCK_EX)
+        if not locked:
+            self.release()
+        return locked
+
+    def acquire(self, timeout: float = 0.0) -> bool:
+        """Take all locks, waiting up to timeout seconds for other experiments to release them"""
+        os.makedirs(self.lock_dir, exist_ok=True)
+        deadline = time.monotonic() + timeout
+        while not self._try_acquire():
+            if time.monotonic() + LOCK_POLL_SECONDS > deadline:
+                return False
+            time.sleep(LOCK_POLL_SECONDS)
+        return True
+
+    def release(self):
+        """Release all locks that are held"""
+        for fd in reversed(self._fds):
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            fd.close()
+        self._fds = []
@@ -36,6 +36,7 @@ class Responses(BaseModel):
     step: int
     left_window: str
     right_window: str
+    stream: Optional[bool] = None
 
 
 class Responses1(BaseModel):
@@ -45,11 +46,16 @@ class Responses1(BaseModel):
     left_window: str
     right_window: str
     limit: Optional[int] = None
+    stream: Optional[bool] = None
+    harvest: Optional[bool] = None
+    harvest_slice: Optional[str] = None
+    harvest_workers: Optional[int] = None
 
 
 class Treatments(BaseModel):
     action: str
     params: Dict[str, Any]
+    start_offset: Optional[str] = None
 
 
 class RequiredItem(BaseModel):
@@ -1,11 +1,20 @@
 from abc import ABC, abstractmethod
 from typing import List, Tuple
 
+from backend.internal.clients import ClientRegistry
+
 class Orchestrator(ABC):
     """
     Abstract base class for orchestrators.
     """
 
+    @property
+    def clients(self) -> ClientRegistry:
+        """Addresses and sessions shared by the Prometheus and Jaeger clients of all runs with this orchestrator"""
+        if getattr(self, "_clients", None) is None:
+            self._clients = ClientRegistry()
+        return self._clients
+
     @abstractmethod
     def orchestrate(self):
         pass
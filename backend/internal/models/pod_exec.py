@@ -0,0 +1,82 @@
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from enum import Enum
+from typing import List, Optional
+
+
+class PodExecStatus(Enum):
+    SUCCEEDED = "SUCCEEDED"
+    PARTIAL = "PARTIAL"
+    FAILED = "FAILED"
+
+
+@dataclass
+class PodExecResult:
+    """Result of a command executed in a single pod"""
+    pod: str
+    namespace: str
+    container: str
+    started_at: datetime
+    completed_at: datetime
+    exit_code: Optional[int] = None
+    output: str = ""
+    error: Optional[str] = None
+    """Set if the command could not be executed or did not complete within the timeout"""
+
+    @property
+    def succeeded(self) -> bool:
+        return self.error is None and self.exit_code == 0
+
+    @property
+    def seconds(self) -> float:
+        return (self.completed_at - self.started_at).total_seconds()
+
+
+@dataclass
+class PodExecReport:
+    """Results of a command executed in all pods matching a label"""
+    command: List[str]
+    results: List[PodExecResult] = field(default_factory=list)
+
+    @property
+    def status(self) -> PodExecStatus:
+        succeeded = sum(result.succeeded for result in self.results)
+        if succeeded == len(self.results):
+            return PodExecStatus.SUCCEEDED
+        return PodExecStatus.PARTIAL if succeeded else PodExecStatus.FAILED
+
+    @property
+    def errors(self) -> List[PodExecResult]:
+        return [result for result in self.results if result.error is not None]
+
+    @property
+    def exit_code(self) -> int:
+        """0 if the command succeeded in every pod, else the exit code of the first pod it failed in"""
+        for result in self.results:
+            if result.exit_code:
+                return result.exit_code
+        return 0
+
+    @property
+    def onset_spread(self) -> float:
+        """Seconds between the first and the last pod the command was started in"""
+        if not self.results:
+            return 0.0
+        started = [result.started_at for result in self.results]
+        return (max(started) - min(started)).total_seconds()
+
+    def to_dict(self) -> dict:
+        """Convert the report to a dictionary with ISO formatted timestamps"""
+        results = []
+        for result in self.results:
+            entry = asdict(result)
+            entry["started_at"] = result.started_at.isoformat()
+            entry["completed_at"] = result.completed_at.isoformat()
+            results.append(entry)
+        return {
+            "command": self.command,
+            "status": self.status.value,
+            "exit_code": self.exit_code,
+            "onset_spread": self.onset_spread,
+            "results": results,
+        }
@@ -4,9 +4,12 @@ Functionality: Provides an abstract base class ResponseVariable with methods to
 Connection: Used as a base class for specific response implementations in responses.py.
 
  """
+import contextlib
 import datetime
+import time
 import uuid
 import abc
+from typing import Dict
 
 import pandas as pd
 
@@ -31,12 +34,23 @@ class ResponseVariable(abc.ABC):
         """End of the observation period"""
         self.data = None
         """Observed data stored as a dataframe"""
+        self.timings: Dict[str, float] = {}
+        """Seconds spent per observation stage, e.g. fetch and parse"""
 
     @property
     @abc.abstractmethod
     def short_id(self) -> str:
         pass
 
+    @contextlib.contextmanager
+    def timed(self, stage: str):
+        """Add the time spent in the managed block to the timing of an observation stage"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[stage] = self.timings.get(stage, 0.0) + time.perf_counter() - started
+
     @property
     def response_type(self) -> str:
         return self.__class__.__name__
@@ -5,8 +5,9 @@ Connection: Used as a base class for specific treatment implementations in treat
  """
 
 import abc
-from typing import List
+from typing import List, Optional
 import logging
+import threading
 import uuid
 
 from backend.internal.errors import OxnException
@@ -34,6 +35,12 @@ class Treatment(abc.ABC):
         """A unix float timestamp in utc indicating when the treatment instance has finished execution"""
         self.messages = []
         """A list of strings to provide helpful messages to the user in case of any errors"""
+        self.rollouts: List[dict] = []
+        """Measured rollouts of the deployments the treatment changed, see rollout.Rollout"""
+        self.start_offset: Optional[float] = None
+        """Seconds after the start of the runtime treatments to inject at, None to inject after the previous treatment"""
+        self.cancelled: threading.Event = threading.Event()
+        """Set to abort the treatment, shared by all treatments of a schedule"""
         validates = self._validate_params()
         """Validate the parameters the treatment instance was provided with"""
 
@@ -76,6 +83,17 @@ class Treatment(abc.ABC):
         """Provide a human-readable version of the end timestamp"""
         return humanize_utc_timestamp(self.end)
 
+    def wait(self, seconds: float) -> bool:
+        """
+        Wait while the treatment is in effect, returning early if the treatment was cancelled
+
+        :return: True if the full time passed, False if the treatment was cancelled
+        """
+        if self.cancelled.wait(seconds):
+            logger.info(f"Treatment {self.name} was cancelled")
+            return False
+        return True
+
     @property
     @abc.abstractmethod
     def action(self):
@@ -5,6 +5,9 @@ Connection: Works with responses.py to monitor and collect experiment results.
 
 Module to handle data capture during experiment execution"""
 import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Optional
 from operator import attrgetter
 
@@ -19,6 +22,9 @@ from backend.internal.utils import time_string_to_seconds
 
 logger = logging.getLogger(__name__)
 
+OBSERVE_WORKERS = int(os.getenv("OXN_OBSERVE_WORKERS", "8"))
+"""Default number of response variables that are observed concurrently"""
+
 
 class Observer:
     """
@@ -26,12 +32,16 @@ class Observer:
     an experiment description and then observing the variables during or after an experiment.
     """
 
-    def __init__(self, config: Experiment, orchestrator):
+    def __init__(self, config: Experiment, orchestrator, max_workers: int = OBSERVE_WORKERS):
         self.config = config
         self.orchestrator = orchestrator
+        self.max_workers = max(1, max_workers)
+        """Number of response variables that are observed concurrently"""
         self.experiment_start: Optional[float] = None
         self.experiment_end: Optional[float] = None
         self._response_variables: Dict[str, ResponseVariable] = {}
+        self.observations: Dict[str, dict] = {}
+        """Per-variable observation results with stage timings, populated by observe"""
 
     def initialize_variables(self) -> None:
         """Initialize response variables from the experiment specification"""
@@ -109,9 +119,35 @@ class Observer:
             for _, v in self.variables().items()
             if isinstance(v, TraceResponseVariable)
         ]
+
+    def _observe_variable(self, variable: ResponseVariable) -> dict:
+        """Observe a single response variable. Errors are recorded instead of raised"""
+        error = ""
+        started = time.perf_counter()
+        # data and timings of an earlier run of the experiment must not be reported for this one
+        variable.data = None
+        variable.timings = {}
+        try:
+            variable.observe()
+        except Exception as e:
+            logger.info(f"failed to capture {variable.name}, proceeding. {e}")
+            error = str(e)
+        return {
+            "fetch_seconds": round(variable.timings.get("fetch", 0.0), 3),
+            "parse_seconds": round(variable.timings.get("parse", 0.0), 3),
+            "total_seconds": round(time.perf_counter() - started, 3),
+            "rows": 0 if variable.data is None else len(variable.data),
+            "error": error,
+        }
+
     def observe(self) -> None:
-        for variable in self.variables().values():
-            try:
-                variable.observe()
-            except Exception as e:
-                logger.info(f"failed to capture {variable.name}, proceeding. {e}")
+        """Observe all response variables concurrently on a thread pool"""
+        variables = list(self.variables().values())
+        if not variables:
+            return
+        workers = min(self.max_workers, len(variables))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="observer") as executor:
+            observations = executor.map(self._observe_variable, variables)
+            for variable, observation in zip(variables, observations):
+                self.observations[variable.name] = observation
+        logger.info(f"Observed {len(variables)} response variables with {workers} workers")
@@ -4,39 +4,127 @@ Functionality: Provides methods to query metrics and labels from Prometheus.
 Connection: Used by responses.py and validation.py to gather metrics and validate configurations.
 
 Wrapper around the Prometheus HTTP API"""
+import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from math import e
+from typing import Iterator, List, Optional, Tuple
+
 import requests
-from requests.adapters import Retry, HTTPAdapter
+import urllib3
 from datetime import datetime
 from backend.internal.kubernetes_orchestrator import KubernetesOrchestrator
 
 from backend.internal.models.orchestrator import Orchestrator
 
 from backend.internal.errors import PrometheusException
+from backend.internal.query_cache import QUERY_CACHE, QueryCache
+from backend.internal.utils import time_string_to_seconds, validate_time_string
+
+try:
+    import ijson
+except ImportError:  # optional dependency, only required for streaming responses
+    ijson = None
 
 logger = logging.getLogger(__name__)
 
 
 # NOTE: prometheus wire timestamps are in milliseconds since unix epoch utc-aware
 
+MAX_POINTS_PER_SERIES = 11_000
+"""Prometheus rejects range queries that would return more points per series"""
+RANGE_QUERY_WORKERS = 4
+"""Number of chunks of a split range query that are fetched concurrently"""
+
+
+def step_to_seconds(step) -> Optional[float]:
+    """Return a range query step in seconds, or None if it cannot be interpreted"""
+    if step is None:
+        return None
+    if isinstance(step, (int, float)):
+        return float(step)
+    try:
+        return float(step)
+    except (TypeError, ValueError):
+        pass
+    if isinstance(step, str) and validate_time_string(step):
+        return time_string_to_seconds(step)
+    return None
+
+
+def split_range(start, end, step, max_points: int = MAX_POINTS_PER_SERIES) -> List[Tuple]:
+    """
+    Split a range query window into consecutive windows of at most max_points evaluation steps each
+
+    Chunks start on the evaluation grid of the original query and do not overlap, so the
+    stitched result contains the same evaluation timestamps as an unsplit query.
+    Windows that cannot be interpreted numerically are returned unsplit.
+    """
+    step_seconds = step_to_seconds(step)
+    if not step_seconds or not isinstance(start, (int, float)) or not isinstance(end, (int, float)):
+        return [(start, end)]
+    points = int((end - start) // step_seconds) + 1
+    if points <= max_points:
+        return [(start, end)]
+    windows = []
+    for first_point in range(0, points, max_points):
+        last_point = min(first_point + max_points, points) - 1
+        windows.append((start + first_point * step_seconds, min(start + last_point * step_seconds, end)))
+    return windows
+
+
+def window_end_seconds(end) -> Optional[float]:
+    """Return the end of a query window as a unix timestamp in seconds, or None if it cannot be interpreted"""
+    if isinstance(end, datetime):
+        return end.timestamp()
+    try:
+        return float(end)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return datetime.fromisoformat(end).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def stitch_range_queries(responses: List[dict]) -> dict:
+    """Merge the responses of consecutive range query windows series by series"""
+    merged = {}
+    warnings = []
+    for response in responses:
+        warnings.extend(response.get("warnings") or [])
+        for series in response["data"]["result"]:
+            key = frozenset(series["metric"].items())
+            if key not in merged:
+                merged[key] = {"metric": series["metric"], "values": []}
+            values = merged[key]["values"]
+            for sample in series["values"]:
+                # windows do not overlap, but never emit a boundary sample twice
+                if not values or sample[0] > values[-1][0]:
+                    values.append(sample)
+    stitched = {"status": "success", "data": {"resultType": "matrix", "result": list(merged.values())}}
+    if warnings:
+        stitched["warnings"] = warnings
+    return stitched
+
 
 class Prometheus:
-    def __init__(self, orchestrator: Orchestrator, target: str = "sue"):
+    def __init__(self, orchestrator: Orchestrator, target: str = "sue", cache: Optional[QueryCache] = None):
         assert orchestrator is not None
         self.orchestrator = orchestrator
-        self.session = requests.Session()
-        retries = Retry(
-            total=5, backoff_factor=0.1, status_forcelist=[500, 502, 503, 504]
-        )
-        self.session.mount("http://", HTTPAdapter(max_retries=retries))
-        address = None
+        self.cache = cache or QUERY_CACHE
+        """Cache for range queries over closed windows"""
+        self.clients = orchestrator.clients
+        self.session = self.clients.session("prometheus")
+        """Session shared by all Prometheus clients of the orchestrator, retries on server errors"""
         if isinstance(orchestrator, KubernetesOrchestrator):
-            address = orchestrator.get_prometheus_address(target)
-            logger.debug("Initialised Prometheus client with address: %s", address)
+            self.address_key = ("prometheus", target)
+            self._resolve_address = lambda: orchestrator.get_prometheus_address(target)
         else:
-            address = orchestrator.get_prometheus_address()
-        self.base_url = f"http://{address}:9090/api/v1/"
+            self.address_key = ("prometheus", None)
+            self._resolve_address = orchestrator.get_prometheus_address
+        self.base_url = self._base_url()
+        logger.debug("Initialised Prometheus client with base url: %s", self.base_url)
         self.endpoints = {
             "range_query": "query_range",
             "instant_query": "query",
@@ -50,6 +138,28 @@ class Prometheus:
             "flags": "status/flags",
         }
 
+    def _base_url(self) -> str:
+        address = self.clients.address(self.address_key, self._resolve_address)
+        return f"http://{address}:9090/api/v1/"
+
+    def _request(self, url: str, **kwargs) -> requests.Response:
+        """
+        Send a GET request to Prometheus
+
+        If Prometheus cannot be reached its cached address is dropped, since the pod may have moved,
+        and the request is sent once more if the address now resolves to a different one.
+        """
+        try:
+            return self.session.get(url, **kwargs)
+        except requests.ConnectionError:
+            base_url = self.base_url
+            self.clients.invalidate(self.address_key)
+            self.base_url = self._base_url()
+            if self.base_url == base_url or not url.startswith(base_url):
+                raise
+            logger.info(f"Prometheus moved from {base_url} to {self.base_url}, sending the request again")
+            return self.session.get(self.base_url + url[len(base_url):], **kwargs)
+
     @staticmethod
     def build_query(metric_name, label_dict=None):
         """Build a query in the Prometheus Query Language format"""
@@ -82,7 +192,7 @@ class Prometheus:
             )
         url = self.base_url + target_metadata
         try:
-            response = self.session.get(url=url, params=params)
+            response = self._request(url=url, params=params)
             response.raise_for_status()
             return response.json()
         except (requests.ConnectionError, requests.HTTPError) as requests_exception:
@@ -101,7 +211,7 @@ class Prometheus:
             )
         url = self.base_url + target
         try:
-            response = self.session.get(url=url)
+            response = self._request(url=url)
             response.raise_for_status()
             return response.json()
         except (requests.ConnectionError, requests.HTTPError) as requests_exception:
@@ -125,7 +235,7 @@ class Prometheus:
             )
         url = self.base_url + labels
         try:
-            response = self.session.get(
+            response = self._request(
                 url, params=params
             )
             response.raise_for_status()
@@ -145,7 +255,7 @@ class Prometheus:
             )
         url = self.base_url + metrics
         try:
-            response = self.session.get(url=url)
+            response = self._request(url=url)
             response.raise_for_status()
             return response.json()
         except (requests.ConnectionError, requests.HTTPError) as requests_exception:
@@ -170,7 +280,7 @@ class Prometheus:
             "match": match,
         }
         try:
-            response = self.session.get(url, params=params)
+            response = self._request(url, params=params)
             response.raise_for_status()
             return response.json()
         except (requests.ConnectionError, requests.HTTPError) as requests_exception:
@@ -192,7 +302,7 @@ class Prometheus:
             "limit": limit,
         }
         try:
-            response = self.session.get(url=url, params=params)
+            response = self._request(url=url, params=params)
             response.raise_for_status()
             return response.json()
         except (requests.ConnectionError, requests.HTTPError) as requests_exception:
@@ -210,7 +320,7 @@ class Prometheus:
             )
         url = self.base_url + config
         try:
-            response = self.session.get(url=url)
+            response = self._request(url=url)
             response.raise_for_status()
             return response.json()
         except (requests.ConnectionError, requests.HTTPError) as requests_exception:
@@ -228,7 +338,7 @@ class Prometheus:
             )
         url = self.base_url + flags
         try:
-            response = self.session.get(url=url)
+            response = self._request(url=url)
             response.raise_for_status()
             return response.json()
         except (requests.ConnectionError, requests.HTTPError) as requests_exception:
@@ -252,7 +362,7 @@ class Prometheus:
             "timeout": timeout,
         }
         try:
-            response = self.session.get(url=url, params=params)
+            response = self._request(url=url, params=params)
             response.raise_for_status()
             return response.json()
         except (requests.ConnectionError, requests.HTTPError) as requests_exception:
@@ -261,8 +371,14 @@ class Prometheus:
                 explanation=f"{requests_exception}",
             )
 
-    def range_query(self, query, start, end, step=None, timeout=None):
-        """Evaluate a Prometheus query over a time range"""
+    def _get(self, url: str, params: dict) -> bytes:
+        """Perform a GET request and return the body of a successful response"""
+        response = self._request(url=url, params=params)
+        response.raise_for_status()
+        return response.content
+
+    def _range_query_window(self, query, start, end, step=None, timeout=None):
+        """Evaluate a Prometheus query over a time range with a single request"""
         range_query = self.endpoints.get("range_query")
         if range_query is None:
             raise PrometheusException(
@@ -278,14 +394,79 @@ class Prometheus:
             "timeout": timeout,
         }
         try:
-            response = self.session.get(url=url, params=params)
-            response.raise_for_status()
-            return response.json()
+            return json.loads(self.cache.fetch(url, params, window_end_seconds(end), lambda: self._get(url, params)))
         except (requests.ConnectionError, requests.HTTPError) as requests_exception:
             raise PrometheusException(
                 message=f"Error while talking to Prometheus at {url}",
                 explanation=f"{requests_exception}",
             )
+
+    def range_query(self, query, start, end, step=None, timeout=None):
+        """
+        Evaluate a Prometheus query over a time range
+
+        Windows with more than MAX_POINTS_PER_SERIES evaluation steps are split into chunks
+        that are fetched concurrently and stitched back into a single matrix response.
+        Chunks that ended before now are served from the query cache.
+        """
+        windows = split_range(start, end, step)
+        if len(windows) == 1:
+            return self._range_query_window(query, start, end, step, timeout)
+        logger.debug(f"Splitting range query {query} into {len(windows)} chunks")
+        with ThreadPoolExecutor(max_workers=min(RANGE_QUERY_WORKERS, len(windows))) as executor:
+            responses = list(
+                executor.map(
+                    lambda window: self._range_query_window(query, window[0], window[1], step, timeout),
+                    windows,
+                )
+            )
+        return stitch_range_queries(responses)
+
+    def stream_range_query(self, query, start, end, step=None, timeout=None) -> Iterator[dict]:
+        """
+        Evaluate a Prometheus query over a time range and parse the response incrementally
+
+        The response body is read in chunks and parsed with ijson, so only a single series
+        is held as Python objects at a time. Yields the series of the result matrix.
+        Long windows are split like in range_query and fetched one after another, in which case
+        a series is yielded once per chunk.
+        """
+        if ijson is None:
+            raise PrometheusException(
+                message="Cannot stream Prometheus responses",
+                explanation="Streaming requires the optional ijson dependency (backend[stream])",
+            )
+        range_query = self.endpoints.get("range_query")
+        if range_query is None:
+            raise PrometheusException(
+                message="Error while getting endpoint for range_query",
+                explanation="No target range_query endpoint returned",
+            )
+        url = self.base_url + range_query
+        try:
+            for window_start, window_end in split_range(start, end, step):
+                params = {
+                    "query": query,
+                    "start": window_start,
+                    "end": window_end,
+                    "step": step,
+                    "timeout": timeout,
+                }
+                with self._request(url=url, params=params, stream=True) as response:
+                    response.raise_for_status()
+                    response.raw.decode_content = True
+                    yield from ijson.items(response.raw, "data.result.item", use_float=True)
+        except (requests.ConnectionError, requests.HTTPError, urllib3.exceptions.HTTPError) as requests_exception:
+            raise PrometheusException(
+                message=f"Error while talking to Prometheus at {url}",
+                explanation=f"{requests_exception}",
+            )
+        except ijson.JSONError as json_error:
+            raise PrometheusException(
+                message=f"Received invalid JSON from Prometheus at {url}",
+                explanation=f"{json_error}",
+            )
+
     def get_alerts(self, start_time: datetime, end_time: datetime, step: str = '15s') -> dict:
         """Query ALERTS from Prometheus for a given time range"""
         params = {
@@ -304,10 +485,8 @@ class Prometheus:
         
         url = self.base_url + range_query
         try:
-            response = self.session.get(url=url, params=params)
-            response.raise_for_status()
-            #logger.info(f"Got Alerts From Prometheus: {response.json()}")
-            return response.json()
+            # fault detection analysis queries the same closed window repeatedly
+            return json.loads(self.cache.fetch(url, params, end_time.timestamp(), lambda: self._get(url, params)))
         except (requests.ConnectionError, requests.HTTPError) as requests_exception:
             raise PrometheusException(
                 message=f"Error while querying alerts from Prometheus at {url} with params {params}",
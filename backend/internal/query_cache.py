@@ -0,0 +1,204 @@
+"""
+Purpose: Caches responses of the Prometheus and Jaeger HTTP APIs.
+Functionality: Keeps response bodies in an in-memory LRU and a size bounded directory on disk, keyed by a hash of the request.
+Connection: Used by prometheus.py and jaeger.py for queries over time windows that are already closed.
+
+Content-addressed query result cache"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+QUERY_CACHE_PATH = os.getenv(
+    "OXN_QUERY_CACHE_PATH", os.path.join(os.getenv("OXN_RESULTS_PATH", "/mnt/oxn-data"), "query-cache")
+)
+"""Directory of the on-disk cache"""
+QUERY_CACHE_MEMORY_BYTES = int(os.getenv("OXN_QUERY_CACHE_MEMORY_BYTES", str(128 * 2**20)))
+"""Maximum size of the response bodies kept in memory"""
+QUERY_CACHE_DISK_BYTES = int(os.getenv("OXN_QUERY_CACHE_DISK_BYTES", str(2 * 2**30)))
+"""Maximum size of the response bodies kept on disk"""
+QUERY_CACHE_SETTLE_SECONDS = float(os.getenv("OXN_QUERY_CACHE_SETTLE_SECONDS", "60"))
+"""Windows ending less than this many seconds ago may still receive late samples and spans"""
+
+
+class QueryCache:
+    """
+    Two-level LRU cache of HTTP response bodies.
+
+    Entries are keyed by a sha256 of the request url and parameters and only stored for windows that
+    ended at least settle_seconds ago, as the result of a query over a closed window no longer changes.
+    Recently used entries are kept in memory, all entries are written to disk until max_disk_bytes
+    is reached, after which the least recently used files are removed.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = QUERY_CACHE_PATH,
+        max_memory_bytes: int = QUERY_CACHE_MEMORY_BYTES,
+        max_disk_bytes: int = QUERY_CACHE_DISK_BYTES,
+        settle_seconds: float = QUERY_CACHE_SETTLE_SECONDS,
+    ):
+        self.path = Path(path) if path else None
+        """Directory of the on-disk cache, None to only cache in memory"""
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.settle_seconds = settle_seconds
+        self._lock = threading.Lock()
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: Optional[OrderedDict[str, int]] = None
+        """Sizes of the files on disk in least recently used order, loaded on first use"""
+        self._disk_bytes = 0
+        self.counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "bypassed": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+        }
+        """Hit and miss counters, bypassed counts requests over windows that are still open"""
+
+    @staticmethod
+    def key(url: str, params: dict) -> str:
+        """Return the content address of a request"""
+        request = json.dumps({"url": url, "params": params}, sort_keys=True, default=str)
+        return hashlib.sha256(request.encode()).hexdigest()
+
+    def is_closed(self, window_end: Optional[float]) -> bool:
+        """Check if a window ending at the given unix timestamp in seconds can be cached"""
+        return window_end is not None and window_end <= time.time() - self.settle_seconds
+
+    def fetch(self, url: str, params: dict, window_end: Optional[float], request: Callable[[], bytes]) -> bytes:
+        """
+        Return the cached response body of a request, or perform the request and cache its body
+
+        Requests over windows that are still open are always performed and never cached.
+        Exceptions raised by the request are propagated, so failed requests are not cached either.
+        """
+        if not self.is_closed(window_end):
+            with self._lock:
+                self.counters["bypassed"] += 1
+            return request()
+        key = self.key(url, params)
+        body = self.get(key)
+        if body is not None:
+            return body
+        body = request()
+        self.put(key, body)
+        return body
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Look up a response body in memory and then on disk"""
+        with self._lock:
+            body = self._memory.get(key)
+            if body is not None:
+                self._memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return body
+            body = self._read(key)
+            if body is None:
+                self.counters["misses"] += 1
+                return None
+            self.counters["disk_hits"] += 1
+            self._remember(key, body)
+            return body
+
+    def put(self, key: str, body: bytes):
+        """Store a response body in memory and on disk"""
+        with self._lock:
+            self._remember(key, body)
+            self._write(key, body)
+
+    def stats(self) -> Dict[str, int]:
+        """Return the hit and miss counters and the current size of both cache levels"""
+        with self._lock:
+            disk = self._load_disk()
+            return {
+                **self.counters,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_entries": len(disk),
+                "disk_bytes": self._disk_bytes,
+            }
+
+    def _remember(self, key: str, body: bytes):
+        if len(body) > self.max_memory_bytes or key in self._memory:
+            return
+        self._memory[key] = body
+        self._memory_bytes += len(body)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self.counters["memory_evictions"] += 1
+
+    def _file(self, key: str) -> Path:
+        return self.path / key[:2] / f"{key}.json"
+
+    def _load_disk(self) -> OrderedDict:
+        """Index the files of the on-disk cache by their modification time"""
+        if self._disk is not None:
+            return self._disk
+        self._disk = OrderedDict()
+        if self.path is None or not self.path.is_dir():
+            return self._disk
+        files = []
+        for file in self.path.glob("*/*.json"):
+            try:
+                stat = file.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, file.stem, stat.st_size))
+        for _, key, size in sorted(files):
+            self._disk[key] = size
+            self._disk_bytes += size
+        return self._disk
+
+    def _read(self, key: str) -> Optional[bytes]:
+        if self.path is None or key not in self._load_disk():
+            return None
+        file = self._file(key)
+        try:
+            body = file.read_bytes()
+            # the modification time orders the files by recent use across restarts
+            os.utime(file)
+        except OSError as error:
+            logger.warning(f"Dropping unreadable query cache entry {file}: {error}")
+            self._disk_bytes -= self._disk.pop(key)
+            return None
+        self._disk.move_to_end(key)
+        return body
+
+    def _write(self, key: str, body: bytes):
+        if self.path is None or len(body) > self.max_disk_bytes or key in self._load_disk():
+            return
+        file = self._file(key)
+        temporary = file.with_suffix(f".{threading.get_ident()}.tmp")
+        try:
+            file.parent.mkdir(parents=True, exist_ok=True)
+            temporary.write_bytes(body)
+            os.replace(temporary, file)
+        except OSError as error:
+            logger.warning(f"Could not write query cache entry {file}: {error}")
+            return
+        self._disk[key] = len(body)
+        self._disk_bytes += len(body)
+        while self._disk_bytes > self.max_disk_bytes:
+            evicted, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            self.counters["disk_evictions"] += 1
+            try:
+                self._file(evicted).unlink()
+            except OSError:
+                pass
+
+
+QUERY_CACHE = QueryCache()
+"""Cache shared by all Prometheus and Jaeger clients of the process"""
@@ -224,6 +224,13 @@ class Reporter:
     def get_report_data(self):
         return self.report_data
 
+    def add_observation_data(self, runner: ExperimentRunner) -> dict:
+        """Add per response variable observation timings to the report"""
+        self.report_data["report"]["runs"][runner.short_id]["observations"] = dict(
+            runner.observer.observations
+        )
+        return self.report_data
+
     def add_treatment_data(self, runner: ExperimentRunner, treatment_data: List[TreatmentData]):
         """Add treatment data to the report"""
         self.report_data["report"]["runs"][runner.short_id]["treatments"] = {}
@@ -233,6 +240,9 @@ class Reporter:
             ] = {
                 "start": treatment.start,
                 "end": treatment.end,
+                "rollouts": treatment.rollouts,
+                "planned_start": treatment.planned_start,
+                "planned_end": treatment.planned_end,
             }
 
 
@@ -270,10 +280,18 @@ class AccountingData(TypedDict):
     cpu_seconds: float
     number_of_cpus: int
 
+class ObservationData(TypedDict):
+    fetch_seconds: float        # time spent requesting (and for streamed responses parsing) the data
+    parse_seconds: float        # time spent building the dataframe
+    total_seconds: float
+    rows: int
+    error: str                  # empty if the variable was observed successfully
+
 class RunData(TypedDict):
     interactions: Dict[str, InteractionData]  # Keys are "interaction_0", "interaction_1", etc.
     loadgen: NotRequired[LoadgenData]
     accounting: NotRequired[Dict[str, AccountingData]]
+    observations: NotRequired[Dict[str, ObservationData]]  # Keys are response variable names
 
 class ReportContent(TypedDict):
     runs: Dict[str, RunData]  # Keys are run IDs like "6213b211"
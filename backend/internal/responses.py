@@ -5,6 +5,8 @@ Connection: Used by the Observer to collect and process response variables durin
 
 Implementations of Response Variables"""
 import datetime
+import itertools
+from typing import Iterable, Iterator
 
 import numpy as np
 import pandas as pd
@@ -13,8 +15,9 @@ from backend.internal.models.orchestrator import Orchestrator
 from backend.internal.utils import humanize_utc_timestamp, time_string_to_seconds, to_milliseconds, to_microseconds
 from backend.internal.errors import PrometheusException, JaegerException
 from backend.internal.models.response import ResponseVariable
-from backend.internal.jaeger import Jaeger
+from backend.internal.jaeger import HARVEST_WORKERS, Jaeger
 from backend.internal.prometheus import Prometheus
+from backend.internal.span_table import SpanTable
 import logging
 
 logger = logging.getLogger(__name__)
@@ -51,6 +54,8 @@ class MetricResponseVariable(ResponseVariable):
         """User-supplied prometheus label names and values"""
         self.step = description.get("step", 1)
         """User-supplied prometheus step size"""
+        self.stream = bool(description.get("stream"))
+        """Parse the Prometheus response incrementally instead of loading it at once"""
         self.start = self.experiment_start - time_string_to_seconds(
             description["left_window"]
         )
@@ -131,16 +136,6 @@ class MetricResponseVariable(ResponseVariable):
         dataframe.set_index(pd.to_datetime(dataframe.timestamp, utc=True), inplace=True)
         return dataframe
 
-    @staticmethod
-    def _parse_metric_string(metric_value):
-        try:
-            return int(metric_value)
-        except (TypeError, ValueError):
-            try:
-                return float(metric_value)
-            except (TypeError, ValueError):
-                return metric_value
-
     def _range_query_to_df(self, json_data, metric_column_name):
         """
         Return pandas dataframe from prometheus range query json response
@@ -149,31 +144,68 @@ class MetricResponseVariable(ResponseVariable):
         """
         try:
             results = json_data["data"]["result"]
-            check = results[0]
-            columns = list(check["metric"].keys())
-            columns += ["timestamp", metric_column_name, self.name]
-            rows = []
-            for result in results:
-                for timestamp, value in result["values"]:
-                    parsed_value = self._parse_metric_string(value)
-                    rows.append(
-                        {
-                            **result["metric"],
-                            "timestamp": timestamp,
-                            metric_column_name: parsed_value,
-                            self.name: parsed_value,
-                        }
-                    )
-            dataframe = pd.DataFrame(columns=columns, data=rows)
-            dataframe.set_index(
-                pd.to_datetime(dataframe.timestamp, utc=True, unit="s"), inplace=True
-            )
-            return dataframe
-        except (IndexError, KeyError) as exc:
+        except KeyError as exc:
             raise PrometheusException(
                 message="Cannot create dataframe from empty Prometheus response",
                 explanation=f"{exc}",
             )
+        return self._series_to_df(results, metric_column_name)
+
+    @staticmethod
+    def _sample_values(values: np.ndarray) -> np.ndarray:
+        """
+        Return metric values as integers if every sample is integral, as floats otherwise.
+        Prometheus formats integral floats without a decimal point, so this matches parsing each sample string.
+        """
+        if (
+            len(values)
+            and np.isfinite(values).all()
+            and (np.abs(values) < 2**53).all()
+            and (values == np.floor(values)).all()
+        ):
+            return values.astype(np.int64)
+        return values
+
+    def _series_to_df(self, series, metric_column_name):
+        """
+        Return pandas dataframe from an iterable of prometheus range query series
+
+        The series can be a list from a parsed response or a generator over a streamed response.
+        The samples of each series are converted to float64 arrays in one shot, label values are repeated
+        as categoricals and all series are concatenated once.
+        """
+        label_names = None
+        metrics = []
+        lengths = []
+        timestamps = []
+        values = []
+        for result in series:
+            if label_names is None:
+                label_names = list(result["metric"].keys())
+            series_timestamps, series_values = zip(*result["values"]) if result["values"] else ((), ())
+            metrics.append(result["metric"])
+            lengths.append(len(series_timestamps))
+            timestamps.append(np.array(series_timestamps, dtype=np.float64))
+            values.append(np.array(series_values, dtype=np.float64))
+        if label_names is None:
+            raise PrometheusException(
+                message="Cannot create dataframe from empty Prometheus response",
+                explanation="Prometheus returned no series",
+            )
+        data = {}
+        for label_name in label_names:
+            per_series = pd.Categorical([metric.get(label_name) for metric in metrics])
+            data[label_name] = pd.Categorical.from_codes(
+                np.repeat(per_series.codes, lengths), categories=per_series.categories
+            )
+        data["timestamp"] = np.concatenate(timestamps)
+        data[metric_column_name] = self._sample_values(np.concatenate(values))
+        data[self.name] = data[metric_column_name]
+        dataframe = pd.DataFrame(data)
+        dataframe.set_index(
+            pd.to_datetime(dataframe.timestamp, utc=True, unit="s"), inplace=True
+        )
+        return dataframe
 
     def observe(self):
         try:
@@ -181,15 +213,28 @@ class MetricResponseVariable(ResponseVariable):
                 metric_name=self.metric_name,
                 label_dict=self.labels,
             )
-            prometheus_metrics = self.prometheus.range_query(
-                query=prometheus_query,
-                start=self.start,
-                end=self.end,
-                step=self.step,
-            )
-            self.data = self._range_query_to_df(
-                prometheus_metrics, metric_column_name=self.metric_name
-            )
+            if self.stream:
+                # streamed series are parsed while they are fetched
+                with self.timed("fetch"):
+                    series = self.prometheus.stream_range_query(
+                        query=prometheus_query,
+                        start=self.start,
+                        end=self.end,
+                        step=self.step,
+                    )
+                    self.data = self._series_to_df(series, metric_column_name=self.metric_name)
+                return self.data
+            with self.timed("fetch"):
+                prometheus_metrics = self.prometheus.range_query(
+                    query=prometheus_query,
+                    start=self.start,
+                    end=self.end,
+                    step=self.step,
+                )
+            with self.timed("parse"):
+                self.data = self._range_query_to_df(
+                    prometheus_metrics, metric_column_name=self.metric_name
+                )
             return self.data
         except PrometheusException as e:
             # Initialize with empty DataFrame instead of None
@@ -220,6 +265,14 @@ class TraceResponseVariable(ResponseVariable):
         """Service name to search traces in Jaeger"""
         self.limit = description.get("limit", 100)
         """Limit number of traces when searching with Jaeger"""
+        self.stream = bool(description.get("stream"))
+        """Parse the Jaeger response incrementally instead of loading it at once"""
+        self.harvest = bool(description.get("harvest"))
+        """Search the observation period in concurrent time slices instead of a single request"""
+        self.harvest_slice = description.get("harvest_slice")
+        """Optional time string for the initial duration of a harvesting time slice"""
+        self.harvest_workers = description.get("harvest_workers") or HARVEST_WORKERS
+        """Number of time slices that are searched concurrently when harvesting"""
         self.start = self.experiment_start - time_string_to_seconds(
             description["left_window"]
         )
@@ -321,94 +374,72 @@ class TraceResponseVariable(ResponseVariable):
         utc-aware datetime index based on the start time of spans.
         """
         # TODO: include tag information
-        # TODO: this function is too long. split up into smaller functions
-        # for the difference between parent and follow references confer
-        # https://github.com/opentracing/specification/blob/master/specification.md#references-between-spans
-        # CHILD_OF indicates that the parent span depends on the child span
-        # FOLLOWS_FROM indicates that the parent span does not depend on the child span, but is causally related
-        # distribute these relationships as a separate causality dataframe
-        columns = [
-            "trace_id",
-            "span_id",
-            "operation",
-            "start_time",
-            "end_time",
-            "duration",
-            "service_name",
-            "span_kind",
-            "req_status_code",
-            "ref_type",
-            "ref_type_span_ID",
-            "ref_type_trace_ID"
-        ]
-        dataframes = []
-
-        for trace in trace_json["data"]:
-            spans = trace["spans"]
-            processes = trace["processes"]
-            trace_rows = []
-            for span in spans:
-                trace_id = span["traceID"]
-                span_id = span["spanID"]
-                operation = span["operationName"]
-                start = span["startTime"]
-                duration = span["duration"]
-                end = start + duration
-                process_id = span["processID"]
-                process_dict = processes.get(process_id)
-                service_name = process_dict["serviceName"]
-
-                # adding the span kind : internal / client / service / consumer / producer
-                # adding the status code of rRPC / http request or -1 if spankind == interna
-                req_status_code = "N/A"
-                span_kind = "N/A"
-                if "tags" in span and isinstance(span["tags"], list):
-                    for obj in span["tags"]:
-                        if obj["key"] == "span.kind":
-                            span_kind = obj["value"]
-                        if obj["key"] == "rpc.grpc.status_code":
-                            req_status_code = obj["value"]
-                            # here add http status code option
-                            # since the application talks in gRPC and the Frontend and Frontend Proxy with with HTTP
-                        if obj["key"] == "http.status_code":
-                            req_status_code = obj["value"]
-                ref_type = "N/A"
-                ref_type_spanID = "N/A"
-                ref_type_traceID = "N/A"
-                if span["references"]:
-                    ref_type = span["references"][0]["refType"]
-                    ref_type_spanID = span["references"][0]["spanID"]
-                    ref_type_traceID = span["references"][0]["traceID"]
-                # adding the reftype per span "CHILD_of" / "follows_from"
-                # adding the spankind span ID and the spankind trace
-                row = [trace_id, span_id, operation, start, end, duration, service_name, span_kind, req_status_code, ref_type, ref_type_spanID, ref_type_traceID]
-                trace_rows.append(row)
-            dataframe = pd.DataFrame(trace_rows, columns=columns)
-            dataframe["duration"] = pd.to_numeric(dataframe["duration"])
-            dataframe.reset_index(inplace=True)
-            dataframe.set_index(
-                pd.to_datetime(dataframe.start_time, utc=True, unit="us"), inplace=True
+        # TODO: distribute CHILD_OF / FOLLOWS_FROM relationships as a separate causality dataframe
+        traces = trace_json.get("data") or []
+        if not traces:
+            raise JaegerException(
+                message="Cannot tabulate traces",
+                explanation="Jaeger sent an empty response",
             )
-            dataframes.append(dataframe)
-        try:
-            merged = pd.concat(dataframes)
-        except ValueError:
+        return SpanTable.from_traces(traces).to_dataframe()
+
+    def _harvest(self) -> Iterator[dict]:
+        """Harvest all traces of the observation period slice by slice"""
+        slice_duration = None
+        if self.harvest_slice:
+            slice_duration = int(to_microseconds(time_string_to_seconds(self.harvest_slice)))
+        batches = self.jaeger.harvest_traces(
+            service_name=self.service_name,
+            start=self._jaeger_start_timestamp,
+            end=self._jaeger_end_timestamp,
+            limit=self.limit or 100,
+            slice_duration=slice_duration,
+            max_workers=self.harvest_workers,
+        )
+        return itertools.chain.from_iterable(batches)
+
+    def _stream(self) -> Iterator[dict]:
+        """Stream the traces of the observation period from Jaeger"""
+        return self.jaeger.stream_traces(
+            service_name=self.service_name,
+            start=self._jaeger_start_timestamp,
+            end=self._jaeger_end_timestamp,
+            limit=self.limit,
+        )
+
+    def _tabulate_incrementally(self, traces: Iterable[dict]) -> pd.DataFrame:
+        """
+        Feed traces into a span table while they arrive.
+        Parsing happens while fetching, so the parse stage only covers building the dataframe.
+        """
+        table = SpanTable()
+        with self.timed("fetch"):
+            table.add_traces(traces)
+        if len(table) == 0:
             raise JaegerException(
-                message="Cannot concatenate dataframes",
+                message="Cannot tabulate traces",
                 explanation="Jaeger sent an empty response",
             )
-        return merged
+        with self.timed("parse"):
+            return table.to_dataframe()
 
     def observe(self) -> pd.DataFrame:
         """Observe the data service represented by this response variable"""
         try:
-            traces = self.jaeger.search_traces(
-                service_name=self.service_name,
-                start=self._jaeger_start_timestamp,
-                end=self._jaeger_end_timestamp,
-                limit=self.limit,
-            )
-            trace_df = self._tabulate(trace_json=traces)
+            if self.harvest:
+                trace_df = self._tabulate_incrementally(self._harvest())
+            elif self.stream:
+                trace_df = self._tabulate_incrementally(self._stream())
+            else:
+                with self.timed("fetch"):
+                    traces = self.jaeger.search_traces(
+                        service_name=self.service_name,
+                        start=self._jaeger_start_timestamp,
+                        end=self._jaeger_end_timestamp,
+                        limit=self.limit,
+                    )
+                with self.timed("parse"):
+                    trace_df = self._tabulate(trace_json=traces)
             self.data = trace_df
             return trace_df
         except JaegerException as e:
@@ -0,0 +1,120 @@
+"""
+Purpose: Waits for changes to deployments and their pods to take effect.
+Functionality: Watches deployments and pods through the Kubernetes watch API and returns as soon as a rollout completed or its deadline passed.
+Connection: Used by kubernetes_orchestrator.py after it patched, scaled or restarted a deployment, the measured rollouts end up in the treatment records.
+
+Watch-based rollout waiting"""
+import logging
+import os
+import time
+from dataclasses import dataclass, asdict
+from typing import Callable, Dict
+
+from kubernetes import watch
+from kubernetes.client.exceptions import ApiException
+from kubernetes.client.models.v1_deployment import V1Deployment
+from kubernetes.client.models.v1_pod import V1Pod
+
+logger = logging.getLogger(__name__)
+
+ROLLOUT_TIMEOUT = float(os.getenv("OXN_ROLLOUT_TIMEOUT", "300"))
+"""Seconds to wait for a deployment to roll out before the treatment continues without it"""
+
+
+@dataclass
+class Rollout:
+    """A measured rollout of a deployment or of a set of pods"""
+    name: str
+    """Name of the deployment, or label selector of the pods"""
+    namespace: str
+    reason: str
+    """What was rolled out, e.g. restart or scale"""
+    started: float
+    """Unix timestamp of the change that started the rollout"""
+    seconds: float
+    """Seconds until the rollout completed or the deadline passed"""
+    completed: bool
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def deployment_rolled_out(deployment: V1Deployment) -> bool:
+    """
+    True once the controller observed the latest spec of the deployment and all of its replicas
+    are updated and ready, with no pods of an older revision left
+    """
+    status = deployment.status
+    if status is None:
+        return False
+    replicas = deployment.spec.replicas if deployment.spec.replicas is not None else 1
+    return (
+        (status.observed_generation or 0) >= (deployment.metadata.generation or 0)
+        and (status.updated_replicas or 0) == replicas
+        and (status.replicas or 0) == replicas
+        and (status.ready_replicas or 0) == replicas
+    )
+
+
+def pod_ready(pod: V1Pod) -> bool:
+    """True if the pod is not being deleted and its Ready condition is true"""
+    if pod.metadata.deletion_timestamp is not None or pod.status is None:
+        return False
+    return any(condition.type == "Ready" and condition.status == "True" for condition in pod.status.conditions or [])
+
+
+def watch_until(list_function: Callable, predicate: Callable[[Dict[str, object]], bool], timeout: float, **kwargs) -> bool:
+    """
+    List resources and watch them until predicate is true for the resources by uid or timeout seconds passed
+
+    The watch is restarted with a new list whenever it ends or its resource version expired.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        result = list_function(**kwargs)
+        items = {item.metadata.uid: item for item in result.items}
+        if predicate(items):
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        events = watch.Watch()
+        try:
+            for event in events.stream(
+                list_function, resource_version=result.metadata.resource_version, timeout_seconds=max(1, int(remaining)), **kwargs
+            ):
+                item = event["object"]
+                if event["type"] == "DELETED":
+                    items.pop(item.metadata.uid, None)
+                elif event["type"] in ("ADDED", "MODIFIED"):
+                    items[item.metadata.uid] = item
+                if predicate(items):
+                    events.stop()
+                    return True
+                if time.monotonic() >= deadline:
+                    events.stop()
+                    return False
+        except ApiException as e:
+            if e.status != 410:
+                raise
+            logger.debug(f"Watch expired, listing again: {e.reason}")
+        if time.monotonic() >= deadline:
+            return False
+
+
+def timed(name: str, namespace: str, reason: str, started: float, wait: Callable[[], bool]) -> Rollout:
+    """Run a wait and record how long the rollout took since started"""
+    completed = wait()
+    rollout = Rollout(
+        name=name,
+        namespace=namespace,
+        reason=reason,
+        started=started,
+        seconds=round(time.time() - started, 3),
+        completed=completed,
+    )
+    if completed:
+        logger.info(f"{rollout.name} in namespace {namespace} rolled out after {reason} in {rollout.seconds}s")
+    else:
+        logger.warning(f"{rollout.name} in namespace {namespace} did not roll out after {reason} within {rollout.seconds}s")
+    return rollout
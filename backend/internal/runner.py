@@ -6,12 +6,13 @@ Connection: Core component that uses treatments and observer to perform an exper
 Experiment runner"""
 import logging
 import random
+import threading
 import time
 import uuid
 import hashlib
 import datetime
-from typing import List
-from dataclasses import dataclass
+from typing import List, Optional
+from dataclasses import dataclass, field
 import psutil
 
 import docker
@@ -40,7 +41,8 @@ from backend.internal.treatments import (
     ProbabilisticSamplingTreatment,
     KubernetesProbabilisticHeadSamplingTreatment
 )
-from backend.internal.utils import utc_timestamp, humanize_utc_timestamp
+from backend.internal.utils import utc_timestamp, humanize_utc_timestamp, time_string_to_seconds, validate_time_string
+from backend.internal.scheduler import TreatmentScheduler
 from backend.internal.observer import Observer
 from backend.internal.pricing import Accountant
 from backend.internal.models.treatment import Treatment
@@ -52,6 +54,11 @@ class TreatmentData:
     name: str
     start: datetime.datetime | None
     end: datetime.datetime | None
+    rollouts: List[dict] = field(default_factory=list)
+    """Measured rollouts of the deployments the treatment changed"""
+    planned_start: datetime.datetime | None = None
+    planned_end: datetime.datetime | None = None
+    """Times the schedule planned for a runtime treatment, start and end hold the actual times"""
 
 
 class ExperimentRunner:
@@ -98,6 +105,7 @@ class ExperimentRunner:
             additional_treatments=None,
             random_treatment_order=False,
             accountant_names=None,
+            cancelled: Optional[threading.Event] = None,
     ):
         self.orchestrator = orchestrator
         self.config = config
@@ -115,6 +123,8 @@ class ExperimentRunner:
         """Experiment end as UTC unix timestamp in seconds"""
         self.random_treatment_order = random_treatment_order
         """If the treatments should be executed in random order"""
+        self.cancelled = cancelled if cancelled is not None else threading.Event()
+        """Set to abort the run, interrupts the wait before and the schedule of the runtime treatments"""
         self.additional_treatments = (
             additional_treatments if additional_treatments else []
         )
@@ -179,6 +189,13 @@ class ExperimentRunner:
                 self.treatments[treatment_name] = self._build_treatment(
                     action=action, params=params, name=treatment_name, orchestrator=self.orchestrator
                 )
+                if treatment.start_offset is not None:
+                    if not validate_time_string(treatment.start_offset):
+                        raise OxnException(
+                            message=f"Error while building treatment {treatment_name}",
+                            explanation=f"Start offset {treatment.start_offset} is not a time string with units, e.g. 30s",
+                        )
+                    self.treatments[treatment_name].start_offset = time_string_to_seconds(treatment.start_offset)
                 self.typed_treatments.append(TreatmentData(name=treatment_name, start=None, end=None))
                 logger.debug("Successfully built treatment %s", self.treatments[treatment_name])
         logger.info(f"Built {len(self.treatments)} treatments: {self.treatments.keys()}")
@@ -225,10 +242,11 @@ class ExperimentRunner:
         logger.info("Cleaning compile time treatments")
         for treatment in self._get_compile_time_treatments():
             treatment.end = datetime.datetime.now(datetime.timezone.utc)
+            treatment.clean()
             for i, v in enumerate(self.typed_treatments):
                 if v.name == treatment.name:
                     self.typed_treatments[i].end = treatment.end
-            treatment.clean()
+                    self.typed_treatments[i].rollouts = list(treatment.rollouts)
 
     def execute_runtime_treatments(self) -> List[TreatmentData]:
         """
@@ -240,24 +258,36 @@ class ExperimentRunner:
             self.accountant.read_oxn()
         ttw_left = self.observer.time_to_wait_left()
         logger.info(f"Sleeping for {ttw_left} seconds")
-        time.sleep(ttw_left)
+        if self.cancelled.wait(ttw_left):
+            logger.info("Run was cancelled before the runtime treatments")
+            return []
         logger.info(f"Starting runtime treatments")
+        scheduler = TreatmentScheduler(self._get_runtime_treatments(), cancelled=self.cancelled)
+        schedule_start = datetime.datetime.now(datetime.timezone.utc)
         treatment_data = []
-        for treatment in self._get_runtime_treatments():
-            treatment_start = datetime.datetime.now(datetime.timezone.utc)
-            treatment.inject()
-            treatment.clean()
-            treatment_end = datetime.datetime.now(datetime.timezone.utc)
-            treatment_data.append(TreatmentData(name=treatment.name, start=treatment_start, end=treatment_end))
-            self.treatments[treatment.name].start = treatment_start
-            self.treatments[treatment.name].end = treatment_end
+        for scheduled in scheduler.run():
+            treatment = scheduled.treatment
+            data = TreatmentData(
+                name=treatment.name,
+                start=scheduled.start,
+                end=scheduled.end,
+                rollouts=list(treatment.rollouts),
+                planned_start=schedule_start + datetime.timedelta(seconds=scheduled.planned_start),
+                planned_end=schedule_start + datetime.timedelta(seconds=scheduled.planned_end),
+            )
+            treatment_data.append(data)
+            treatment.start = scheduled.start
+            treatment.end = scheduled.end
             for i, v in enumerate(self.typed_treatments):
                 if v.name == treatment.name:
-                    self.typed_treatments[i].start = treatment_start
-                    self.typed_treatments[i].end = treatment_end
+                    self.typed_treatments[i] = data
         logger.info(f"Injected treatments")
         return treatment_data
 
+    def cancel(self) -> None:
+        """Abort the run, running treatments are cleaned and treatments that did not start yet are skipped"""
+        self.cancelled.set()
+
     def observe_response_variables(self) -> None:
         self.observer.initialize_variables()
         ttw_right = self.observer.time_to_wait_right()
@@ -300,6 +330,9 @@ class ExperimentRunner:
 
         # Typed version
         for i, trtmnt in enumerate(self.typed_treatments):
+            if trtmnt.start is None or trtmnt.end is None:
+                logger.info(f"Treatment {trtmnt.name} did not run, not labeling its data")
+                continue
             for response_id, response_variable in self.observer.variables().items():
                 try:
                     response_variable.label(
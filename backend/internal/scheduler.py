@@ -0,0 +1,202 @@
+"""
+Purpose: Schedules the runtime treatments of an experiment run.
+Functionality: Starts treatments at their offsets or after their predecessor, runs treatments that change different targets concurrently and aborts all of them on cancellation.
+Connection: Used by runner.py to execute the runtime treatments, the planned and actual times end up in the treatment records.
+
+Runtime treatment scheduler"""
+import datetime
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, FrozenSet, List, Optional, Tuple
+
+from backend.internal.models.treatment import Treatment
+from backend.internal.utils import time_string_to_seconds
+
+logger = logging.getLogger(__name__)
+
+TREATMENT_WORKERS = int(os.getenv("OXN_TREATMENT_WORKERS", "8"))
+"""Maximum number of runtime treatments that are in effect at the same time"""
+
+SHARED_TARGETS = {
+    "PrometheusIntervalTreatment": ("prometheus-config",),
+    "KubernetesPrometheusIntervalTreatment": ("prometheus-config",),
+    "KubernetesPrometheusRulesTreatment": ("prometheus-config",),
+    "ProbabilisticSamplingTreatment": ("otel-collector-config",),
+    "KubernetesProbabilisticHeadSamplingTreatment": ("otel-collector-config",),
+    "TailSamplingTreatment": ("otel-collector-config",),
+}
+"""Cluster-wide configuration changed by a treatment type, treatments of these types restore a snapshot on clean"""
+
+
+def treatment_targets(treatment: Treatment) -> FrozenSet[Tuple]:
+    """
+    Return the targets a treatment changes, i.e. the pods matched by its label, the service it names
+    or the cluster-wide configuration its type changes
+
+    Treatments without a target, e.g. empty treatments, do not conflict with any other treatment.
+    """
+    config = treatment.config or {}
+    targets = set()
+    if treatment.treatment_type in SHARED_TARGETS:
+        targets.add(SHARED_TARGETS[treatment.treatment_type])
+    if config.get("label"):
+        targets.add(("pods", config.get("namespace"), config.get("label_selector"), config.get("label")))
+    if config.get("service_name"):
+        targets.add(("service", config.get("service_name")))
+    return frozenset(targets)
+
+
+def treatment_duration(treatment: Treatment) -> float:
+    """Return the seconds a treatment is planned to be in effect, 0 if the treatment has no duration"""
+    config = treatment.config or {}
+    if config.get("duration_seconds") is not None:
+        return float(config["duration_seconds"])
+    duration = config.get("duration")
+    if isinstance(duration, str):
+        return time_string_to_seconds(duration)
+    if isinstance(duration, (int, float)):
+        return float(duration)
+    return 0.0
+
+
+@dataclass
+class ScheduledTreatment:
+    """A treatment with its place in the schedule and the times it actually ran"""
+    treatment: Treatment
+    planned_start: float
+    """Seconds after the start of the schedule the treatment is planned to start at"""
+    planned_end: float
+    after: Optional["ScheduledTreatment"] = None
+    """Treatment that has to finish first, for treatments without a start offset"""
+    targets: FrozenSet[Tuple] = field(default_factory=frozenset)
+    start: Optional[datetime.datetime] = None
+    end: Optional[datetime.datetime] = None
+    future: Optional[Future] = None
+
+    @property
+    def done(self) -> bool:
+        return self.future is not None and self.future.done()
+
+
+class TreatmentScheduler:
+    """
+    Runs the runtime treatments of one experiment run on a shared clock.
+
+    A treatment with a start offset starts that many seconds after the schedule started, a treatment
+    without one starts as soon as the treatment before it finished, so a specification without offsets
+    runs its treatments one after the other as before. Treatments run concurrently on a thread pool,
+    but a treatment never starts while another treatment that changes one of its targets is in effect.
+    Cancelling the schedule ends the waits of running treatments, cleans them and skips the rest.
+    """
+
+    def __init__(
+            self,
+            treatments: List[Treatment],
+            workers: int = TREATMENT_WORKERS,
+            cancelled: Optional[threading.Event] = None,
+            clock: Callable[[], float] = time.monotonic,
+    ):
+        self.workers = max(1, workers)
+        self.cancelled = cancelled if cancelled is not None else threading.Event()
+        """Shared with the treatments so that cancelling also interrupts their waits"""
+        self.clock = clock
+        self._wake = threading.Event()
+        """Set whenever a treatment finished or the schedule was cancelled"""
+        self.schedule: List[ScheduledTreatment] = []
+        previous = None
+        for treatment in treatments:
+            treatment.cancelled = self.cancelled
+            if treatment.start_offset is not None:
+                planned_start, after = treatment.start_offset, None
+            else:
+                planned_start, after = (previous.planned_end if previous else 0.0), previous
+            scheduled = ScheduledTreatment(
+                treatment=treatment,
+                planned_start=planned_start,
+                planned_end=planned_start + treatment_duration(treatment),
+                after=after,
+                targets=treatment_targets(treatment),
+            )
+            self.schedule.append(scheduled)
+            previous = scheduled
+
+    def cancel(self) -> None:
+        """Abort the schedule, running treatments are cleaned and pending treatments are skipped"""
+        self.cancelled.set()
+        self._wake.set()
+
+    def _ready(self, scheduled: ScheduledTreatment, elapsed: float, running: List[ScheduledTreatment]) -> bool:
+        if scheduled.after is not None:
+            if not scheduled.after.done:
+                return False
+        elif scheduled.planned_start > elapsed:
+            return False
+        return not any(scheduled.targets & other.targets for other in running)
+
+    def _execute(self, scheduled: ScheduledTreatment) -> None:
+        treatment = scheduled.treatment
+        try:
+            treatment.inject()
+        finally:
+            treatment.clean()
+            scheduled.end = datetime.datetime.now(datetime.timezone.utc)
+
+    def run(self) -> List[ScheduledTreatment]:
+        """
+        Run all treatments and return them with their planned and actual times
+
+        If a treatment fails, the remaining treatments are cancelled and the first error is raised
+        once the running treatments were cleaned.
+        """
+        started = self.clock()
+        pending = list(self.schedule)
+        running: List[ScheduledTreatment] = []
+        error = None
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="treatment") as pool:
+            while running or (pending and not self.cancelled.is_set()):
+                for scheduled in [scheduled for scheduled in running if scheduled.done]:
+                    running.remove(scheduled)
+                    exception = scheduled.future.exception()
+                    if exception is not None and error is None:
+                        logger.error(f"Treatment {scheduled.treatment.name} failed, cancelling the remaining treatments")
+                        error = exception
+                        self.cancel()
+                elapsed = self.clock() - started
+                if not self.cancelled.is_set():
+                    for scheduled in list(pending):
+                        if len(running) >= self.workers:
+                            break
+                        if not self._ready(scheduled, elapsed, running):
+                            continue
+                        pending.remove(scheduled)
+                        running.append(scheduled)
+                        scheduled.start = datetime.datetime.now(datetime.timezone.utc)
+                        logger.info(
+                            f"Starting treatment {scheduled.treatment.name} after {elapsed:.1f}s, planned at {scheduled.planned_start:.1f}s"
+                        )
+                        scheduled.future = pool.submit(self._execute, scheduled)
+                        scheduled.future.add_done_callback(lambda _: self._wake.set())
+                if not running and (not pending or self.cancelled.is_set()):
+                    break
+                # sleep until a treatment finished, the schedule was cancelled or the next offset is due
+                due = [
+                    scheduled.planned_start - elapsed for scheduled in pending
+                    if scheduled.after is None and scheduled.planned_start > elapsed
+                ]
+                timeout = min(due) if due and not self.cancelled.is_set() else None
+                if running:
+                    # running treatments wait on the shared event, so they also end once it is set
+                    self._wake.wait(timeout)
+                else:
+                    # nothing finishes while waiting for the next offset, only the shared event can end the wait
+                    self.cancelled.wait(timeout)
+                self._wake.clear()
+        if pending:
+            logger.warning(f"Skipped {len(pending)} cancelled treatments: {[scheduled.treatment.name for scheduled in pending]}")
+        if error is not None:
+            raise error
+        return self.schedule
@@ -0,0 +1,179 @@
+"""
+Purpose: Builds the tabular representation of Jaeger spans.
+Functionality: Flattens Jaeger traces into pre-sized column buffers and assembles a single dataframe from them.
+Connection: Used by TraceResponseVariable in responses.py to tabulate Jaeger search results.
+
+Columnar span table"""
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+
+# for the difference between parent and follow references confer
+# https://github.com/opentracing/specification/blob/master/specification.md#references-between-spans
+# CHILD_OF indicates that the parent span depends on the child span
+# FOLLOWS_FROM indicates that the parent span does not depend on the child span, but is causally related
+
+SPAN_COLUMNS = [
+    "index",
+    "trace_id",
+    "span_id",
+    "operation",
+    "start_time",
+    "end_time",
+    "duration",
+    "service_name",
+    "span_kind",
+    "req_status_code",
+    "ref_type",
+    "ref_type_span_ID",
+    "ref_type_trace_ID",
+]
+"""Columns of a tabulated Jaeger response in output order"""
+
+CATEGORICAL_COLUMNS = ["operation", "service_name", "span_kind"]
+"""Low-cardinality string columns that are stored as pandas categoricals"""
+
+TAG_COLUMNS = {
+    "span.kind": "span_kind",
+    # the application talks gRPC internally, the frontend and the frontend proxy talk HTTP
+    "rpc.grpc.status_code": "req_status_code",
+    "http.status_code": "req_status_code",
+}
+"""Lookup table from Jaeger span tag keys to the column they populate"""
+
+MISSING = "N/A"
+"""Placeholder for span attributes that Jaeger did not report"""
+
+_OBJECT_COLUMNS = [
+    "trace_id",
+    "span_id",
+    "operation",
+    "service_name",
+    "span_kind",
+    "req_status_code",
+    "ref_type",
+    "ref_type_span_ID",
+    "ref_type_trace_ID",
+]
+_INTEGER_COLUMNS = ["index", "start_time", "duration"]
+
+
+def _span_tags(span: dict) -> tuple:
+    """Return the span kind and the request status code of a span"""
+    values = {"span_kind": MISSING, "req_status_code": MISSING}
+    tags = span.get("tags")
+    if isinstance(tags, list):
+        for tag in tags:
+            column = TAG_COLUMNS.get(tag["key"])
+            if column is not None:
+                values[column] = tag["value"]
+    return values["span_kind"], values["req_status_code"]
+
+
+def _span_reference(span: dict) -> tuple:
+    """Return type, span id and trace id of the first reference of a span"""
+    references = span.get("references")
+    if not references:
+        return MISSING, MISSING, MISSING
+    reference = references[0]
+    return reference["refType"], reference["spanID"], reference["traceID"]
+
+
+class SpanTable:
+    """
+    Column buffers for Jaeger spans.
+
+    Traces are flattened into one NumPy array per column, so that a single
+    dataframe can be built once all traces have been added instead of concatenating one
+    dataframe per trace. If the total number of spans is known upfront the buffers
+    are allocated once, otherwise they grow geometrically.
+    """
+
+    def __init__(self, capacity: int = 0):
+        self._size = 0
+        """Number of spans written to the buffers"""
+        self._capacity = 0
+        """Number of spans the buffers can hold without growing"""
+        self._columns: dict[str, np.ndarray] = {}
+        """Column buffers keyed by column name"""
+        for name in _OBJECT_COLUMNS:
+            self._columns[name] = np.empty(0, dtype=object)
+        for name in _INTEGER_COLUMNS:
+            self._columns[name] = np.empty(0, dtype=np.int64)
+        self._reserve(capacity)
+
+    def __len__(self) -> int:
+        return self._size
+
+    @classmethod
+    def from_traces(cls, traces: list) -> "SpanTable":
+        """Build a pre-sized span table from a list of Jaeger traces"""
+        table = cls(capacity=sum(len(trace["spans"]) for trace in traces))
+        table.add_traces(traces)
+        return table
+
+    def _reserve(self, additional: int) -> None:
+        """Make sure the buffers can hold additional spans"""
+        required = self._size + additional
+        if required <= self._capacity:
+            return
+        capacity = max(required, 2 * self._capacity)
+        for name, column in self._columns.items():
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[: self._size] = column[: self._size]
+            self._columns[name] = grown
+        self._capacity = capacity
+
+    def add_traces(self, traces: Iterable[dict]) -> None:
+        """Add several Jaeger traces to the table"""
+        for trace in traces:
+            self.add_trace(trace)
+
+    def add_trace(self, trace: dict) -> None:
+        """Add the spans of a single Jaeger trace to the table"""
+        spans = trace["spans"]
+        count = len(spans)
+        if count == 0:
+            return
+        self._reserve(count)
+        service_names = {
+            process_id: process["serviceName"]
+            for process_id, process in trace["processes"].items()
+        }
+        tags = [_span_tags(span) for span in spans]
+        references = [_span_reference(span) for span in spans]
+
+        window = slice(self._size, self._size + count)
+        columns = self._columns
+        columns["index"][window] = np.arange(count)
+        columns["trace_id"][window] = [span["traceID"] for span in spans]
+        columns["span_id"][window] = [span["spanID"] for span in spans]
+        columns["operation"][window] = [span["operationName"] for span in spans]
+        columns["start_time"][window] = [span["startTime"] for span in spans]
+        columns["duration"][window] = [span["duration"] for span in spans]
+        columns["service_name"][window] = [
+            service_names[span["processID"]] for span in spans
+        ]
+        columns["span_kind"][window] = [kind for kind, _ in tags]
+        columns["req_status_code"][window] = [status for _, status in tags]
+        columns["ref_type"][window] = [reference[0] for reference in references]
+        columns["ref_type_span_ID"][window] = [reference[1] for reference in references]
+        columns["ref_type_trace_ID"][window] = [reference[2] for reference in references]
+        self._size += count
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        Assemble the buffered spans into a dataframe.
+        The dataframe is indexed with a utc-aware datetime index based on the start time of spans.
+        """
+        data = {name: column[: self._size] for name, column in self._columns.items()}
+        data["end_time"] = data["start_time"] + data["duration"]
+        for name in CATEGORICAL_COLUMNS:
+            data[name] = pd.Categorical(data[name])
+        dataframe = pd.DataFrame(data, columns=SPAN_COLUMNS)
+        dataframe.set_index(
+            pd.to_datetime(dataframe.start_time, utc=True, unit="us"), inplace=True
+        )
+        return dataframe
+
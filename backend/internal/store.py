@@ -1,10 +1,24 @@
-from typing import Optional, List, Dict, Union
+from typing import BinaryIO, Optional, List, Dict, Tuple, Union
 from enum import Enum
 
+import pandas as pd
+
+try:
+    import pyarrow
+except ImportError:  # optional dependency, only required for columnar formats
+    pyarrow = None
+
+from backend.internal.store_index import EXPERIMENT_FIELDS, INDEX_FILENAME, StoreIndex
+
 class FileFormat(Enum):
     JSON = "json"
     CSV = "csv"
     YAML = "yaml"
+    PARQUET = "parquet"
+    FEATHER = "feather"
+
+COLUMNAR_FORMATS = (FileFormat.PARQUET, FileFormat.FEATHER)
+"""Formats that store DataFrames with typed columns and require pyarrow"""
 
 class StoreError(Exception):
     """Custom error type for store operations"""
@@ -20,50 +34,176 @@ class DocumentStore:
     Interface for a multi-format document store
     """
 
-    def save(self, key: str, data: Union[Dict, List], format: FileFormat) -> None:
+    def save(self, key: str, data: Union[Dict, List, pd.DataFrame], format: FileFormat) -> None:
         """Save a file with a given key and format"""
         pass
 
-    def load(self, key: str, format: FileFormat) -> Optional[Union[Dict, List]]:
+    def load(self, key: str, format: FileFormat) -> Optional[Union[Dict, List, pd.DataFrame]]:
         """Load a file by its key and format"""
         pass
 
+    def supports(self, format: FileFormat) -> bool:
+        """Check if the store can save files in the given format"""
+        return True
+
     def delete(self, key: str) -> None:
         """Delete a file by its key"""
         pass
 
-    def list_keys(self) -> List[str]:
-        """List all keys in the document store"""
+    def list_keys(self, prefix: str = "") -> List[str]:
+        """List all keys in the document store that start with prefix"""
         return []
 
-    def list_files(self) -> List[str]:
-        """List all files in the document store"""
+    def list_files(self, prefix: str = "") -> List[str]:
+        """List all files in the document store that start with prefix"""
         return []
 
+    def file_info(self, file_name: str) -> Optional[Tuple[int, float]]:
+        """Return the size in bytes and the modification time of a stored file"""
+        pass
+
+    def open_file(self, file_name: str) -> BinaryIO:
+        """Open a stored file to read its raw bytes"""
+        pass
+
+    def list_experiments(self, status: Optional[str] = None, limit: Optional[int] = None) -> List[Dict]:
+        """List the status fields of all experiment configs, optionally filtered by status"""
+        experiments = []
+        for key in self.list_keys():
+            if not key.endswith("_config"):
+                continue
+            config = self.load(key, FileFormat.JSON)
+            if not isinstance(config, dict) or (status is not None and config.get("status") != status):
+                continue
+            experiments.append({field: config.get(field) for field in EXPERIMENT_FIELDS})
+            if limit is not None and len(experiments) >= limit:
+                break
+        return experiments
+
 import os
 import json
 import csv
+import logging
+import threading
 import yaml
+from contextlib import contextmanager
 from typing import Optional, List, Dict, Union
 from enum import Enum
 
+logger = logging.getLogger(__name__)
+
+def _arrow_compatible(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Cast object columns that mix value types to strings
+
+    Span tags like the status code hold numbers and "N/A" in the same column, which arrow cannot store
+    in a typed column. These columns are stored as strings, like their values appear in the JSON output.
+    """
+    mixed = []
+    for column in data.columns[data.dtypes == object]:
+        try:
+            pyarrow.array(data[column], from_pandas=True)
+        except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError):
+            mixed.append(column)
+    if not mixed:
+        return data
+    return data.astype({column: str for column in mixed})
+
+
 class LocalFSStore(DocumentStore):
     def __init__(self, base_path: str):
         """
         Initialize the document store with a base directory.
+        The metadata index is opened on first use and built from the files in the directory if it does not exist yet.
         """
         self.base_path = base_path
         os.makedirs(self.base_path, exist_ok=True)
+        self._index: Optional[StoreIndex] = None
+        self._index_lock = threading.Lock()
+        self._reconciled_mtime: Optional[int] = None
+        """Modification time of the base directory when the index was last known to match it"""
+
+    @property
+    def index(self) -> StoreIndex:
+        """Index of the stored files, maintained on every save and delete"""
+        if self._index is None:
+            with self._index_lock:
+                if self._index is None:
+                    index_path = os.path.join(self.base_path, INDEX_FILENAME)
+                    index_exists = os.path.exists(index_path)
+                    index = StoreIndex(index_path)
+                    if not index_exists:
+                        self._rebuild(index)
+                    self._index = index
+        return self._index
+
+    def _reconcile(self) -> None:
+        """
+        Rebuild the index if files were added or removed without the store, e.g. by other pods or
+        by a crash between writing a file and indexing it. The directory is only listed if it changed
+        since the index was last known to match it, saves and deletes of the store itself keep that state.
+        """
+        mtime = os.stat(self.base_path).st_mtime_ns
+        if mtime == self._reconciled_mtime:
+            return
+        self._reconciled_mtime = mtime
+        if set(name for name, _, _ in self._document_files()) != set(self.index.files()):
+            logger.warning(f"Index of {self.base_path} does not match the directory, rebuilding it")
+            self.rebuild_index()
+
+    @contextmanager
+    def _own_change(self):
+        """
+        Keep the index marked as matching the directory across a change made by the store itself, so that
+        the next listing does not scan the directory. Changes made by others in the meantime are only
+        noticed once the directory changes again.
+        """
+        mtime = os.stat(self.base_path).st_mtime_ns
+        yield
+        if mtime == self._reconciled_mtime:
+            self._reconciled_mtime = os.stat(self.base_path).st_mtime_ns
 
     def _get_file_path(self, key: str, format: FileFormat) -> str:
         """Helper to construct file path."""
         return os.path.join(self.base_path, f"{key}.{format.value}")
 
-    def save(self, key: str, data: Union[Dict, List], format: FileFormat) -> None:
+    def supports(self, format: FileFormat) -> bool:
+        """Columnar formats are only supported if pyarrow is installed"""
+        return format not in COLUMNAR_FORMATS or pyarrow is not None
+
+    def _save_columnar(self, file_path: str, data: Union[Dict, List, pd.DataFrame], format: FileFormat) -> None:
+        """Write a DataFrame, or records convertible to one, with typed and compressed columns"""
+        if not self.supports(format):
+            raise StoreError(
+                message=f"Saving {format.value} files requires the optional pyarrow dependency (backend[columnar])",
+                filename=file_path,
+            )
+        if not isinstance(data, pd.DataFrame):
+            data = pd.DataFrame(data)
+        data = _arrow_compatible(data)
+        if format == FileFormat.PARQUET:
+            data.to_parquet(file_path, index=False, compression="zstd")
+        else:
+            # feather files keep a default index only, the index is dropped like in the other formats
+            data.reset_index(drop=True).to_feather(file_path, compression="zstd")
+
+    def save(self, key: str, data: Union[Dict, List, pd.DataFrame], format: FileFormat) -> None:
         """
         Save a file with a given key and format.
+        DataFrames are stored as records in the JSON, CSV and YAML formats and with typed columns
+        in the PARQUET and FEATHER formats.
         """
+        with self._own_change():
+            self._save(key, data, format)
+
+    def _save(self, key: str, data: Union[Dict, List, pd.DataFrame], format: FileFormat) -> None:
         file_path = self._get_file_path(key, format)
+        if format in COLUMNAR_FORMATS:
+            self._save_columnar(file_path, data, format)
+            self._index_file(key, format)
+            return
+        if isinstance(data, pd.DataFrame):
+            data = data.to_dict(orient='records')
         if format == FileFormat.JSON:
             with open(file_path, 'w') as f:
                 json.dump(data, f)
@@ -80,10 +220,19 @@ class LocalFSStore(DocumentStore):
                 yaml.dump(data, f, default_flow_style=False)
         else:
             raise ValueError(f"Unsupported format: {format}")
+        self._index_file(key, format, data)
+
+    def _index_file(self, key: str, format: FileFormat, data=None) -> None:
+        """Add a saved file to the index, together with the status fields if it is an experiment config"""
+        experiment = None
+        if format == FileFormat.JSON and key.endswith("_config") and isinstance(data, dict):
+            experiment = data
+        self.index.add(key, format.value, os.path.getsize(self._get_file_path(key, format)), experiment)
 
-    def load(self, key: str, format: FileFormat) -> Optional[Union[Dict, List]]:
+    def load(self, key: str, format: FileFormat) -> Optional[Union[Dict, List, pd.DataFrame]]:
         """
         Load a file by its key and format.
+        Files in the PARQUET and FEATHER formats are loaded as DataFrames.
         """
         file_path = self._get_file_path(key, format)
         if not os.path.exists(file_path):
@@ -101,6 +250,10 @@ class LocalFSStore(DocumentStore):
             elif format == FileFormat.YAML:
                 with open(file_path, 'r') as f:
                     return yaml.safe_load(f)
+            elif format == FileFormat.PARQUET:
+                return pd.read_parquet(file_path)
+            elif format == FileFormat.FEATHER:
+                return pd.read_feather(file_path)
             else:
                 raise ValueError(f"Unsupported format: {format}")
         except Exception as e:
@@ -114,19 +267,72 @@ class LocalFSStore(DocumentStore):
         """
         Delete all files with the given key in any format.
         """
-        for format in FileFormat:
-            file_path = self._get_file_path(key, format)
-            if os.path.exists(file_path):
-                os.remove(file_path)
+        with self._own_change():
+            for format in FileFormat:
+                file_path = self._get_file_path(key, format)
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+            self.index.remove(key)
+
+    def list_keys(self, prefix: str = "") -> List[str]:
+        """
+        List all unique keys in the document store that start with prefix, irrespective of format.
+        """
+        self._reconcile()
+        return self.index.keys(prefix)
+
+    def list_files(self, prefix: str = "") -> List[str]:
+        """List all files in the document store that start with prefix"""
+        self._reconcile()
+        return self.index.files(prefix)
+
+    def file_info(self, file_name: str) -> Optional[Tuple[int, float]]:
+        """Return the size in bytes and the modification time of a stored file, None if it does not exist"""
+        try:
+            stat = os.stat(os.path.join(self.base_path, file_name))
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime
+
+    def open_file(self, file_name: str) -> BinaryIO:
+        """Open a stored file to read its raw bytes"""
+        return open(os.path.join(self.base_path, file_name), 'rb')
+
+    def list_experiments(self, status: Optional[str] = None, limit: Optional[int] = None) -> List[Dict]:
+        """List the status fields of all experiment configs from the index, most recently created first"""
+        self._reconcile()
+        return self.index.experiments(status, limit)
+
+    def _document_files(self) -> List[Tuple[str, str, FileFormat]]:
+        """List the name, key and format of the stored files in the base directory"""
+        extensions = {format.value: format for format in FileFormat}
+        files = []
+        for entry in os.scandir(self.base_path):
+            key, extension = os.path.splitext(entry.name)
+            format = extensions.get(extension[1:])
+            if format is not None and entry.is_file():
+                files.append((entry.name, key, format))
+        return files
 
-    def list_keys(self) -> List[str]:
+    def rebuild_index(self) -> int:
         """
-        List all unique keys in the document store, irrespective of format.
+        Replace the index with the files that are currently in the base directory
+        Returns the number of indexed files.
         """
-        files = os.listdir(self.base_path)
-        keys = {os.path.splitext(filename)[0] for filename in files}
-        return list(keys)
+        return self._rebuild(self.index)
 
-    def list_files(self) -> List[str]:
-        """List all files in the document store"""
-        return os.listdir(self.base_path)
\ No newline at end of file
+    def _rebuild(self, index: StoreIndex) -> int:
+        files = []
+        for name, key, format in self._document_files():
+            experiment = None
+            if format == FileFormat.JSON and key.endswith("_config"):
+                try:
+                    experiment = self.load(key, format)
+                except StoreError as e:
+                    logger.warning(f"Indexing unreadable experiment config {name} without status: {e}")
+                if not isinstance(experiment, dict):
+                    experiment = None
+            files.append((key, format.value, os.path.getsize(os.path.join(self.base_path, name)), experiment))
+        index.replace(files)
+        logger.info(f"Indexed {len(files)} files in {self.base_path}")
+        return len(files)
\ No newline at end of file
@@ -0,0 +1,154 @@
+"""
+Purpose: Indexes the files of the LocalFSStore.
+Functionality: Keeps the stored files with their format and size and the status fields of experiment configs in SQLite.
+Connection: Maintained by store.py on every save and delete, queried when listing experiments and their files.
+
+Metadata index of the local document store"""
+import argparse
+import logging
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = ".store-index.sqlite"
+"""Name of the index database in the data directory, hidden so that it is never mistaken for a document"""
+EXPERIMENT_FIELDS = (
+    "id",
+    "name",
+    "status",
+    "created_at",
+    "started_at",
+    "completed_at",
+    "error_message",
+    "analysis_status",
+)
+"""Fields of experiment configs that are kept in the index"""
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS files (
+    file TEXT PRIMARY KEY,
+    key TEXT NOT NULL,
+    format TEXT NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_by_key ON files (key);
+CREATE TABLE IF NOT EXISTS experiments (
+    key TEXT PRIMARY KEY,
+    {", ".join(f"{field} TEXT" for field in EXPERIMENT_FIELDS)}
+);
+CREATE INDEX IF NOT EXISTS experiments_by_status ON experiments (status, created_at);
+CREATE INDEX IF NOT EXISTS experiments_by_creation ON experiments (created_at);
+"""
+
+
+def _prefix_range(prefix: str) -> Tuple[str, str]:
+    """Return bounds that select all strings starting with prefix with a range scan on an index"""
+    return prefix, prefix + "\U0010ffff"
+
+
+class StoreIndex:
+    """
+    SQLite index of the files in a document store.
+
+    Files are listed by their key prefix, so the files of an experiment are found with a range
+    scan instead of listing the whole directory. The status fields of every experiment config
+    are kept in a separate table to list and filter experiments without loading their configs.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.executescript(SCHEMA)
+
+    def add(self, key: str, format: str, size: int, experiment: Optional[Dict] = None) -> None:
+        """Add or update a file and, for experiment configs, the status fields of the experiment"""
+        with self._lock, self._connection:
+            self._add(key, format, size, experiment)
+
+    def replace(self, files: Iterable[Tuple[str, str, int, Optional[Dict]]]) -> None:
+        """Replace all indexed files in a single transaction"""
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM files")
+            self._connection.execute("DELETE FROM experiments")
+            for key, format, size, experiment in files:
+                self._add(key, format, size, experiment)
+
+    def _add(self, key: str, format: str, size: int, experiment: Optional[Dict]) -> None:
+        self._connection.execute(
+            "INSERT OR REPLACE INTO files (file, key, format, size) VALUES (?, ?, ?, ?)",
+            (f"{key}.{format}", key, format, size),
+        )
+        if experiment is not None:
+            self._connection.execute(
+                f"INSERT OR REPLACE INTO experiments (key, {', '.join(EXPERIMENT_FIELDS)}) "
+                f"VALUES (?, {', '.join('?' for _ in EXPERIMENT_FIELDS)})",
+                (key, *(experiment.get(field) for field in EXPERIMENT_FIELDS)),
+            )
+
+    def remove(self, key: str) -> None:
+        """Remove all files of a key in any format"""
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM files WHERE key = ?", (key,))
+            self._connection.execute("DELETE FROM experiments WHERE key = ?", (key,))
+
+    def files(self, prefix: str = "") -> List[str]:
+        """List the names of all files whose name starts with prefix"""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT file FROM files WHERE file >= ? AND file < ? ORDER BY file", _prefix_range(prefix)
+            )
+            return [file for file, in rows]
+
+    def keys(self, prefix: str = "") -> List[str]:
+        """List all keys starting with prefix, irrespective of format"""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT DISTINCT key FROM files WHERE key >= ? AND key < ? ORDER BY key", _prefix_range(prefix)
+            )
+            return [key for key, in rows]
+
+    def sizes(self, prefix: str = "") -> Dict[str, int]:
+        """Return the size in bytes of all files whose name starts with prefix"""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT file, size FROM files WHERE file >= ? AND file < ? ORDER BY file", _prefix_range(prefix)
+            )
+            return dict(rows)
+
+    def experiments(self, status: Optional[str] = None, limit: Optional[int] = None) -> List[Dict]:
+        """List the status fields of experiment configs, most recently created first"""
+        query = f"SELECT {', '.join(EXPERIMENT_FIELDS)} FROM experiments"
+        params = []
+        if status is not None:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY created_at DESC, key"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._connection.execute(query, params)
+            return [dict(zip(EXPERIMENT_FIELDS, row)) for row in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the metadata index of an existing results volume")
+    parser.add_argument("path", help="data directory of the LocalFSStore, e.g. /mnt/oxn-data")
+    args = parser.parse_args()
+
+    from backend.internal.store import LocalFSStore
+
+    store = LocalFSStore(args.path)
+    indexed = store.rebuild_index()
+    print(f"indexed {indexed} files in {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -71,7 +71,7 @@ class EmptyTreatment(Treatment):
 
     def inject(self) -> None:
         sleep_duration_seconds = self.config.get("duration_seconds")
-        time.sleep(sleep_duration_seconds)
+        self.wait(sleep_duration_seconds)
 
     def params(self) -> dict:
         return {
@@ -124,7 +124,7 @@ class EmptyKubernetesTreatment(Treatment):
 
     def inject(self) -> None:
         sleep_duration_seconds = self.config.get("duration_seconds")
-        time.sleep(sleep_duration_seconds)
+        self.wait(sleep_duration_seconds)
 
     def params(self) -> dict:
         return {
@@ -187,7 +187,7 @@ class EmptyDockerComposeTreatment(Treatment):
     def inject(self) -> None:
         super().inject()
         sleep_duration_seconds = self.config.get("duration_seconds")
-        time.sleep(sleep_duration_seconds)
+        self.wait(sleep_duration_seconds)
 
     def params(self) -> dict:
         return {
@@ -457,7 +457,7 @@ class CorruptPacketTreatment(Treatment):
             logger.info(
                 f"Injected packet corruption into container {service}. Waiting for {duration}s."
             )
-            time.sleep(duration)
+            self.wait(duration)
         except ContainerNotFound:
             logger.error(f"Can't find container {service}")
         except DockerAPIError as e:
@@ -657,13 +657,7 @@ class KubernetesMetricsExportIntervalTreatment(Treatment):
         
         logging.info(f"Environment variable '{self.env_name} set to '{self.interval_ms}'ms for the deployment '{self.deployment.metadata.name}'.")
 
-        time.sleep(3)
-
-        for x in range(0, 10):
-            if self.orchestrator.is_deployment_ready(self.deployment):
-                break
-            logging.info(f"Waiting for deployment {self.deployment.metadata.name} to be ready")
-            time.sleep(2)
+        self.rollouts.append(self.orchestrator.wait_for_deployment_rollout(self.deployment, reason="set env").to_dict())
 
 
     def clean(self) -> None:
@@ -678,6 +672,7 @@ class KubernetesMetricsExportIntervalTreatment(Treatment):
             environment_variable_value=self.init_env_value,
         )
         logging.info(f"Environment variable '{self.env_name} reset for deployment '{self.deployment.metadata.name}' to initial value.")
+        self.rollouts.append(self.orchestrator.wait_for_deployment_rollout(self.deployment, reason="reset env").to_dict())
 
     def params(self) -> dict:
         return {
@@ -850,7 +845,7 @@ class KubernetesProbabilisticHeadSamplingTreatment(Treatment):
 
 
          # TODO: it seams as there might be a way to reload config maps without restarting the pods in some cases. This should be investigated (https://kubernetes.io/docs/concepts/configuration/configmap/#mounted-configmaps-are-updated-automatically)
-        self.orchestrator.restart_pods_of_deployment(self.deployment)
+        self.rollouts.append(self.orchestrator.restart_pods_of_deployment(self.deployment).to_dict())
 
 
     def clean(self) -> None:
@@ -862,7 +857,7 @@ class KubernetesProbabilisticHeadSamplingTreatment(Treatment):
         logging.info(f"Reset otel collectors probabilistic sampling rate  {self.config.get('sampling_percentage')} -> {self.initial_sampling_percentage} and hash seed to {self.config.get('hash_seed')} -> {self.initial_hash_seed}")
 
          # TODO: it seams as there might be a way to reload config maps without restarting the pods in some cases. This should be investigated (https://kubernetes.io/docs/concepts/configuration/configmap/#mounted-configmaps-are-updated-automatically)
-        self.orchestrator.restart_pods_of_deployment(self.deployment)
+        self.rollouts.append(self.orchestrator.restart_pods_of_deployment(self.deployment).to_dict())
 
         return
         
@@ -970,7 +965,7 @@ class TailSamplingTreatment(Treatment):
         duration = self.config.get("duration", "0m")
         if duration:
             seconds = time_string_to_seconds(duration)
-            time.sleep(seconds)
+            self.wait(seconds)
 
     def clean(self) -> None:
         original_extras = self.config.get("otelcol_extras_yaml")
@@ -1087,7 +1082,7 @@ class PauseTreatment(Treatment):
         logger.info(
             f"Injected pause into container {service}. Waiting for {duration_seconds}s"
         )
-        time.sleep(duration_seconds)
+        self.wait(duration_seconds)
 
     def clean(self):
         service = self.config.get("service_name")
@@ -1260,7 +1255,7 @@ class KubernetesNetworkDelayTreatment(Treatment):
             logger.info(
                 f"Injected delay into pods in {namespace} with {label_selector}={label}. Waiting for {duration}s."
             )
-            time.sleep(duration)
+            self.wait(duration)
         except ContainerNotFound:
             logger.error(f"Can't find container ")
         except DockerAPIError as e:
@@ -1394,7 +1389,7 @@ class PacketLossTreatment(Treatment):
             logger.debug(
                 f"Injected packet loss into container {service} with status code {status_code}. Waiting for {duration_seconds}s"
             )
-            time.sleep(duration_seconds)
+            self.wait(duration_seconds)
         except ContainerNotFound:
             logger.error(f"Can't find container {service}")
         except DockerAPIError as e:
@@ -1568,7 +1563,7 @@ class KubernetesNetworkPacketLossTreatment(Treatment):
             logger.info(
                 f"Injected packet loss into pods in {namespace} with {label_selector}={label}. Waiting for {duration}s."
             )
-            time.sleep(duration)
+            self.wait(duration)
         except ContainerNotFound:
             logger.error(f"Can't find container ")
         except DockerAPIError as e:
@@ -1658,7 +1653,7 @@ class DeploymentScaleTreatment(Treatment):
         if response is None:
             self.messages.append(f"Failed to scale deployment {self.deployment.metadata.name} to {scale_to}")
             return
-        # TODO: Wait until scaling is done
+        self.rollouts.append(self.orchestrator.wait_for_deployment_rollout(self.deployment, reason="scale").to_dict())
         logging.info(f"Deployment {self.deployment.metadata.name} scaled to {scale_to}")
 
     def clean(self) -> None:
@@ -1686,6 +1681,7 @@ class DeploymentScaleTreatment(Treatment):
         if response is None:
             self.messages.append(f"Failed to scale deployment {self.deployment.metadata.name} to {self.replicas_before}")
             return
+        self.rollouts.append(self.orchestrator.wait_for_deployment_rollout(self.deployment, reason="scale").to_dict())
         logging.info(f"Deployment {self.deployment.metadata.name} scaled to {self.replicas_before}")
 
     def params(self) -> dict:
@@ -1759,7 +1755,7 @@ class KillTreatment(Treatment):
             logger.debug(
                 f"Killed container {service_name}. Sleeping for {duration_seconds}"
             )
-            time.sleep(duration_seconds)
+            self.wait(duration_seconds)
         except ContainerNotFound:
             logger.error(f"Can't find container {service_name}")
         except DockerAPIError as e:
@@ -1859,6 +1855,7 @@ class KubernetesKillTreatment(Treatment):
         
         amount_to_kill = self.config.get("amount_to_kill")
         pods_to_kill = self.pods[:amount_to_kill]
+        self.killed_at = time.time()
         for pod in pods_to_kill:
             KubernetesOrchestrator.kill_pod(self.orchestrator, pod)
             
@@ -1867,8 +1864,18 @@ class KubernetesKillTreatment(Treatment):
         logger.debug(f"Killed {amount_to_kill} pods.")
 
     def clean(self) -> None:
-        # TODO: Wait untill als pods are running again?
         super().clean()
+        # wait until the killed pods are replaced, so the next treatment starts from all pods running
+        assert isinstance(self.orchestrator, KubernetesOrchestrator)
+        rollout = self.orchestrator.wait_for_ready_pods(
+            namespace=self.config.get("namespace"),
+            label_selector=f"{self.config.get('label_selector')}={self.config.get('label')}",
+            replicas=len(self.pods),
+            replaced_uids=[pod.metadata.uid for pod in self.pods[:self.config.get("amount_to_kill")]],
+            reason="kill",
+            started=getattr(self, "killed_at", None),
+        )
+        self.rollouts.append(rollout.to_dict())
 
     def params(self) -> dict:
         return {
@@ -2041,7 +2048,7 @@ class KubernetesPrometheusIntervalTreatment(Treatment):
         self.orchestrator.set_prometheus_scrape_values(scrape_interval=self.config.get("interval"), evaluation_interval=self.config.get("evaluation_interval"), scrape_timeout=self.config.get("scrape_timeout"))
         logging.info(f"Set prometheus scrape interval to {self.config.get('interval')}, evaluation interval to {self.config.get('evaluation_interval')} and scrape timeout to {self.config.get('scrape_timeout')}")
 
-        self.orchestrator.restart_pods_of_deployment(self.deployment)
+        self.rollouts.append(self.orchestrator.restart_pods_of_deployment(self.deployment).to_dict())
 
 
     def clean(self) -> None:
@@ -2053,7 +2060,7 @@ class KubernetesPrometheusIntervalTreatment(Treatment):
         logging.info(f"Set prometheus scrape interval back to {self.initial_interval}, evaluation interval back to {self.initial_evaluation_interval} and scrape timeout back to {self.inital_scrape_timeout}")
 
         self.deployment = self.orchestrator.get_deployment("system-under-evaluation", "app.kubernetes.io/name", "prometheus")
-        self.orchestrator.restart_pods_of_deployment(self.deployment)
+        self.rollouts.append(self.orchestrator.restart_pods_of_deployment(self.deployment).to_dict())
 
 
     def params(self) -> dict:
@@ -2128,7 +2135,7 @@ class KubernetesPrometheusRulesTreatment(Treatment):
         )
         
         # Restart to apply changes
-        self.orchestrator.restart_pods_of_deployment(self.deployment)
+        self.rollouts.append(self.orchestrator.restart_pods_of_deployment(self.deployment).to_dict())
 
         # sleep 20 seconds to let prometheus apply the rules
         time.sleep(20)
@@ -37,6 +37,9 @@ from datetime import datetime
 from backend.internal.experiment_manager import ExperimentManager
 from fastapi.responses import FileResponse, StreamingResponse
 from backend.internal.store import LocalFSStore
+from backend.internal.export import export_response
+from backend.internal.query_cache import QUERY_CACHE
+from backend.internal.cluster_cache import CLUSTER_CACHE
 from backend.internal.models.experiment import CreateBatchExperimentRequest, CreateBatchExperimentResponse, CreateExperimentResponse, Experiment, ExperimentStatus, RunExperimentRequest, SuiteExperimentRequest
 
 
@@ -111,6 +114,21 @@ async def run_experiment(
         "experiment_id": experiment_id
     }
 
+@app.post("/experiments/{experiment_id}/cancel", response_model=Dict)
+async def cancel_experiment(experiment_id: str):
+    """
+    Cancel a running experiment.
+    - Cleans running treatments and skips the ones that did not start
+    - Stops the load generation and the remaining runs
+    - Data collected so far is still observed and stored
+    """
+    if not experiment_manager.cancel_experiment(experiment_id):
+        raise HTTPException(status_code=404, detail="Experiment is not running")
+    return {
+        "status": "cancelling",
+        "experiment_id": experiment_id
+    }
+
 @app.post("/experiments/{experiment_id}/runsync", response_model=Experiment)
 async def run_experiment_sync(
     experiment_id: str,
@@ -140,13 +158,15 @@ async def run_experiment_sync(
     return updated_experiment
 
 @app.get("/experiments/{experiment_id}/data")
-async def get_experiment_data(experiment_id: str):
-    """Get experiment data as zip file"""
-    memory_zip = experiment_manager.get_experiment_data(experiment_id)
-    return Response(
-        content=memory_zip.read(),
-        media_type="application/zip",
-        headers={"Content-Disposition": f"attachment; filename={experiment_id}.zip"}
+def get_experiment_data(
+    experiment_id: str,
+    request: Request,
+    compression_level: Optional[int] = Query(None, ge=0, le=9, description="Deflate level, 0 stores files uncompressed")
+):
+    """Get experiment data as zip file, streamed and resumable with range requests"""
+    export = experiment_manager.get_experiment_data(experiment_id, compression_level)
+    return export_response(
+        export, f"{experiment_id}.zip", request.headers.get("range"), request.headers.get("if-range")
     )
 
 @app.get("/experiments/{experiment_id}/status", response_model=ExperimentStatus)
@@ -174,9 +194,14 @@ async def create_batch_experiment(batch_experiment: CreateBatchExperimentRequest
     return experiment_manager.create_batch_experiment(batch_experiment.name, batch_experiment.config, batch_experiment.parameter_variations)
 
 @app.post("/experiments/batch/{batch_id}/run")
-async def run_batch_experiment(batch_id: str, experiment_config: RunExperimentRequest, analyze: bool = Query(False, description="Enable analysis after experiment completion")):
+async def run_batch_experiment(
+    batch_id: str,
+    experiment_config: RunExperimentRequest,
+    analyze: bool = Query(False, description="Enable analysis after experiment completion"),
+    parallelism: Optional[int] = Query(None, ge=1, description="Number of sub experiments on different namespaces that run at the same time"),
+):
     try:
-        return experiment_manager.run_batch_experiment(batch_id, experiment_config.output_formats, experiment_config.runs, analyze)
+        return experiment_manager.run_batch_experiment(batch_id, experiment_config.output_formats, experiment_config.runs, analyze, parallelism)
     except Exception as e:
         logger.error(f"Error running batch experiment: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -189,19 +214,22 @@ async def get_batch_experiment_report(batch_id: str, sub_experiment_id: str):
     return report
 
 @app.get("/experiments/batch/{batch_id}/{sub_experiment_id}/data")
-async def get_batch_experiment_data(batch_id: str, sub_experiment_id: str):
+def get_batch_experiment_data(
+    batch_id: str,
+    sub_experiment_id: str,
+    request: Request,
+    compression_level: Optional[int] = Query(None, ge=0, le=9, description="Deflate level, 0 stores files uncompressed")
+):
     """
     Get batch experiment data of a given sub experiment id
     """
     logger.debug(f"Getting data for batch experiment: {sub_experiment_id}")
     key = f"{batch_id}_{sub_experiment_id}"
-    zip_file = experiment_manager.get_experiment_data(key)
+    export = experiment_manager.get_experiment_data(key, compression_level)
     
     logger.debug(f"Returning zip file for batch experiment: {sub_experiment_id}")
-    return Response(
-        content=zip_file.read(),
-        media_type="application/zip",
-        headers={"Content-Disposition": f"attachment; filename={sub_experiment_id}.zip"}
+    return export_response(
+        export, f"{sub_experiment_id}.zip", request.headers.get("range"), request.headers.get("if-range")
     )
 
 @app.get("/analysis-data/{experiment_id}")
@@ -252,6 +280,16 @@ async def health_check():
     """Simple health check endpoint"""
     return {"status": "healthy"}
 
+@app.get("/query-cache/stats")
+async def query_cache_stats():
+    """Hit and miss counters and size of the Prometheus and Jaeger query cache"""
+    return QUERY_CACHE.stats()
+
+@app.get("/cluster-cache/stats")
+async def cluster_cache_stats():
+    """Size, age of the last list and last event of the watched pods, services and deployments"""
+    return CLUSTER_CACHE.stats()
+
 @app.get("/experiments/{experiment_id}/config")
 async def get_experiment_config(experiment_id: str):
     """Get experiment configuration"""
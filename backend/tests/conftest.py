@@ -0,0 +1,7 @@
+"""
+The backend runs with gevent patched threads and sockets, see main.py. The standard library is patched here,
+before the test modules import requests, ssl or the kubernetes client.
+"""
+from gevent import monkey
+
+monkey.patch_all()
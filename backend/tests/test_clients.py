@@ -0,0 +1,80 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+import requests
+
+from backend.internal.clients import ClientRegistry
+from backend.internal.jaeger import Jaeger
+from backend.internal.kubernetes_orchestrator import KubernetesOrchestrator
+from backend.internal.prometheus import Prometheus
+
+
+def test_addresses_are_resolved_once_per_ttl():
+    registry = ClientRegistry(address_ttl=60)
+    resolve = MagicMock(return_value="10.0.0.1")
+    assert registry.address(("jaeger",), resolve) == "10.0.0.1"
+    assert registry.address(("jaeger",), resolve) == "10.0.0.1"
+    assert resolve.call_count == 1
+
+    registry.invalidate(("jaeger",))
+    registry.address(("jaeger",), resolve)
+    assert resolve.call_count == 2
+
+    expired = ClientRegistry(address_ttl=0)
+    expired.address(("jaeger",), resolve)
+    expired.address(("jaeger",), resolve)
+    assert resolve.call_count == 4
+
+
+def test_sessions_are_shared_per_backend():
+    registry = ClientRegistry(pool_size=32)
+    session = registry.session("prometheus")
+    assert registry.session("prometheus") is session
+    assert registry.session("jaeger") is not session
+    assert session.get_adapter("http://prometheus:9090")._pool_maxsize == 32
+
+
+def test_clients_of_an_orchestrator_share_addresses_and_sessions():
+    """Response variables of an experiment look up each service once and reuse warm connections"""
+    orchestrator = KubernetesOrchestrator.__new__(KubernetesOrchestrator)
+    with patch.object(KubernetesOrchestrator, "get_prometheus_address", return_value="10.0.0.2") as prometheus_address, \
+            patch.object(KubernetesOrchestrator, "get_jaeger_address", return_value="10.0.0.3") as jaeger_address:
+        prometheus = [Prometheus(orchestrator, target="sue") for _ in range(3)]
+        jaeger = [Jaeger(orchestrator) for _ in range(3)]
+        Prometheus(orchestrator, target="oxn")
+
+    assert prometheus_address.call_count == 2
+    assert jaeger_address.call_count == 1
+    assert prometheus[0].base_url == "http://10.0.0.2:9090/api/v1/"
+    assert len({id(client.session) for client in prometheus}) == 1
+    assert len({id(client.session) for client in jaeger}) == 1
+    assert prometheus[0].session is not jaeger[0].session
+
+
+def test_clients_resolve_a_moved_service_again():
+    """A request that cannot connect drops the cached address and is sent again to the new address"""
+    orchestrator = KubernetesOrchestrator.__new__(KubernetesOrchestrator)
+    addresses = iter(["10.0.0.3", "10.0.0.4"])
+    with patch.object(KubernetesOrchestrator, "get_jaeger_address", side_effect=lambda: next(addresses)):
+        jaeger = Jaeger(orchestrator)
+        jaeger.session = MagicMock()
+        jaeger.session.get.side_effect = [requests.ConnectionError("no route to host"), MagicMock(status_code=200)]
+        jaeger._request(jaeger.base_url + "services")
+
+    assert [call.args[0] for call in jaeger.session.get.call_args_list] == [
+        "http://10.0.0.3:16686/jaeger/ui/api/services",
+        "http://10.0.0.4:16686/jaeger/ui/api/services",
+    ]
+    assert Jaeger(orchestrator).base_url == "http://10.0.0.4:16686/jaeger/ui/api/"
+
+
+def test_clients_raise_if_the_service_did_not_move():
+    orchestrator = KubernetesOrchestrator.__new__(KubernetesOrchestrator)
+    with patch.object(KubernetesOrchestrator, "get_prometheus_address", return_value="10.0.0.2") as prometheus_address:
+        prometheus = Prometheus(orchestrator, target="sue")
+        prometheus.session = MagicMock()
+        prometheus.session.get.side_effect = requests.ConnectionError("connection refused")
+        with pytest.raises(requests.ConnectionError):
+            prometheus._request(prometheus.base_url + "targets")
+    assert prometheus_address.call_count == 2
+    assert prometheus.session.get.call_count == 1
@@ -0,0 +1,124 @@
+import threading
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from backend.internal.cluster_cache import PODS, SERVICES, ClusterCache, parse_selector
+from backend.internal.kubernetes_orchestrator import KubernetesOrchestrator
+
+
+def resource(namespace, name, labels=None, resource_version="1"):
+    return SimpleNamespace(
+        metadata=SimpleNamespace(namespace=namespace, name=name, labels=labels or {}, resource_version=resource_version),
+        spec=SimpleNamespace(replicas=1),
+    )
+
+
+def listing(*items):
+    return SimpleNamespace(items=list(items), metadata=SimpleNamespace(resource_version="1"))
+
+
+class FakeWatch:
+    """Watch that yields the queued events of its list function and then blocks until it is stopped"""
+
+    events = {}
+
+    def __init__(self):
+        self._stopped = threading.Event()
+
+    def stream(self, function, **kwargs):
+        yield from self.events.pop(function, [])
+        self._stopped.wait(5)
+
+    def stop(self):
+        self._stopped.set()
+
+
+@pytest.fixture
+def core_api():
+    core_api = MagicMock()
+    core_api.list_namespaced_pod.return_value = listing(
+        resource("sue", "frontend-0", {"app": "frontend"}),
+        resource("sue", "frontend-1", {"app": "frontend"}),
+        resource("sue", "cart-0", {"app": "cart"}),
+    )
+    core_api.list_namespaced_service.return_value = listing(resource("sue", "frontend", {"app": "frontend"}))
+    return core_api
+
+
+@pytest.fixture
+def cache(core_api):
+    cache = ClusterCache(namespaces=["sue"], sync_timeout=5)
+    with patch("backend.internal.cluster_cache.watch.Watch", FakeWatch):
+        cache.start(core_api)
+        yield cache
+        cache.stop()
+
+
+def test_parse_selector():
+    assert parse_selector("app=frontend,tier==web") == {"app": "frontend", "tier": "web"}
+    assert parse_selector("") == {}
+    assert parse_selector("app!=frontend") is None
+    assert parse_selector("app in (frontend)") is None
+
+
+def test_cluster_cache_answers_lookups_from_the_first_list(cache, core_api):
+    """Pods and services are listed once per namespace and then read locally"""
+    assert [pod.metadata.name for pod in cache.list(PODS, "sue", "app=frontend")] == ["frontend-0", "frontend-1"]
+    assert cache.get(SERVICES, "sue", "frontend").metadata.name == "frontend"
+    assert core_api.list_namespaced_pod.call_count == 1
+    # namespaces that are not cached and selectors that cannot be evaluated locally are left to the API server
+    assert cache.list(PODS, "other", "app=frontend") is None
+    assert cache.list(PODS, "sue", "app!=frontend") is None
+
+    stats = {informer["kind"]: informer for informer in cache.stats()["informers"]}
+    assert stats[PODS]["synced"] and stats[PODS]["items"] == 3 and stats[PODS]["lists"] == 1
+    assert stats[PODS]["seconds_since_sync"] is not None
+
+
+def test_cluster_cache_applies_watch_events(core_api):
+    """Events received after the list add, replace and remove resources"""
+    FakeWatch.events = {core_api.list_namespaced_pod: [
+        {"type": "ADDED", "object": resource("sue", "frontend-2", {"app": "frontend"}, "2")},
+        {"type": "DELETED", "object": resource("sue", "frontend-0", {"app": "frontend"}, "3")},
+        {"type": "BOOKMARK", "object": resource(None, None, resource_version="4")},
+    ]}
+    cache = ClusterCache(namespaces=["sue"], sync_timeout=5)
+    with patch("backend.internal.cluster_cache.watch.Watch", FakeWatch):
+        cache.start(core_api)
+        informer = cache._informers[(PODS, "sue")]
+        for _ in range(100):
+            if informer.resource_version == "4":
+                break
+            threading.Event().wait(0.01)
+        assert [pod.metadata.name for pod in cache.list(PODS, "sue", "app=frontend")] == ["frontend-1", "frontend-2"]
+        assert informer.stats()["events"] == 3
+        cache.stop()
+
+
+def test_orchestrator_reads_from_the_cluster_cache(cache):
+    """The orchestrator only asks the API server for resources the cache does not hold"""
+    orchestrator = KubernetesOrchestrator.__new__(KubernetesOrchestrator)
+    orchestrator.kube_client = MagicMock()
+    orchestrator.api_client = MagicMock()
+    orchestrator.api_client.list_namespaced_deployment.return_value = listing(resource("sue", "frontend", {"app": "frontend"}))
+    with patch("backend.internal.kubernetes_orchestrator.CLUSTER_CACHE", cache):
+        assert len(orchestrator.get_pods("sue", "app", "frontend")) == 2
+        deployment = orchestrator.get_deployment("sue", "app", "frontend")
+    orchestrator.kube_client.list_namespaced_pod.assert_not_called()
+    # deployments are changed and written back with their resource version, they come from the API server
+    orchestrator.api_client.list_namespaced_deployment.assert_called_once_with("sue", label_selector="app=frontend")
+    assert deployment.metadata.name == "frontend"
+
+
+def test_running_services_of_a_namespace_scoped_cache_come_from_the_api(cache):
+    """A cache that watches only some namespaces does not hide the services of the other namespaces"""
+    assert cache.list(SERVICES) is None
+    orchestrator = KubernetesOrchestrator.__new__(KubernetesOrchestrator)
+    orchestrator.kube_client = MagicMock()
+    orchestrator.kube_client.list_service_for_all_namespaces.return_value = listing(
+        resource("sue", "frontend"), resource("monitoring", "prometheus")
+    )
+    with patch("backend.internal.kubernetes_orchestrator.CLUSTER_CACHE", cache):
+        assert orchestrator.running_services() == ["frontend", "prometheus"]
@@ -13,12 +13,14 @@ import json
 import shutil
 import tempfile
 from backend.internal.experiment_manager import ExperimentManager
+from backend.internal.locks import NamespaceLock, experiment_namespaces
 import pandas as pd
 from backend.internal.models.response import ResponseVariable
 from backend.internal.responses import MetricResponseVariable, TraceResponseVariable
 from backend.internal.store import DocumentStore, FileFormat
 from unittest.mock import MagicMock, patch
 import io 
+import zipfile
 
 @pytest.fixture
 def test_dir():
@@ -259,10 +261,12 @@ def test_update_experiment_config(experiment_manager, ExperimentConfig):
 
 def test_list_experiments(experiment_manager, ExperimentConfig):
     """Test listing all experiments"""
-    experiment_manager.store.list_keys.return_value = ['1_config', '2_config', '3_config']
-    experiment_manager.store.load.return_value = ExperimentConfig.model_dump(mode="json")
-    experiments = experiment_manager.list_experiments_status()
+    experiment_manager.store.list_experiments.return_value = [
+        {'id': str(idx), 'name': 'latest', 'status': 'COMPLETED'} for idx in range(3)
+    ]
+    experiments = experiment_manager.list_experiments_status(status_filter='COMPLETED', limit=3)
     assert len(experiments) == 3
+    experiment_manager.store.list_experiments.assert_called_once_with(status='COMPLETED', limit=3)
     
 def test_acquire_lock(experiment_manager, test_dir):
     """Test acquiring a lock"""
@@ -284,6 +288,55 @@ def test_release_lock(experiment_manager, test_dir):
     experiment_manager.release_lock()
     assert not hasattr(experiment_manager, 'lock_fd')
 
+def test_namespace_locks(test_dir, ExperimentConfig):
+    """Experiments on different namespaces lock independently, experiments without namespaces lock everything"""
+    assert experiment_namespaces(ExperimentConfig) == {'system-under-evaluation'}
+    first = NamespaceLock(test_dir, frozenset({'a', 'b'}))
+    assert first.acquire() is True
+    assert NamespaceLock(test_dir, frozenset({'b'})).acquire() is False
+    assert NamespaceLock(test_dir, None).acquire() is False
+    other = NamespaceLock(test_dir, frozenset({'c'}))
+    assert other.acquire() is True
+    first.release()
+    other.release()
+    everything = NamespaceLock(test_dir, None)
+    assert everything.acquire() is True
+    assert NamespaceLock(test_dir, frozenset({'c'})).acquire() is False
+    everything.release()
+
+def test_run_batch_experiment_runs_separate_namespaces_concurrently(experiment_manager):
+    """Sub experiments on different namespaces overlap, sub experiments on the same namespace run one after another"""
+    namespaces = ['ns-a', 'ns-b', 'ns-a']
+    configs = {}
+    for sub_experiment_id, namespace in enumerate(namespaces):
+        spec = sample_config()
+        spec['sue']['required'] = [{'namespace': namespace, 'name': 'frontend'}]
+        spec['loadgen']['target']['namespace'] = namespace
+        spec['treatments'] = []
+        configs[f'batch_{sub_experiment_id}_config'] = {'id': f'batch_{sub_experiment_id}', 'spec': spec}
+    params_to_id = [{'sub_experiment_id': str(sub_experiment_id)} for sub_experiment_id in range(len(namespaces))]
+    experiment_manager.store.load.side_effect = lambda key, _: params_to_id if key == 'batch_params_to_id' else configs.get(key)
+
+    running = []
+    overlapping = []
+    def run_experiment(experiment_id, *args, **kwargs):
+        running.append(experiment_id)
+        overlapping.append(sorted(running))
+        time.sleep(0.2)
+        running.remove(experiment_id)
+    experiment_manager.run_experiment = run_experiment
+    experiment_manager.update_experiment_config = MagicMock()
+
+    experiment_manager.run_batch_experiment('batch', [FileFormat.JSON], 1, parallelism=3)
+
+    assert ['batch_0', 'batch_1'] in overlapping
+    assert ['batch_0', 'batch_2'] not in overlapping
+    experiment_manager.update_experiment_config.assert_called_with('batch', {'status': 'COMPLETED', 'completed_at': unittest.mock.ANY})
+    report = next(call.args[1] for call in experiment_manager.store.save.call_args_list if call.args[0] == 'batch_report')
+    assert [sub_experiment['status'] for sub_experiment in report['sub_experiments']] == ['COMPLETED'] * 3
+    assert report['parallelism'] == 3
+    assert report['summary']['saved_seconds'] > 0.1
+
 def test_get_experiment_response_data(experiment_manager):
     """Test getting experiment response data"""
     experiment_manager.store.list_keys.return_value = ['1_0_response.json']
@@ -294,9 +347,12 @@ def test_get_experiment_response_data(experiment_manager):
 def test_get_experiment_data(experiment_manager):
     """Test getting experiment data"""
     experiment_manager.store.list_files.return_value = ['1_report.yaml']
-    experiment_manager.store.load.return_value = {'report': 'data'}
-    data = experiment_manager.get_experiment_data('1')
-    assert isinstance(data, io.BytesIO)
+    experiment_manager.store.file_info.return_value = (13, 1_700_000_000.0)
+    experiment_manager.store.open_file.side_effect = lambda name: io.BytesIO(b'report: data\n')
+    export = experiment_manager.get_experiment_data('1')
+    with zipfile.ZipFile(io.BytesIO(b''.join(export.iter_bytes()))) as archive:
+        assert archive.read('1_report.yaml') == b'report: data\n'
+    experiment_manager.store.list_files.assert_called_once_with(prefix='1_')
 
 def test_get_batched_experiment_id_by_params(experiment_manager):
     """Test getting batched experiment ID by parameters"""
@@ -315,4 +371,64 @@ def test_get_batched_experiment_response_data(experiment_manager):
     experiment_manager.store.load.return_value = {'response': 'data'}
     response = experiment_manager.get_batched_experiment_response_data('batch_1', '0', 'response', 'json')
     assert response['response'] == 'data'
-    
\ No newline at end of file
+    
+def test_run_experiment_saves_all_output_formats(experiment_manager):
+    """Response data is saved once per requested output format"""
+    experiment_manager.store.load.return_value = {'id': '1', 'status': 'PENDING', 'spec': sample_config()}
+    response = MagicMock()
+    response.name = 'frontend_traces'
+    response.data = pd.DataFrame({'duration': [1, 2]})
+    with patch('backend.internal.experiment_manager.Engine') as engine:
+        engine.return_value.run.return_value = ({'frontend_traces': response}, {'runs': {}})
+        experiment_manager.run_experiment('1', [FileFormat.JSON, FileFormat.PARQUET], 1, False)
+
+    saved = [call.args for call in experiment_manager.store.save.call_args_list if call.args[0] == '1_0_frontend_traces']
+    assert [args[2] for args in saved] == [FileFormat.JSON, FileFormat.PARQUET]
+    assert all(args[1] is response.data for args in saved)
+
+def test_run_experiment_rejects_unsupported_formats(experiment_manager):
+    """The experiment fails before it runs if the store cannot write an output format"""
+    experiment_manager.store.load.return_value = {'id': '1', 'status': 'PENDING', 'spec': sample_config()}
+    experiment_manager.store.supports.side_effect = lambda output_format: output_format != FileFormat.PARQUET
+    with patch('backend.internal.experiment_manager.Engine') as engine:
+        with pytest.raises(ValueError):
+            experiment_manager.run_experiment('1', [FileFormat.PARQUET], 1, False)
+    engine.assert_not_called()
+
+def test_run_experiment_submits_the_analysis_after_releasing_the_namespaces(experiment_manager):
+    """Waiting for a full analysis queue does not block other experiments on the same namespaces"""
+    experiment_manager.store.load.return_value = {'id': '1', 'status': 'PENDING', 'spec': sample_config()}
+    statuses = []
+    experiment_manager.update_experiment_config = lambda experiment_id, updates: statuses.append(updates.get('status'))
+
+    def call_analysis_service(experiment_id):
+        other = NamespaceLock(experiment_manager.namespace_lock_dir, experiment_namespaces(experiment_manager.get_experiment_config('1')))
+        assert other.acquire(0)
+        other.release()
+        assert 'COMPLETED' in statuses
+        return True
+
+    with patch('backend.internal.experiment_manager.Engine') as engine, \
+            patch.object(experiment_manager, 'call_analysis_service', side_effect=call_analysis_service) as submit:
+        engine.return_value.run.return_value = ({}, {'runs': {}})
+        engine.return_value.cancelled.is_set.return_value = False
+        experiment_manager.run_experiment('1', [FileFormat.JSON], 1, True)
+    submit.assert_called_once_with('1')
+
+def test_call_analysis_service_waits_while_the_queue_is_full(experiment_manager):
+    """A full analysis queue is answered with 503, the analysis is submitted again after Retry-After"""
+    full = MagicMock(status_code=503, headers={'Retry-After': '5'})
+    queued = MagicMock(status_code=200, headers={})
+    with patch('backend.internal.experiment_manager.requests.get', side_effect=[full, full, queued]) as get, \
+            patch('backend.internal.experiment_manager.time.sleep') as sleep:
+        assert experiment_manager.call_analysis_service('1') is True
+    assert get.call_count == 3
+    assert [call.args[0] for call in sleep.call_args_list] == [5.0, 5.0]
+
+def test_call_analysis_service_gives_up_after_the_submit_timeout(experiment_manager):
+    """The backend stops submitting once waiting again would exceed the submit timeout"""
+    full = MagicMock(status_code=503, headers={'Retry-After': '3600'})
+    with patch('backend.internal.experiment_manager.requests.get', return_value=full), \
+            patch('backend.internal.experiment_manager.time.sleep') as sleep:
+        assert experiment_manager.call_analysis_service('1') is False
+    sleep.assert_not_called()
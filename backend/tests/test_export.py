@@ -0,0 +1,90 @@
+import io
+import os
+import zipfile
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from backend.internal.export import ZipExport, export_response
+from backend.internal.store import FileFormat, LocalFSStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LocalFSStore(str(tmp_path))
+    store.save("1_config", {"id": "1", "status": "COMPLETED"}, FileFormat.JSON)
+    store.save("1_0_frontend_traces", [{"span_id": str(idx), "duration": idx} for idx in range(5000)], FileFormat.JSON)
+    store.save("1_report", {"runs": {"a": {"treatments": {}}}}, FileFormat.YAML)
+    store.save("12_config", {"id": "12"}, FileFormat.JSON)
+    return store
+
+
+def archive_bytes(export, start=0, end=None):
+    return b"".join(export.iter_bytes(start, end))
+
+
+def test_export_copies_stored_files(store, tmp_path):
+    """Files of the experiment end up in the archive byte for byte"""
+    with zipfile.ZipFile(io.BytesIO(archive_bytes(ZipExport(store, "1_")))) as archive:
+        assert archive.namelist() == ["1_0_frontend_traces.json", "1_config.json", "1_report.yaml"]
+        for name in archive.namelist():
+            assert archive.read(name) == (tmp_path / name).read_bytes()
+            assert archive.getinfo(name).compress_type == zipfile.ZIP_DEFLATED
+
+
+def test_export_compression_level(store):
+    """Level 0 stores all files and columnar files are never deflated"""
+    with open(os.path.join(store.base_path, "1_0_cart_traces.parquet"), "wb") as parquet:
+        parquet.write(b"PAR1" * 100)
+    store.rebuild_index()
+
+    stored = ZipExport(store, "1_", compression_level=0)
+    deflated = ZipExport(store, "1_", compression_level=9)
+
+    with zipfile.ZipFile(io.BytesIO(archive_bytes(deflated))) as archive:
+        assert archive.getinfo("1_0_cart_traces.parquet").compress_type == zipfile.ZIP_STORED
+    with zipfile.ZipFile(io.BytesIO(archive_bytes(stored))) as archive:
+        assert {info.compress_type for info in archive.infolist()} == {zipfile.ZIP_STORED}
+    assert stored.size() > deflated.size()
+    # the level of the export is applied to the deflated entries
+    assert ZipExport(store, "1_", compression_level=1).size() != deflated.size()
+    assert stored.etag != deflated.etag
+
+
+def test_export_is_resumable(store):
+    """Producing the archive again yields the same bytes, so any range can be served"""
+    export = ZipExport(store, "1_")
+    full = archive_bytes(export)
+
+    assert archive_bytes(ZipExport(store, "1_")) == full
+    assert export.size() == len(full)
+    assert archive_bytes(export, 100, 199) == full[100:200]
+    assert archive_bytes(export, len(full) - 10) == full[-10:]
+
+
+def test_export_response_ranges(store):
+    """Range requests are answered with partial content, unsatisfiable ones with 416"""
+    app = FastAPI()
+
+    @app.get("/data")
+    def data(request: Request):
+        return export_response(
+            ZipExport(store, "1_"), "1.zip", request.headers.get("range"), request.headers.get("if-range")
+        )
+
+    client = TestClient(app)
+    full = client.get("/data")
+    etag = full.headers["etag"]
+
+    assert full.status_code == 200
+    assert full.headers["accept-ranges"] == "bytes"
+    partial = client.get("/data", headers={"Range": "bytes=50-", "If-Range": etag})
+    assert partial.status_code == 206
+    assert partial.content == full.content[50:]
+    assert partial.headers["content-range"] == f"bytes 50-{len(full.content) - 1}/{len(full.content)}"
+    assert client.get("/data", headers={"Range": "bytes=-20"}).content == full.content[-20:]
+    assert client.get("/data", headers={"Range": f"bytes={len(full.content)}-"}).status_code == 416
+    changed = client.get("/data", headers={"Range": "bytes=50-", "If-Range": '"outdated"'})
+    assert changed.status_code == 200
+    assert changed.content == full.content
@@ -0,0 +1,102 @@
+import io
+import json
+from unittest.mock import MagicMock
+
+import pytest
+
+from backend.internal.errors import JaegerException
+from backend.internal.jaeger import Jaeger
+
+
+def fake_search(trace_starts):
+    """Return a search_traces replacement over traces starting at the given timestamps"""
+    calls = []
+
+    def search_traces(start=None, end=None, limit=None, service_name=None, **kwargs):
+        calls.append((start, end))
+        matching = [ts for ts in trace_starts if start <= ts <= end][:limit]
+        return {"data": [{"traceID": f"trace-{ts}", "spans": [], "processes": {}} for ts in matching]}
+
+    return search_traces, calls
+
+
+def harvest(jaeger, **kwargs):
+    return [trace["traceID"] for batch in jaeger.harvest_traces(**kwargs) for trace in batch]
+
+
+def test_harvest_traces_deduplicates_slice_borders():
+    """Traces on a slice border are yielded only once"""
+    jaeger = Jaeger(orchestrator=MagicMock())
+    jaeger.search_traces, calls = fake_search([0, 50, 100, 150, 200])
+
+    trace_ids = harvest(jaeger, service_name="frontend", start=0, end=200, limit=10, slice_duration=50)
+
+    assert sorted(trace_ids) == ["trace-0", "trace-100", "trace-150", "trace-200", "trace-50"]
+    assert len(calls) == 4
+
+
+def test_harvest_traces_splits_slices_that_hit_the_limit():
+    """A slice returning as many traces as the limit is searched again in halves"""
+    jaeger = Jaeger(orchestrator=MagicMock())
+    trace_starts = list(range(0, 1000, 10))
+    jaeger.search_traces, calls = fake_search(trace_starts)
+
+    trace_ids = harvest(
+        jaeger, service_name="frontend", start=0, end=1000, limit=8, max_workers=2, min_slice_duration=1
+    )
+
+    assert sorted(trace_ids) == sorted(f"trace-{ts}" for ts in trace_starts)
+    assert len(calls) > 2
+
+
+def test_harvest_traces_keeps_truncated_minimal_slices():
+    """Slices at the minimum duration are kept even if they hit the limit"""
+    jaeger = Jaeger(orchestrator=MagicMock())
+    jaeger.search_traces, _ = fake_search([5, 5, 5, 6])
+
+    trace_ids = harvest(
+        jaeger, service_name="frontend", start=0, end=10, limit=2, max_workers=1, min_slice_duration=10
+    )
+
+    assert trace_ids == ["trace-5"]
+
+
+class StreamedResponse:
+    """Minimal stand-in for a streamed requests response"""
+
+    def __init__(self, body: bytes):
+        self.raw = io.BytesIO(body)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+
+def test_stream_traces_yields_traces_incrementally():
+    """Traces are parsed one by one from the streamed body"""
+    pytest.importorskip("ijson")
+    jaeger = Jaeger(orchestrator=MagicMock())
+    body = {"data": [{"traceID": "a", "spans": [{"duration": 5}]}, {"traceID": "b", "spans": []}], "total": 0}
+    jaeger.session = MagicMock()
+    jaeger.session.get.return_value = StreamedResponse(json.dumps(body).encode())
+
+    traces = list(jaeger.stream_traces(service_name="frontend", start=0, end=10, limit=20))
+
+    assert traces == body["data"]
+    assert jaeger.session.get.call_args.kwargs["stream"] is True
+
+
+def test_stream_traces_rejects_invalid_json():
+    """A truncated body surfaces as a JaegerException"""
+    pytest.importorskip("ijson")
+    jaeger = Jaeger(orchestrator=MagicMock())
+    jaeger.session = MagicMock()
+    jaeger.session.get.return_value = StreamedResponse(b'{"data": [{"traceID": "a"')
+
+    with pytest.raises(JaegerException):
+        list(jaeger.stream_traces(service_name="frontend"))
@@ -0,0 +1,103 @@
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from backend.internal.errors import OrchestratorException
+from backend.internal.kubernetes_orchestrator import KubernetesOrchestrator
+from backend.internal.models.pod_exec import PodExecStatus
+
+
+def make_pod(name):
+    return SimpleNamespace(
+        metadata=SimpleNamespace(name=name, namespace="sue", labels={"app": "frontend"}),
+        spec=SimpleNamespace(containers=[SimpleNamespace(name="server")]),
+    )
+
+
+class FakeExec:
+    """WSClient of a command that runs for a fixed time and exits with a fixed code"""
+
+    def __init__(self, seconds, exit_code, output=""):
+        self.seconds = seconds
+        self.exit_code = exit_code
+        self.output = output
+        self.open = True
+
+    def run_forever(self, timeout=None):
+        if timeout is not None and self.seconds > timeout:
+            time.sleep(timeout)
+            return
+        time.sleep(self.seconds)
+        self.open = False
+
+    def read_all(self):
+        return self.output
+
+    def is_open(self):
+        return self.open
+
+    @property
+    def returncode(self):
+        return self.exit_code
+
+    def close(self):
+        self.open = False
+
+
+@pytest.fixture
+def orchestrator():
+    orchestrator = KubernetesOrchestrator.__new__(KubernetesOrchestrator)
+    orchestrator.kube_client = MagicMock()
+    orchestrator._exec_clients = threading.local()
+    return orchestrator
+
+
+def run_with(orchestrator, execs, **kwargs):
+    """Execute a command in one pod per fake exec, keyed by pod name"""
+    orchestrator.kube_client.list_namespaced_pod.return_value = SimpleNamespace(items=[make_pod(name) for name in execs])
+    with patch("backend.internal.kubernetes_orchestrator.client.CoreV1Api"), \
+            patch("backend.internal.kubernetes_orchestrator.stream", side_effect=lambda *args, name, **_: execs[name]):
+        return orchestrator.execute_on_all_matching_pods("app", "frontend", "sue", ["tc", "qdisc"], **kwargs)
+
+
+def test_execute_on_all_matching_pods_runs_concurrently(orchestrator):
+    """The command starts in all replicas at once instead of one pod after another"""
+    execs = {f"frontend-{i}": FakeExec(0.2, 0) for i in range(5)}
+    started = time.monotonic()
+    report = run_with(orchestrator, execs)
+    assert time.monotonic() - started < 0.6
+    assert report.status == PodExecStatus.SUCCEEDED
+    assert [result.pod for result in report.results] == list(execs)
+    assert all(result.exit_code == 0 and result.seconds >= 0.2 for result in report.results)
+    assert report.onset_spread < 0.1
+    assert report.to_dict()["status"] == "SUCCEEDED"
+
+
+def test_execute_on_all_matching_pods_reports_every_pod(orchestrator):
+    """A failure in one pod does not hide the results of the others"""
+    execs = {"frontend-0": FakeExec(0.0, 0), "frontend-1": FakeExec(0.0, 2, "RTNETLINK answers: File exists"), "frontend-2": FakeExec(0.0, 0)}
+    report = run_with(orchestrator, execs)
+    assert report.status == PodExecStatus.PARTIAL
+    assert report.exit_code == 2
+    assert [result.succeeded for result in report.results] == [True, False, True]
+
+    with patch.object(orchestrator, "execute_on_all_matching_pods", return_value=report):
+        status_code, output = orchestrator.execute_console_command_on_all_matching_pods("app", "frontend", "sue", ["tc", "qdisc"])
+    assert status_code == 2
+    assert output == "frontend-1: RTNETLINK answers: File exists"
+
+
+def test_execute_on_all_matching_pods_times_out_per_pod(orchestrator):
+    """A pod that does not complete the command in time is reported without blocking the others"""
+    execs = {"frontend-0": FakeExec(0.0, 0), "frontend-1": FakeExec(5.0, 0)}
+    report = run_with(orchestrator, execs, timeout=0.1)
+    assert report.status == PodExecStatus.PARTIAL
+    assert report.results[1].exit_code is None
+    assert "0.1s" in report.results[1].error
+
+    with patch.object(orchestrator, "execute_on_all_matching_pods", return_value=report):
+        with pytest.raises(OrchestratorException):
+            orchestrator.execute_console_command_on_all_matching_pods("app", "frontend", "sue", ["tc", "qdisc"])
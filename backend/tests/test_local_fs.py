@@ -1,8 +1,14 @@
+import json
+import os
 import unittest
 import tempfile
 import shutil
 from pathlib import Path
-from internal.store import LocalFSStore, FileFormat
+from unittest import mock
+
+import pandas as pd
+
+from internal.store import LocalFSStore, FileFormat, StoreError, pyarrow
 
 class TestLocalFSStore(unittest.TestCase):
     def setUp(self):
@@ -72,6 +78,125 @@ class TestLocalFSStore(unittest.TestCase):
         with self.assertRaises(ValueError):
             self.store.save(key, data, FileFormat.CSV)
 
+    def test_save_dataframe_as_json_records(self):
+        """Test that DataFrames are saved as records in the JSON format."""
+        data = pd.DataFrame({"span_id": ["a", "b"], "duration": [5, 7]})
+        self.store.save("frame", data, FileFormat.JSON)
+
+        self.assertEqual(
+            self.store.load("frame", FileFormat.JSON),
+            [{"span_id": "a", "duration": 5}, {"span_id": "b", "duration": 7}],
+        )
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_save_and_load_columnar(self):
+        """Test saving and loading DataFrames in the parquet and feather formats."""
+        data = pd.DataFrame(
+            {
+                "span_id": ["a", "b", "c"],
+                "duration": [5, 7, 9],
+                "service_name": pd.Categorical(["frontend", "cart", "frontend"]),
+                "req_status_code": [200, "N/A", 0],
+            },
+            index=pd.to_datetime([1, 2, 3], unit="s", utc=True),
+        )
+        for file_format in (FileFormat.PARQUET, FileFormat.FEATHER):
+            self.store.save("frame", data, file_format)
+            loaded_data = self.store.load("frame", file_format)
+
+            self.assertEqual(loaded_data["duration"].dtype, "int64")
+            self.assertIsInstance(loaded_data["service_name"].dtype, pd.CategoricalDtype)
+            self.assertEqual(loaded_data["req_status_code"].tolist(), ["200", "N/A", "0"])
+            self.assertEqual(list(loaded_data.index), [0, 1, 2])
+
+        self.store.delete("frame")
+        self.assertEqual(self.store.list_files(), [])
+
+    @unittest.skipIf(pyarrow is not None, "pyarrow is installed")
+    def test_columnar_formats_require_pyarrow(self):
+        """Test that columnar formats are rejected without pyarrow."""
+        self.assertFalse(self.store.supports(FileFormat.PARQUET))
+        with self.assertRaises(StoreError):
+            self.store.save("frame", pd.DataFrame({"a": [1]}), FileFormat.PARQUET)
+
+    def test_list_files_by_prefix(self):
+        """Test listing the files of a single experiment."""
+        self.store.save("1_config", {"id": "1"}, FileFormat.JSON)
+        self.store.save("1_0_frontend_traces", [{"row": 1}], FileFormat.JSON)
+        self.store.save("1_report", {"runs": {}}, FileFormat.YAML)
+        self.store.save("12_config", {"id": "12"}, FileFormat.JSON)
+
+        self.assertEqual(
+            self.store.list_files(prefix="1_"), ["1_0_frontend_traces.json", "1_config.json", "1_report.yaml"]
+        )
+        self.assertEqual(self.store.list_keys(prefix="12"), ["12_config"])
+
+    def test_list_experiments(self):
+        """Test listing and filtering experiments by status without loading their configs."""
+        self.store.save("1_config", {"id": "1", "status": "COMPLETED", "created_at": "2025-01-01"}, FileFormat.JSON)
+        self.store.save("2_config", {"id": "2", "status": "RUNNING", "created_at": "2025-01-02"}, FileFormat.JSON)
+        self.store.save("2_config", {"id": "2", "status": "COMPLETED", "created_at": "2025-01-02"}, FileFormat.JSON)
+        self.store.save("3_config", {"id": "3", "status": "FAILED", "created_at": "2025-01-03"}, FileFormat.JSON)
+        self.store.delete("3_config")
+
+        experiments = self.store.list_experiments(status="COMPLETED")
+        self.assertEqual([experiment["id"] for experiment in experiments], ["2", "1"])
+        self.assertEqual(len(self.store.list_experiments(limit=1)), 1)
+        self.assertEqual(self.store.list_experiments(status="FAILED"), [])
+
+    def test_index_is_built_for_existing_directories(self):
+        """Test that files written before the index existed are indexed."""
+        self.store.save("1_config", {"id": "1", "status": "COMPLETED"}, FileFormat.JSON)
+        self.store.index.close()
+        os.remove(os.path.join(self.temp_dir, ".store-index.sqlite"))
+        os.makedirs(os.path.join(self.temp_dir, "experiments"))
+
+        store = LocalFSStore(self.temp_dir)
+
+        self.assertEqual(store.list_files(), ["1_config.json"])
+        self.assertEqual(store.list_experiments()[0]["status"], "COMPLETED")
+
+    def test_rebuild_index(self):
+        """Test that rebuilding the index picks up files changed outside the store."""
+        self.store.save("1_config", {"id": "1"}, FileFormat.JSON)
+        os.remove(os.path.join(self.temp_dir, "1_config.json"))
+        with open(os.path.join(self.temp_dir, "2_report.yaml"), "w") as f:
+            f.write("runs: {}")
+
+        self.assertEqual(self.store.rebuild_index(), 1)
+        self.assertEqual(self.store.list_keys(), ["2_report"])
+        self.assertEqual(self.store.list_experiments(), [])
+
+    def test_listing_picks_up_files_changed_outside_the_store(self):
+        """Test that files written or removed without the store, e.g. by other pods, are listed correctly."""
+        self.store.save("1_config", {"id": "1"}, FileFormat.JSON)
+        self.assertEqual(self.store.list_keys(), ["1_config"])
+        with open(os.path.join(self.temp_dir, "2_config.json"), "w") as f:
+            json.dump({"id": "2", "status": "COMPLETED"}, f)
+        os.remove(os.path.join(self.temp_dir, "1_config.json"))
+
+        self.assertEqual(self.store.list_files(), ["2_config.json"])
+        self.assertEqual(self.store.list_experiments()[0]["status"], "COMPLETED")
+
+    def test_listing_after_saves_and_deletes_does_not_scan_the_directory(self):
+        """Test that changes made by the store itself keep the index marked as matching the directory."""
+        self.store.save("1_config", {"id": "1"}, FileFormat.JSON)
+        self.store.list_keys()
+        with mock.patch.object(self.store, "_document_files", wraps=self.store._document_files) as scan:
+            self.store.save("2_config", {"id": "2"}, FileFormat.JSON)
+            self.store.delete("1_config")
+            self.assertEqual(self.store.list_keys(), ["2_config"])
+            self.assertEqual(self.store.list_experiments()[0]["id"], "2")
+            scan.assert_not_called()
+
+    def test_index_is_created_on_first_use(self):
+        """Test that creating a store does not create its index file."""
+        store = LocalFSStore(os.path.join(self.temp_dir, "lazy"))
+        index_path = os.path.join(self.temp_dir, "lazy", ".store-index.sqlite")
+        self.assertFalse(os.path.exists(index_path))
+        self.assertEqual(store.list_keys(), [])
+        self.assertTrue(os.path.exists(index_path))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,85 @@
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pandas as pd
+
+from backend.internal.models.response import ResponseVariable
+from backend.internal.observer import Observer
+
+
+class SleepingVariable(ResponseVariable):
+    """Response variable that takes a fixed time to observe"""
+
+    def __init__(self, name, seconds, fail=False, barrier=None):
+        super().__init__(experiment_start=0.0, experiment_end=1.0)
+        self.name = name
+        self.seconds = seconds
+        self.fail = fail
+        self.barrier = barrier
+
+    @property
+    def short_id(self) -> str:
+        return self.id[:8]
+
+    def label(self, treatment_start, treatment_end, label_column, label):
+        pass
+
+    def observe(self) -> pd.DataFrame:
+        with self.timed("fetch"):
+            if self.barrier is not None:
+                # only returns once all variables are fetching at the same time
+                self.barrier.wait(timeout=10)
+            time.sleep(self.seconds)
+        if self.fail:
+            raise RuntimeError("backend unavailable")
+        with self.timed("parse"):
+            self.data = pd.DataFrame({"value": [1, 2, 3]})
+        return self.data
+
+
+def observer_with(variables, max_workers=4):
+    observer = Observer(config=MagicMock(), orchestrator=MagicMock(), max_workers=max_workers)
+    observer._response_variables = {variable.name: variable for variable in variables}
+    return observer
+
+
+def test_observe_runs_variables_concurrently():
+    """Variables are observed in parallel up to the worker count"""
+    barrier = threading.Barrier(4)
+    observer = observer_with([SleepingVariable(f"v{idx}", 0, barrier=barrier) for idx in range(4)])
+
+    observer.observe()
+
+    assert set(observer.observations) == {"v0", "v1", "v2", "v3"}
+    assert all(observation["error"] == "" for observation in observer.observations.values())
+    assert all(observation["rows"] == 3 for observation in observer.observations.values())
+
+
+def test_observe_isolates_failing_variables():
+    """A failing variable is recorded with its error and does not affect the others"""
+    observer = observer_with([SleepingVariable("ok", 0.01), SleepingVariable("broken", 0.01, fail=True)])
+
+    observer.observe()
+
+    assert observer.observations["ok"]["error"] == ""
+    assert observer.observations["broken"]["error"] == "backend unavailable"
+    assert observer.observations["broken"]["fetch_seconds"] >= 0.01
+    assert observer.variables()["ok"].data is not None
+
+
+def test_observe_reports_the_latest_run():
+    """Data and stage timings of an earlier run are not carried over into the next observation"""
+    variable = SleepingVariable("v", 0)
+    observer = observer_with([variable])
+    observer.observe()
+    assert "parse" in variable.timings
+    assert observer.observations["v"]["rows"] == 3
+
+    variable.fail = True
+    observer.observe()
+
+    assert set(variable.timings) == {"fetch"}
+    assert observer.observations["v"]["parse_seconds"] == 0.0
+    assert observer.observations["v"]["rows"] == 0
+    assert variable.data is None
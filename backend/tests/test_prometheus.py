@@ -0,0 +1,64 @@
+from unittest.mock import MagicMock
+
+from backend.internal.prometheus import Prometheus, split_range, step_to_seconds, stitch_range_queries
+
+
+def test_step_to_seconds():
+    """Steps can be numbers, numeric strings or Prometheus durations"""
+    assert step_to_seconds(1) == 1.0
+    assert step_to_seconds("0.5") == 0.5
+    assert step_to_seconds("15s") == 15.0
+    assert step_to_seconds("1m30s") == 90.0
+    assert step_to_seconds(None) is None
+
+
+def test_split_range_keeps_small_windows():
+    """Windows below the point limit are queried in one request"""
+    assert split_range(0, 100, 1, max_points=101) == [(0, 100)]
+    assert split_range("2024-01-01T00:00:00Z", "2024-01-02T00:00:00Z", 1) == [
+        ("2024-01-01T00:00:00Z", "2024-01-02T00:00:00Z")
+    ]
+
+
+def test_split_range_covers_the_evaluation_grid():
+    """Chunks stay on the evaluation grid, do not overlap and respect the point limit"""
+    windows = split_range(1000, 1000 + 25 * 2, 2, max_points=10)
+
+    assert windows == [(1000, 1018), (1020, 1038), (1040, 1050)]
+    evaluated = [t for start, end in windows for t in range(int(start), int(end) + 1, 2)]
+    assert evaluated == list(range(1000, 1051, 2))
+
+
+def test_stitch_range_queries_merges_series():
+    """Series are merged across chunks by their labels and boundary samples are kept once"""
+    first = {"data": {"result": [
+        {"metric": {"instance": "a"}, "values": [[0, "1"], [1, "2"]]},
+        {"metric": {"instance": "b"}, "values": [[0, "5"]]},
+    ]}}
+    second = {"data": {"result": [
+        {"metric": {"instance": "a"}, "values": [[1, "2"], [2, "3"]]},
+    ]}}
+
+    stitched = stitch_range_queries([first, second])
+
+    assert stitched["data"]["result"] == [
+        {"metric": {"instance": "a"}, "values": [[0, "1"], [1, "2"], [2, "3"]]},
+        {"metric": {"instance": "b"}, "values": [[0, "5"]]},
+    ]
+
+
+def test_range_query_splits_long_windows():
+    """A window above the point limit is fetched in chunks"""
+    prometheus = Prometheus(orchestrator=MagicMock())
+    requested = []
+
+    def window(query, start, end, step=None, timeout=None):
+        requested.append((start, end))
+        return {"data": {"result": [{"metric": {}, "values": [[start, "1"], [end, "1"]]}]}}
+
+    prometheus._range_query_window = window
+
+    result = prometheus.range_query("up", 0, 30_000, step=1)
+
+    assert sorted(requested) == [(0, 10_999), (11_000, 21_999), (22_000, 30_000)]
+    assert len(result["data"]["result"][0]["values"]) == 6
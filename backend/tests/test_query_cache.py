@@ -0,0 +1,102 @@
+import time
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+
+from backend.internal.jaeger import Jaeger
+from backend.internal.prometheus import Prometheus
+from backend.internal.query_cache import QueryCache
+
+
+def counting_request(body=b'{"data": []}'):
+    calls = []
+
+    def request():
+        calls.append(body)
+        return body
+
+    return request, calls
+
+
+def test_closed_windows_are_served_from_memory(tmp_path):
+    """A repeated request over a closed window is only performed once"""
+    cache = QueryCache(path=tmp_path)
+    request, calls = counting_request()
+
+    for _ in range(3):
+        assert cache.fetch("http://prometheus/query_range", {"query": "up"}, 0, request) == b'{"data": []}'
+
+    assert len(calls) == 1
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["memory_hits"] == 2
+
+
+def test_open_windows_are_not_cached(tmp_path):
+    """Windows ending within the settle time are always requested"""
+    cache = QueryCache(path=tmp_path, settle_seconds=60)
+    request, calls = counting_request()
+
+    cache.fetch("http://prometheus/query_range", {"query": "up"}, time.time() - 10, request)
+    cache.fetch("http://prometheus/query_range", {"query": "up"}, None, request)
+
+    assert len(calls) == 2
+    assert cache.stats()["bypassed"] == 2
+    assert cache.stats()["disk_entries"] == 0
+
+
+def test_entries_survive_a_restart_on_disk(tmp_path):
+    """A new cache over the same directory serves previously stored entries"""
+    request, calls = counting_request()
+    QueryCache(path=tmp_path).fetch("http://jaeger/traces", {"service": "frontend"}, 0, request)
+
+    cache = QueryCache(path=tmp_path)
+    assert cache.fetch("http://jaeger/traces", {"service": "frontend"}, 0, request) == b'{"data": []}'
+
+    assert len(calls) == 1
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_size_based_eviction(tmp_path):
+    """Least recently used entries are evicted once a level exceeds its size"""
+    cache = QueryCache(path=tmp_path, max_memory_bytes=20, max_disk_bytes=30)
+    for query in ("a", "b", "c"):
+        cache.fetch("http://prometheus/query_range", {"query": query}, 0, lambda: b"0123456789")
+    cache.fetch("http://prometheus/query_range", {"query": "a"}, 0, lambda: b"0123456789")
+    cache.fetch("http://prometheus/query_range", {"query": "d"}, 0, lambda: b"0123456789")
+
+    stats = cache.stats()
+    assert stats["memory_bytes"] == 20
+    assert stats["disk_bytes"] == 30
+    assert stats["disk_evictions"] == 1
+    assert len(list(tmp_path.glob("*/*.json"))) == 3
+    # "b" was least recently used on disk, "a" was refreshed by its disk hit
+    assert cache.get(QueryCache.key("http://prometheus/query_range", {"query": "b"})) is None
+    assert cache.get(QueryCache.key("http://prometheus/query_range", {"query": "a"})) is not None
+
+
+def test_get_alerts_uses_the_cache(tmp_path):
+    """Fault detection analysis queries ALERTS for the same window only once"""
+    prometheus = Prometheus(orchestrator=MagicMock(), cache=QueryCache(path=tmp_path))
+    prometheus.session = MagicMock()
+    prometheus.session.get.return_value.content = b'{"status": "success", "data": {"result": []}}'
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    end = datetime(2024, 1, 1, 1, tzinfo=timezone.utc)
+
+    first = prometheus.get_alerts(start, end)
+    second = prometheus.get_alerts(start, end)
+
+    assert first == second == {"status": "success", "data": {"result": []}}
+    assert prometheus.session.get.call_count == 1
+
+
+def test_search_traces_caches_closed_windows(tmp_path):
+    """Trace searches over windows in the past are cached, searches without an end are not"""
+    jaeger = Jaeger(orchestrator=MagicMock(), cache=QueryCache(path=tmp_path))
+    jaeger.session = MagicMock()
+    jaeger.session.get.return_value.content = b'{"data": [{"traceID": "a"}]}'
+
+    for _ in range(2):
+        assert jaeger.search_traces(start=0, end=1_000_000, limit=10) == {"data": [{"traceID": "a"}]}
+    jaeger.search_traces(lookback="1h")
+    jaeger.search_traces(lookback="1h")
+
+    assert jaeger.session.get.call_count == 3
@@ -0,0 +1,176 @@
+from unittest.mock import MagicMock
+
+import pandas as pd
+import pytest
+
+from backend.internal.errors import JaegerException, PrometheusException
+from backend.internal.responses import MetricResponseVariable, TraceResponseVariable
+
+
+def jaeger_response():
+    """Two traces as returned by the Jaeger search endpoint"""
+    return {
+        "data": [
+            {
+                "traceID": "t1",
+                "processes": {
+                    "p1": {"serviceName": "frontend"},
+                    "p2": {"serviceName": "cartservice"},
+                },
+                "spans": [
+                    {
+                        "traceID": "t1",
+                        "spanID": "s1",
+                        "operationName": "GET /cart",
+                        "startTime": 1_700_000_000_000_000,
+                        "duration": 250,
+                        "processID": "p1",
+                        "references": [],
+                        "tags": [
+                            {"key": "span.kind", "value": "server"},
+                            {"key": "http.status_code", "value": 200},
+                        ],
+                    },
+                    {
+                        "traceID": "t1",
+                        "spanID": "s2",
+                        "operationName": "GetCart",
+                        "startTime": 1_700_000_000_000_100,
+                        "duration": 100,
+                        "processID": "p2",
+                        "references": [
+                            {"refType": "CHILD_OF", "spanID": "s1", "traceID": "t1"}
+                        ],
+                        "tags": [
+                            {"key": "rpc.grpc.status_code", "value": 0},
+                            {"key": "span.kind", "value": "client"},
+                        ],
+                    },
+                ],
+            },
+            {
+                "traceID": "t2",
+                "processes": {"p1": {"serviceName": "cartservice"}},
+                "spans": [
+                    {
+                        "traceID": "t2",
+                        "spanID": "s3",
+                        "operationName": "internal",
+                        "startTime": 1_700_000_001_000_000,
+                        "duration": 5,
+                        "processID": "p1",
+                        "references": [],
+                    },
+                ],
+            },
+        ]
+    }
+
+
+def test_tabulate_flattens_all_spans():
+    """All spans end up in a single dataframe with the expected columns"""
+    dataframe = TraceResponseVariable._tabulate(jaeger_response())
+
+    assert list(dataframe.columns) == [
+        "index",
+        "trace_id",
+        "span_id",
+        "operation",
+        "start_time",
+        "end_time",
+        "duration",
+        "service_name",
+        "span_kind",
+        "req_status_code",
+        "ref_type",
+        "ref_type_span_ID",
+        "ref_type_trace_ID",
+    ]
+    assert dataframe["span_id"].tolist() == ["s1", "s2", "s3"]
+    assert dataframe["index"].tolist() == [0, 1, 0]
+    assert dataframe["end_time"].tolist() == [
+        1_700_000_000_000_250,
+        1_700_000_000_000_200,
+        1_700_000_001_000_005,
+    ]
+    assert dataframe.index[0] == pd.Timestamp(1_700_000_000, unit="s", tz="UTC")
+
+
+def test_tabulate_resolves_services_tags_and_references():
+    """Service names, span tags and the first reference are resolved per span"""
+    dataframe = TraceResponseVariable._tabulate(jaeger_response())
+
+    assert dataframe["service_name"].tolist() == ["frontend", "cartservice", "cartservice"]
+    assert dataframe["span_kind"].tolist() == ["server", "client", "N/A"]
+    assert dataframe["req_status_code"].tolist() == [200, 0, "N/A"]
+    assert dataframe["ref_type"].tolist() == ["N/A", "CHILD_OF", "N/A"]
+    assert dataframe["ref_type_span_ID"].tolist() == ["N/A", "s1", "N/A"]
+    assert isinstance(dataframe["service_name"].dtype, pd.CategoricalDtype)
+    assert dataframe.to_dict(orient="records")[1]["operation"] == "GetCart"
+
+
+def test_tabulate_empty_response():
+    """An empty Jaeger response cannot be tabulated"""
+    with pytest.raises(JaegerException):
+        TraceResponseVariable._tabulate({"data": []})
+
+
+def metric_variable():
+    return MetricResponseVariable(
+        orchestrator=MagicMock(),
+        name="cpu_usage",
+        experiment_start=1_700_000_000.0,
+        experiment_end=1_700_000_060.0,
+        right_window="10s",
+        left_window="10s",
+        description={"metric_name": "cpu", "step": 1, "left_window": "10s", "right_window": "10s"},
+        target="sue",
+    )
+
+
+def prometheus_response(values_a, values_b):
+    """Range query matrix with two series"""
+    return {
+        "status": "success",
+        "data": {
+            "resultType": "matrix",
+            "result": [
+                {"metric": {"instance": "a", "job": "node"}, "values": values_a},
+                {"metric": {"instance": "b"}, "values": values_b},
+            ],
+        },
+    }
+
+
+def test_range_query_to_df_concatenates_series():
+    """Samples of all series end up in one dataframe with repeated labels"""
+    response = prometheus_response([[1_700_000_000, "1"], [1_700_000_001, "2"]], [[1_700_000_000.5, "3"]])
+
+    dataframe = metric_variable()._range_query_to_df(response, metric_column_name="cpu")
+
+    assert list(dataframe.columns) == ["instance", "job", "timestamp", "cpu", "cpu_usage"]
+    assert dataframe["instance"].tolist() == ["a", "a", "b"]
+    assert dataframe["job"].tolist()[:2] == ["node", "node"]
+    assert pd.isna(dataframe["job"].iloc[2])
+    assert dataframe["timestamp"].tolist() == [1_700_000_000.0, 1_700_000_001.0, 1_700_000_000.5]
+    assert dataframe["cpu"].tolist() == [1, 2, 3]
+    assert dataframe["cpu"].dtype == "int64"
+    assert dataframe.index[2] == pd.Timestamp(1_700_000_000.5, unit="s", tz="UTC")
+
+
+def test_range_query_to_df_parses_float_samples():
+    """Non-integral and special float samples are parsed as floats"""
+    response = prometheus_response([[1, "0.5"], [2, "NaN"]], [[1, "+Inf"]])
+
+    dataframe = metric_variable()._range_query_to_df(response, metric_column_name="cpu")
+
+    assert dataframe["cpu_usage"].dtype == "float64"
+    assert dataframe["cpu_usage"].iloc[0] == 0.5
+    assert pd.isna(dataframe["cpu_usage"].iloc[1])
+    assert dataframe["cpu_usage"].iloc[2] == float("inf")
+
+
+def test_range_query_to_df_empty_response():
+    """A response without series cannot be converted"""
+    with pytest.raises(PrometheusException):
+        metric_variable()._range_query_to_df({"data": {"result": []}}, metric_column_name="cpu")
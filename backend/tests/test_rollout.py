@@ -0,0 +1,105 @@
+import threading
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from backend.internal.kubernetes_orchestrator import KubernetesOrchestrator
+from backend.internal.rollout import deployment_rolled_out, pod_ready, watch_until
+
+
+def deployment(generation=2, observed_generation=2, replicas=2, updated=2, total=2, ready=2):
+    return SimpleNamespace(
+        metadata=SimpleNamespace(name="frontend", namespace="sue", uid="deployment", generation=generation, resource_version="1"),
+        spec=SimpleNamespace(replicas=replicas, selector=SimpleNamespace(match_labels={"app": "frontend"})),
+        status=SimpleNamespace(observed_generation=observed_generation, updated_replicas=updated, replicas=total, ready_replicas=ready),
+    )
+
+
+def pod(uid, ready=True, deleting=False):
+    return SimpleNamespace(
+        metadata=SimpleNamespace(name=f"frontend-{uid}", namespace="sue", uid=uid, deletion_timestamp="now" if deleting else None),
+        status=SimpleNamespace(conditions=[SimpleNamespace(type="Ready", status="True" if ready else "False")]),
+    )
+
+
+def listing(*items):
+    return SimpleNamespace(items=list(items), metadata=SimpleNamespace(resource_version="1"))
+
+
+class FakeWatch:
+    """Watch that yields the queued events and then ends like a watch whose timeout passed"""
+
+    events = []
+
+    def __init__(self):
+        self.stopped = threading.Event()
+
+    def stream(self, function, **kwargs):
+        assert kwargs["resource_version"] == "1"
+        yield from FakeWatch.events
+
+    def stop(self):
+        self.stopped.set()
+
+
+def test_deployment_rolled_out():
+    assert deployment_rolled_out(deployment())
+    # the controller did not see the latest spec yet
+    assert not deployment_rolled_out(deployment(generation=3))
+    # a pod of the previous revision is still running
+    assert not deployment_rolled_out(deployment(updated=1, total=3))
+    assert not deployment_rolled_out(deployment(ready=1))
+    assert deployment_rolled_out(deployment(replicas=0, updated=None, total=None, ready=None))
+
+
+def test_pod_ready():
+    assert pod_ready(pod("a"))
+    assert not pod_ready(pod("a", ready=False))
+    assert not pod_ready(pod("a", deleting=True))
+
+
+def test_watch_until_returns_on_the_event_that_completes_the_rollout():
+    """The waiter returns as soon as the watched deployment is rolled out instead of polling"""
+    list_function = MagicMock(return_value=listing(deployment(generation=3)))
+    FakeWatch.events = [
+        {"type": "MODIFIED", "object": deployment(generation=3, observed_generation=3, ready=1)},
+        {"type": "MODIFIED", "object": deployment(generation=3, observed_generation=3)},
+        {"type": "MODIFIED", "object": deployment(generation=3, observed_generation=3, ready=1)},
+    ]
+    seen = []
+
+    def rolled_out(deployments):
+        seen.append(len(seen))
+        return any(deployment_rolled_out(current) for current in deployments.values())
+
+    with patch("backend.internal.rollout.watch.Watch", FakeWatch):
+        assert watch_until(list_function, rolled_out, 10, namespace="sue") is True
+    assert len(seen) == 3
+    list_function.assert_called_once_with(namespace="sue")
+
+
+def test_watch_until_gives_up_at_the_deadline():
+    list_function = MagicMock(return_value=listing(deployment(generation=3)))
+    FakeWatch.events = []
+    with patch("backend.internal.rollout.watch.Watch", FakeWatch):
+        assert watch_until(list_function, lambda deployments: False, 0.05) is False
+
+
+def test_restart_pods_of_deployment_records_the_rollout():
+    """Restarting a deployment waits for ready replacements of the killed pods and returns the measured rollout"""
+    orchestrator = KubernetesOrchestrator.__new__(KubernetesOrchestrator)
+    orchestrator.kube_client = MagicMock()
+    orchestrator.kube_client.list_namespaced_pod.return_value = listing(pod("old-0"), pod("old-1"))
+    FakeWatch.events = [
+        {"type": "DELETED", "object": pod("old-0")},
+        {"type": "ADDED", "object": pod("new-0", ready=False)},
+        {"type": "MODIFIED", "object": pod("new-0")},
+        {"type": "DELETED", "object": pod("old-1")},
+        {"type": "ADDED", "object": pod("new-1")},
+    ]
+    with patch("backend.internal.kubernetes_orchestrator.CLUSTER_CACHE_ENABLED", False), \
+            patch("backend.internal.rollout.watch.Watch", FakeWatch):
+        rollout = orchestrator.restart_pods_of_deployment(deployment())
+    assert orchestrator.kube_client.delete_namespaced_pod.call_count == 2
+    assert rollout.completed is True
+    assert rollout.to_dict()["name"] == "app=frontend"
+    assert rollout.reason == "restart"
@@ -0,0 +1,103 @@
+import threading
+import time
+
+import pytest
+
+from backend.internal.scheduler import TreatmentScheduler, treatment_duration, treatment_targets
+
+
+class FakeTreatment:
+    """Treatment that stays in effect for its duration and records when it was injected and cleaned"""
+
+    def __init__(self, name, seconds=0.0, start_offset=None, fail=False, treatment_type="FakeTreatment", **config):
+        self.name = name
+        self.treatment_type = treatment_type
+        self.config = {"duration_seconds": seconds, **config}
+        self.start_offset = start_offset
+        self.cancelled = threading.Event()
+        self.rollouts = []
+        self.fail = fail
+        self.events = []
+
+    def inject(self):
+        self.events.append(("inject", time.monotonic()))
+        if self.fail:
+            raise RuntimeError(f"{self.name} failed")
+        self.cancelled.wait(self.config["duration_seconds"])
+
+    def clean(self):
+        self.events.append(("clean", time.monotonic()))
+
+
+def test_treatment_targets_and_duration():
+    delay = FakeTreatment("delay", namespace="sue", label_selector="app", label="frontend")
+    assert treatment_targets(delay) == {("pods", "sue", "app", "frontend")}
+    assert treatment_targets(FakeTreatment("kill", service_name="cart")) == {("service", "cart")}
+    assert treatment_targets(FakeTreatment("empty")) == frozenset()
+    assert treatment_targets(FakeTreatment("tail", treatment_type="TailSamplingTreatment")) == {("otel-collector-config",)}
+    assert treatment_duration(FakeTreatment("empty", seconds=3)) == 3
+    assert treatment_duration(FakeTreatment("delay", seconds=None, duration="1m")) == 60
+
+
+def test_treatments_without_offsets_run_one_after_the_other():
+    first, second = FakeTreatment("first", 0.05), FakeTreatment("second", 0.05)
+    schedule = TreatmentScheduler([first, second]).run()
+    assert [scheduled.planned_start for scheduled in schedule] == [0.0, 0.05]
+    assert second.events[0][1] >= first.events[1][1]
+    assert all(scheduled.start <= scheduled.end for scheduled in schedule)
+
+
+def test_treatments_with_offsets_overlap_unless_they_share_a_target():
+    """Treatments on different targets overlap at their offsets, a treatment on a busy target waits"""
+    delay = FakeTreatment("delay", 0.2, start_offset=0.0, namespace="sue", label_selector="app", label="frontend")
+    loss = FakeTreatment("loss", 0.2, start_offset=0.05, namespace="sue", label_selector="app", label="cart")
+    kill = FakeTreatment("kill", 0.0, start_offset=0.05, namespace="sue", label_selector="app", label="frontend")
+    started = time.monotonic()
+    schedule = TreatmentScheduler([delay, loss, kill]).run()
+
+    assert 0.04 <= loss.events[0][1] - started < delay.events[1][1] - started
+    assert kill.events[0][1] >= delay.events[1][1]
+    assert [scheduled.planned_start for scheduled in schedule] == [0.0, 0.05, 0.05]
+    assert schedule[2].planned_end == 0.05
+
+
+def test_cancel_cleans_running_treatments_and_skips_the_rest():
+    running = FakeTreatment("running", 10)
+    later = FakeTreatment("later", 0.0, start_offset=10)
+    scheduler = TreatmentScheduler([running, later])
+    threading.Timer(0.05, scheduler.cancel).start()
+    started = time.monotonic()
+    schedule = scheduler.run()
+    assert time.monotonic() - started < 5
+    assert [event for event, _ in running.events] == ["inject", "clean"]
+    assert later.events == [] and schedule[1].start is None
+
+
+def test_cancelling_the_shared_event_ends_the_wait_for_the_next_offset():
+    """The runner only sets the event it shares with the scheduler, which ends the schedule without waiting for the offset"""
+    cancelled = threading.Event()
+    later = FakeTreatment("later", 0.0, start_offset=3)
+    scheduler = TreatmentScheduler([later], cancelled=cancelled)
+    threading.Timer(0.05, cancelled.set).start()
+    started = time.monotonic()
+    schedule = scheduler.run()
+    assert time.monotonic() - started < 1
+    assert later.events == [] and schedule[0].start is None
+
+
+def test_treatments_changing_the_same_cluster_wide_configuration_do_not_overlap():
+    interval = FakeTreatment("interval", 0.1, start_offset=0.0, treatment_type="KubernetesPrometheusIntervalTreatment")
+    rules = FakeTreatment("rules", 0.0, start_offset=0.0, treatment_type="KubernetesPrometheusRulesTreatment")
+    TreatmentScheduler([interval, rules]).run()
+    assert rules.events[0][1] >= interval.events[1][1]
+
+
+def test_a_failing_treatment_cancels_the_schedule():
+    failing = FakeTreatment("failing", start_offset=0.0, fail=True)
+    running = FakeTreatment("running", 10, start_offset=0.0, service_name="cart")
+    started = time.monotonic()
+    with pytest.raises(RuntimeError):
+        TreatmentScheduler([failing, running]).run()
+    assert time.monotonic() - started < 5
+    assert [event for event, _ in failing.events] == ["inject", "clean"]
+    assert [event for event, _ in running.events] == ["inject", "clean"]